@@ -0,0 +1,132 @@
+"""
+Benchmark the frame decoder in `BaseClient.data_received`.
+
+Feeds bursts of Lync12 all-zone refresh responses through the decoder and
+reports throughput and memory allocated per frame, once using the previous
+slice-per-frame buffer handling and once using the current read offset.
+
+.. code-block:: bash
+
+    $ poetry run python benchmarks/bench_frame_decoder.py
+"""
+import argparse
+import logging
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import htd_client.utils  # noqa: E402
+from htd_client.constants import HtdCommonCommands, HtdConstants  # noqa: E402
+from htd_client.lync_client import HtdLyncClient  # noqa: E402
+
+_LOGGER = logging.getLogger("htd_client.base_client")
+
+
+class _Loop:
+    """Just enough of an event loop to drop broadcasts on the floor."""
+
+    def create_task(self, coro):
+        coro.close()
+
+    def call_soon(self, callback, *args):
+        pass
+
+
+def build_burst(zones: int) -> bytes:
+    burst = bytearray()
+
+    for zone in range(1, zones + 1):
+        frame = bytearray(HtdConstants.MESSAGE_HEADER)
+        frame += bytes([zone, HtdCommonCommands.ZONE_STATUS_RECEIVE_COMMAND])
+        frame += bytes([0x01, 0, 0, 0, zone % 12, 0xE2, 0, 0, 0])
+        frame.append(htd_client.utils.calculate_checksum(frame))
+        burst += frame
+
+    return bytes(burst)
+
+
+def new_client() -> HtdLyncClient:
+    client = HtdLyncClient(_Loop(), HtdConstants.SUPPORTED_MODELS["lync12"])
+    client._zone_data = {}
+    client._buffer = bytearray()
+    return client
+
+
+async def _legacy_broadcast(client: HtdLyncClient, zone: int):
+    for callback in client._subscribers:
+        callback(zone)
+
+
+def legacy_data_received(client: HtdLyncClient, new_data: bytes):
+    """The previous decoder, copying the remainder of the buffer per frame."""
+    client._buffer += new_data
+
+    _LOGGER.debug("Received new data %s" % htd_client.utils.stringify_bytes(new_data))
+
+    while len(client._buffer) > 0:
+        (zone, chunk_length) = client._process_next_command(client._buffer)
+
+        if chunk_length == 0:
+            return
+
+        client._buffer = client._buffer[chunk_length:]
+
+        client._loop.create_task(_legacy_broadcast(client, zone))
+
+
+def current_data_received(client: HtdLyncClient, new_data: bytes):
+    client.data_received(new_data)
+
+
+def run(name: str, receive, burst: bytes, frames_per_burst: int, iterations: int):
+    client = new_client()
+
+    # warm up so the zone data exists before measuring
+    receive(client, burst)
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        receive(client, burst)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    receive(client, burst)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    total_bytes = len(burst) * iterations
+    total_frames = frames_per_burst * iterations
+
+    print(
+        "%-8s %12.0f bytes/s %10.0f frames/s %10.1f peak bytes allocated/frame" %
+        (
+            name,
+            total_bytes / elapsed,
+            total_frames / elapsed,
+            (peak - baseline) / frames_per_burst,
+        )
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--refreshes", type=int, default=50, help="all-zone refreshes per read")
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    zones = HtdConstants.SUPPORTED_MODELS["lync12"]["zones"]
+    burst = build_burst(zones) * args.refreshes
+    frames_per_burst = zones * args.refreshes
+
+    print("%d frames (%d bytes) per read" % (frames_per_burst, len(burst)))
+    run("before", legacy_data_received, burst, frames_per_burst, args.iterations)
+    run("after", current_data_received, burst, frames_per_burst, args.iterations)
+
+
+if __name__ == "__main__":
+    main()
@@ -18,34 +18,68 @@ from typing import Tuple
 import htd_client.utils
 from .base_client import BaseClient
 from .constants import HtdCommonCommands, HtdModelInfo, HtdDeviceKind, HtdConstants
+from .exceptions import HtdError, HtdTimeoutError, HtdCommandRejectedError, HtdDisconnectedError
 from .lync_client import HtdLyncClient
 from .mca_client import HtdMcaClient
+from .model_cache import ModelCache, async_maintain_cache
+from .model_probe import async_open_probe, async_probe_model
+from .manager import HtdGatewayManager
 
 _LOGGER = logging.getLogger(__name__)
 
+# the tasks keeping model caches up to date, referenced until they're done
+_cache_tasks = set()
+
 
 async def async_get_client(
     serial_address: str = None,
     network_address: Tuple[str, int] = None,
     loop: asyncio.AbstractEventLoop = None,
+    optimistic: bool = False,
+    cache_path: str = None,
 ) -> BaseClient:
     """
-    Create a new client object.
+    Create a new client object. The model is detected on the connection the
+    client goes on to use, so the gateway is only connected to once.
 
     Args:
         network_address (str): The address to communicate with over TCP.
         serial_address (str): The location of the serial port.
         loop (asyncio.AbstractEventLoop): The event loop to use.
+        optimistic (bool): Show the values being set right away, before the gateway confirms them.
+        cache_path (str): A file to remember the model, enabled zones and zone names of the gateway
+        in, a gateway found in it gets its client without waiting for the model to be reported.
 
     Returns:
         HtdClient: The new client object.
     """
 
-    model_info = await async_get_model_info(
-        loop if loop is not None else asyncio.get_running_loop(),
-        network_address=network_address,
-        serial_address=serial_address
-    )
+    cache = await ModelCache.async_open(cache_path) if cache_path is not None else None
+    cache_key = ModelCache.key(network_address, serial_address) if cache is not None else None
+    cached = cache.get(cache_key) if cache is not None else None
+
+    if cached is None:
+        probe = await async_probe_model(
+            loop if loop is not None else asyncio.get_running_loop(),
+            network_address=network_address,
+            serial_address=serial_address
+        )
+
+        model_info = probe.model
+
+    else:
+        # the cached model is used right away, and verified on the side
+        probe = await async_open_probe(
+            loop if loop is not None else asyncio.get_running_loop(),
+            network_address=network_address,
+            serial_address=serial_address
+        )
+
+        model_info = cached.model
+
+    if model_info is None:
+        probe.close()
+        raise ValueError("Unable to detect a supported model")
 
     if model_info["kind"] == HtdDeviceKind.mca:
         client = HtdMcaClient(
@@ -53,6 +87,7 @@ async def async_get_client(
             model_info,
             network_address=network_address,
             serial_address=serial_address,
+            optimistic=optimistic,
         )
 
     elif model_info["kind"] == HtdDeviceKind.lync:
@@ -61,12 +96,22 @@ async def async_get_client(
             model_info,
             network_address=network_address,
             serial_address=serial_address,
+            optimistic=optimistic,
         )
 
     else:
+        probe.close()
         raise ValueError(f"Unknown Device Kind: {model_info["kind"]}")
 
-    await client.async_connect()
+    await client.async_connect(probe)
+
+    if cached is not None:
+        client.restore_zones(cached.zones_enabled, cached.zone_names)
+
+    if cache is not None:
+        task = asyncio.ensure_future(async_maintain_cache(cache, cache_key, client, probe, cached))
+        _cache_tasks.add(task)
+        task.add_done_callback(_cache_tasks.discard)
 
     return client
 
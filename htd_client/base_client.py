@@ -13,20 +13,165 @@
 """
 import asyncio
 import logging
+import random
+import socket
 import time
 from abc import abstractmethod
 from asyncio import Transport
-from typing import Dict, Tuple
+from dataclasses import replace
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Set, Tuple
 
 import serial
 from serial_asyncio import create_serial_connection
 
 import htd_client
-from .constants import HtdConstants, HtdDeviceKind, ONE_SECOND, HtdModelInfo, HtdCommonCommands
-from .models import ZoneDetail
+from .command_queue import QueuedCommand, ZoneCommandQueue
+from .constants import (
+    HtdConstants, ONE_SECOND, HtdModelInfo, HtdCommonCommands, HtdPriority, HtdSocketOptions,
+)
+from .exceptions import HtdCommandRejectedError, HtdDisconnectedError, HtdError, HtdTimeoutError
+from .models import ZONE_STATUS_FIELDS, ZoneDetail, ZoneView
+from .rtt import RttEstimator
+from .scheduler import OutboundScheduler, SchedulerStats
+from .wire_log import WireLogger
 
 _LOGGER = logging.getLogger(__name__)
 
+_FRAME_CACHES: Dict[Tuple[type, str], "htd_client.utils.CommandFrameCache"] = {}
+
+
+async def async_open_connection(
+    loop: asyncio.AbstractEventLoop,
+    protocol_factory: Callable[[], asyncio.Protocol],
+    serial_address: str = None,
+    network_address: Tuple[str, int] = None,
+    timeout: float = None,
+) -> Tuple[Transport, asyncio.Protocol]:
+    """
+    Open a connection to a gateway, over serial or the network.
+
+    Args:
+        loop (asyncio.AbstractEventLoop): the event loop to use
+        protocol_factory (callable): returns the protocol of the connection
+        serial_address (str): the location of the serial port
+        network_address (Tuple[str, int]): the host and port of the gateway
+        timeout (float): the read timeout of the serial port, in seconds
+
+    Returns:
+        (Transport, asyncio.Protocol): the transport and protocol of the connection
+    """
+
+    if serial_address is not None:
+        return await create_serial_connection(
+            loop,
+            protocol_factory,
+            serial_address,
+            baudrate=38400,
+            parity=serial.PARITY_NONE,
+            stopbits=serial.STOPBITS_ONE,
+            bytesize=serial.EIGHTBITS,
+            timeout=timeout
+        )
+
+    elif network_address is not None:
+        host, port = network_address
+        return await loop.create_connection(protocol_factory, host, port)
+
+    else:
+        raise ValueError("No address provided")
+
+
+def apply_socket_options(sock: socket.socket | None, options: HtdSocketOptions):
+    """
+    Tune the socket of a network connection, a serial port has none and is
+    left as it is. An option the platform doesn't support is skipped.
+
+    Args:
+        sock (socket.socket): the socket of the connection, None for a serial port
+        options (HtdSocketOptions): the options to set
+    """
+    if sock is None or sock.family not in (socket.AF_INET, socket.AF_INET6):
+        return
+
+    settings = [
+        (socket.IPPROTO_TCP, socket.TCP_NODELAY, int(options["nodelay"])),
+        (socket.SOL_SOCKET, socket.SO_KEEPALIVE, int(options["keepalive"])),
+    ]
+
+    if options["keepalive"]:
+        # macOS calls the idle time TCP_KEEPALIVE
+        idle = getattr(socket, "TCP_KEEPIDLE", getattr(socket, "TCP_KEEPALIVE", None))
+
+        settings += [
+            (socket.IPPROTO_TCP, idle, options["keepalive_idle"]),
+            (socket.IPPROTO_TCP, getattr(socket, "TCP_KEEPINTVL", None), options["keepalive_interval"]),
+            (socket.IPPROTO_TCP, getattr(socket, "TCP_KEEPCNT", None), options["keepalive_count"]),
+        ]
+
+    if options["send_buffer"] is not None:
+        settings.append((socket.SOL_SOCKET, socket.SO_SNDBUF, options["send_buffer"]))
+
+    if options["receive_buffer"] is not None:
+        settings.append((socket.SOL_SOCKET, socket.SO_RCVBUF, options["receive_buffer"]))
+
+    for level, option, value in settings:
+        if option is None:
+            continue
+
+        try:
+            sock.setsockopt(level, option, value)
+
+        except OSError as e:
+            _LOGGER.warning("Unable to set socket option %s: %s", option, e)
+
+
+class ReceiveHandler(NamedTuple):
+    length: int
+    handler: Callable[["BaseClient", int, bytes], None]
+
+
+class WriteStats(NamedTuple):
+    writes: int
+    frames: int
+
+    @property
+    def frames_per_write(self) -> float:
+        return self.frames / self.writes if self.writes else 0.0
+
+
+class SceneResult(NamedTuple):
+    # the fields of the zone that didn't end up as the scene asked
+    mismatched: frozenset
+
+    @property
+    def applied(self) -> bool:
+        return not self.mismatched
+
+
+# the fields a scene can set on a zone
+SCENE_FIELDS = ("power", "source", "volume", "mute", "bass", "treble", "balance")
+
+# a planned command, the command, data code and extra data to send
+PlannedCommand = Tuple[int, int, bytearray | None]
+
+
+def receive_command(command: int, length: int):
+    """
+    Register a client method as the handler of a command received from the
+    gateway. Subclasses can add handlers, or replace one by registering the
+    same command again.
+
+    Args:
+        command (int): the command code the method handles
+        length (int): the number of data bytes following the command
+    """
+
+    def decorator(func):
+        func.receive_command = (command, length)
+        return func
+
+    return decorator
+
 
 class BaseClient(asyncio.Protocol):
     _loop: asyncio.AbstractEventLoop = None
@@ -38,23 +183,82 @@ class BaseClient(asyncio.Protocol):
     _socket_timeout_sec: float = None
 
     _subscribers: set = None
-    _socket_lock: asyncio.Lock = None
+    _change_subscribers: set = None
+    _frame_listeners: set = None
+    _zone_changes: Dict[int, Set[str]] = None
+    _broadcast_handle: asyncio.Handle | None = None
     _callback_lock: asyncio.Lock = None
 
     _reconnect_task: asyncio.Task = None
     _reconnect_delay: float = 1.0
     _max_reconnect_delay: float = 60.0
+    # how far heartbeats and reconnects stray from their delay, as a fraction of it
+    _jitter: float = 0.0
 
     _connection: Transport | None = None
+    _scheduler: OutboundScheduler = None
+    _rtt: RttEstimator = None
+    _writes: int = 0
+    _frames_written: int = 0
+    _wire_log: WireLogger = None
     _heartbeat_task: asyncio.Task = None
+    _heartbeat_interval: float = HtdConstants.DEFAULT_HEARTBEAT_INTERVAL
+    _heartbeat_timeout: float = HtdConstants.DEFAULT_HEARTBEAT_TIMEOUT
+    _socket_options: HtdSocketOptions = HtdConstants.DEFAULT_SOCKET_OPTIONS
+    _watchdog_enabled: bool = True
+    _watchdog_handle: asyncio.TimerHandle | None = None
+    # when the latest read arrived, the latest valid frame, and the latest
+    # status of each zone, on the monotonic clock
+    _received_at: float = 0.0
+    _last_frame_at: float = 0.0
+    _zone_confirmed_at: Dict[int, float] = None
+    # when the heartbeat last asked for each zone
+    _zone_asked_at: Dict[int, float] = None
     _buffer: bytearray | None = None
     _zone_data: Dict[int, ZoneDetail] = None
+    # zone -> field -> what was restored for a zone the gateway hasn't reported yet
+    _restored: Dict[int, Dict[str, Any]] = None
+    # the zones kept over a reconnect that the gateway hasn't reported on since
+    _stale: Set[int] = None
+    _zone_views: Dict[int, ZoneView] = None
+    _zone_waiters: Dict[int, List[asyncio.Future]] = None
+    _zone_errors: Dict[int, int] = None
+    # zone -> field -> the value the gateway confirmed and the command showing another value
+    _zone_pending: Dict[int, Dict[str, Tuple[Any, object]]] = None
+    _optimistic: bool = False
+    _command_queues: Dict[int, ZoneCommandQueue] = None
     _zones_loaded: int = 0
     _connected: bool = False
     _ready: bool = False
 
     _disconnected: bool = True
 
+    # command code -> handler, built once per class from the methods
+    # registered with @receive_command
+    _receive_handlers: Dict[int, ReceiveHandler] = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._receive_handlers = cls._build_receive_handlers()
+
+    @classmethod
+    def _build_receive_handlers(cls) -> Dict[int, ReceiveHandler]:
+        registered = {}
+
+        for klass in reversed(cls.__mro__):
+            for name, attr in vars(klass).items():
+                registration = getattr(attr, "receive_command", None)
+
+                if isinstance(registration, tuple):
+                    command, length = registration
+                    registered[command] = (length, name)
+
+        # resolve by name, so an override of a handler is picked up as well
+        return {
+            command: ReceiveHandler(length, getattr(cls, name))
+            for command, (length, name) in registered.items()
+        }
+
     def __init__(
         self,
         loop: asyncio.AbstractEventLoop,
@@ -64,6 +268,7 @@ class BaseClient(asyncio.Protocol):
         command_retry_timeout: int = HtdConstants.DEFAULT_COMMAND_RETRY_TIMEOUT,
         retry_attempts: int = HtdConstants.DEFAULT_RETRY_ATTEMPTS,
         socket_timeout: int = HtdConstants.DEFAULT_SOCKET_TIMEOUT,
+        optimistic: bool = False,
     ):
         self._loop = loop
         self._model_info = model_info
@@ -73,8 +278,24 @@ class BaseClient(asyncio.Protocol):
         self._retry_attempts = retry_attempts
         self._socket_timeout_sec = socket_timeout / ONE_SECOND
         self._subscribers = set()
-        self._socket_lock = asyncio.Lock()
+        self._change_subscribers = set()
+        self._frame_listeners = set()
+        self._zone_changes = {}
+        self._zone_views = {}
+        self._stale = set()
+        self._restored = {}
+        self._zone_waiters = {}
+        self._zone_confirmed_at = {}
+        self._zone_asked_at = {}
+        self._zone_errors = {}
+        self._zone_pending = {}
+        self._optimistic = optimistic
+        self._command_queues = {}
+        self._scheduler = OutboundScheduler(self._write_frames, **HtdConstants.DEFAULT_PACING[model_info["kind"]])
         self._callback_lock = asyncio.Lock()
+        self._wire_log = WireLogger(self._address_name())
+        self._frame_cache = self._get_frame_cache(model_info)
+        self._rtt = RttEstimator(HtdConstants.MIN_COMMAND_RETRY_TIMEOUT, HtdConstants.MAX_COMMAND_RETRY_TIMEOUT)
 
     @property
     def connected(self):
@@ -84,97 +305,489 @@ class BaseClient(asyncio.Protocol):
     def ready(self):
         return self._ready
 
+    @property
+    def stale_zones(self) -> frozenset:
+        """
+        After a reconnect the zones keep their last known state, and `ready`
+        stays set, while the gateway is asked for every zone again.
+
+        Returns:
+            frozenset: the zones still showing their state from before the reconnect
+        """
+        return frozenset(self._stale)
+
     @property
     def model(self):
         return self._model_info
 
-    async def async_connect(self):
+    @property
+    def optimistic(self) -> bool:
+        """
+        In optimistic mode a zone shows the value a command is setting right
+        away, until the gateway confirms it, or the command fails and it's
+        rolled back.
+
+        Returns:
+            bool: if the client is in optimistic mode
+        """
+        return self._optimistic
+
+    def pending_fields(self, zone: int) -> frozenset:
+        """
+        The fields of a zone showing a value that's being set, which the
+        gateway hasn't confirmed yet. Once it's confirmed or rolled back, the
+        field is reported as changed again.
+
+        Args:
+            zone (int): the zone
+
+        Returns:
+            frozenset: the names of the pending `ZoneDetail` fields
+        """
+        return frozenset(self._zone_pending.get(zone, ()))
+
+    @property
+    def write_stats(self) -> WriteStats:
+        """
+        How many writes were made to the transport, and how many frames they
+        carried.
+
+        Returns:
+            WriteStats: the number of writes and frames
+        """
+        return WriteStats(self._writes, self._frames_written)
+
+    @property
+    def rtt(self) -> float | None:
+        """
+        The smoothed round trip time to the gateway, from a command being
+        written to its effect being reported.
+
+        Returns:
+            float: the round trip time in seconds, None until measured
+        """
+        return self._rtt.srtt
+
+    @property
+    def retry_timeout(self) -> float:
+        """
+        How long a command waits for its effect to be reported before it's
+        sent again, derived from the round trip time once it's measured.
+
+        Returns:
+            float: the retry timeout in seconds
+        """
+        return self._rtt.timeout(1, self._command_retry_timeout)
+
+    @property
+    def scheduler_stats(self) -> SchedulerStats:
+        """
+        How many frames are waiting to be written, and how long frames waited.
+
+        Returns:
+            SchedulerStats: the outbound queue depth and wait times
+        """
+        return self._scheduler.stats
+
+    def set_jitter(self, fraction: float):
+        """
+        Spread heartbeats and reconnects randomly around their delay, so
+        clients started together, e.g. by a gateway manager, don't keep
+        polling and reconnecting in lockstep.
+
+        Args:
+            fraction (float): the most a delay strays either way, as a fraction of it, between 0 and 1
+        """
+        if not 0 <= fraction < 1:
+            raise ValueError("jitter must be at least 0 and less than 1")
+
+        self._jitter = fraction
+        self._arm_watchdog()
+
+    def _jittered(self, delay: float) -> float:
+        if not self._jitter:
+            return delay
+
+        return delay * random.uniform(1 - self._jitter, 1 + self._jitter)
+
+    def set_heartbeat(self, interval: float = None, timeout: float = None):
+        """
+        Change how the connection is kept alive. Zones the gateway hasn't
+        reported on for `interval` seconds are refreshed, so a gateway that's
+        busy reporting is left alone. A link that's been quiet for `interval`
+        seconds is dropped and reconnected when it doesn't answer the refresh
+        within `timeout` seconds, a half open connection is noticed within
+        about `interval + timeout` seconds.
+
+        Args:
+            interval (float): the most seconds a zone goes without being reported on
+            timeout (float): the most seconds a quiet link takes to answer
+        """
+        interval = HtdConstants.DEFAULT_HEARTBEAT_INTERVAL if interval is None else interval
+        timeout = HtdConstants.DEFAULT_HEARTBEAT_TIMEOUT if timeout is None else timeout
+
+        if interval <= 0 or timeout <= 0:
+            raise ValueError("the heartbeat interval and timeout must be positive")
+
+        self._heartbeat_interval = interval
+        self._heartbeat_timeout = timeout
+        self._arm_watchdog()
+
+    def set_socket_options(
+        self,
+        nodelay: bool = None,
+        keepalive: bool = None,
+        keepalive_idle: int = None,
+        keepalive_interval: int = None,
+        keepalive_count: int = None,
+        send_buffer: int = None,
+        receive_buffer: int = None,
+    ):
+        """
+        Change how a network connection to the gateway is tuned, anything not
+        given falls back to the default. It applies to the current connection
+        and every reconnect.
+
+        Args:
+            nodelay (bool): write small frames right away, instead of waiting to fill a segment
+            keepalive (bool): have the kernel probe an idle connection
+            keepalive_idle (int): the seconds idle before the first probe
+            keepalive_interval (int): the seconds between probes
+            keepalive_count (int): the unanswered probes before the connection is dropped
+            send_buffer (int): the size of the send buffer in bytes, None for the system default
+            receive_buffer (int): the size of the receive buffer in bytes, None for the system default
+        """
+        given = {
+            "nodelay": nodelay,
+            "keepalive": keepalive,
+            "keepalive_idle": keepalive_idle,
+            "keepalive_interval": keepalive_interval,
+            "keepalive_count": keepalive_count,
+            "send_buffer": send_buffer,
+            "receive_buffer": receive_buffer,
+        }
+
+        for name in ("keepalive_idle", "keepalive_interval", "keepalive_count", "send_buffer", "receive_buffer"):
+            if given[name] is not None and given[name] < 1:
+                raise ValueError(f"{name} must be positive")
+
+        self._socket_options = {
+            name: HtdConstants.DEFAULT_SOCKET_OPTIONS[name] if value is None else value
+            for name, value in given.items()
+        }
+
+        if self._connection is not None:
+            apply_socket_options(self._connection.get_extra_info("socket"), self._socket_options)
+
+    def set_watchdog(self, enabled: bool = True):
+        """
+        Turn the watchdog on or off. It backs up the heartbeat, which probes
+        a quiet link: when no valid frame arrives for longer than the
+        heartbeat should take to give up on the link, e.g. because its probe
+        is stuck behind a write that never completes, the connection is torn
+        down and reconnected. The deadline follows `set_heartbeat`.
+
+        Args:
+            enabled (bool): whether the watchdog is on
+        """
+        self._watchdog_enabled = enabled
+        self._arm_watchdog()
+
+    def set_pacing(self, min_gap: float = None, rate: float = None, burst: int = None):
+        """
+        Change how fast frames are written to the gateway, anything not given
+        falls back to the default for the device kind.
+
+        Args:
+            min_gap (float): the least seconds between two frames
+            rate (float): the frames per second the gateway keeps up with
+            burst (int): the most frames that go out ahead of the rate
+        """
+        pacing = HtdConstants.DEFAULT_PACING[self._model_info["kind"]]
+
+        self._scheduler.configure(
+            pacing["min_gap"] if min_gap is None else min_gap,
+            pacing["rate"] if rate is None else rate,
+            pacing["burst"] if burst is None else burst,
+        )
+
+    @classmethod
+    def _get_frame_cache(cls, model_info: HtdModelInfo) -> "htd_client.utils.CommandFrameCache":
+        # every client of the same model sends the same frames, so they share a cache
+        key = (cls, model_info["name"])
+        cache = _FRAME_CACHES.get(key)
+
+        if cache is None:
+            cache = _FRAME_CACHES[key] = htd_client.utils.CommandFrameCache()
+            cache.warm(model_info["zones"], cls._frame_cache_codes(model_info))
+
+        return cache
+
+    @classmethod
+    def _frame_cache_codes(cls, model_info: HtdModelInfo) -> Iterable[Tuple[int, int]]:
+        """
+        The command and data code pairs to prebuild frames for, for every zone.
+
+        Args:
+            model_info (HtdModelInfo): the model info of the device
+
+        Returns:
+            Iterable[Tuple[int, int]]: the command and data code pairs
+        """
+        return ()
+
+    def _address_name(self) -> str:
+        if self._serial_address is not None:
+            return self._serial_address
+
+        if self._network_address is not None:
+            return "%s:%s" % self._network_address
+
+        return self._model_info["name"]
+
+    def set_wire_logging(self, enabled: bool = True, sample_rate: int = 1):
+        """
+        Log dumps of the raw bytes sent to and received from the gateway, to
+        the `htd_client.wire_log` logger at debug level.
+
+        Args:
+            enabled (bool): if the bytes should be logged
+            sample_rate (int): only log 1 in every N dumps, for heavy traffic
+        """
+        self._wire_log.configure(enabled, sample_rate)
+
+    async def async_connect(self, probe: "htd_client.model_probe.ModelProbe" = None):
+        """
+        Connect to the gateway.
+
+        Args:
+            probe (ModelProbe): the connection the model was detected on, to
+            take over instead of opening a new one
+        """
         if self._connected:
             return
 
         self._buffer = bytearray()
-        self._zone_data = {}
-        self._zones_loaded = 0
-        self._zone_data = {}
+
+        # a reconnect keeps the zones, they're stale until reported again
+        if self._zone_data:
+            self._stale = {zone for zone, zone_info in self._zone_data.items() if zone_info.enabled}
+        else:
+            self._zone_data = {}
+            self._zone_views = {}
+            self._zones_loaded = 0
+
         self._connection = None
         self._disconnected = False
+        self._scheduler.clear()
 
-        if self._serial_address is not None:
-            await create_serial_connection(
-                self._loop,
-                lambda: self,
-                self._serial_address,
-                baudrate=38400,
-                parity=serial.PARITY_NONE,
-                stopbits=serial.STOPBITS_ONE,
-                bytesize=serial.EIGHTBITS,
-                timeout=self._socket_timeout_sec
-            )
-
-        elif self._network_address is not None:
-            host, port = self._network_address
-            await self._loop.create_connection(lambda: self, host, port)
+        if probe is not None:
+            probe.attach(self)
+            return
 
-        else:
-            raise ValueError("No address provided")
+        await async_open_connection(
+            self._loop,
+            lambda: self,
+            serial_address=self._serial_address,
+            network_address=self._network_address,
+            timeout=self._socket_timeout_sec,
+        )
 
     def connection_made(self, transport: Transport):
         _LOGGER.debug("connected")
         self._connected = True
         self._connection = transport
         self._reconnect_delay = 1.0
+        self._last_frame_at = time.monotonic()
+        self._zone_confirmed_at = {}
+        self._zone_asked_at = {}
+        apply_socket_options(transport.get_extra_info("socket"), self._socket_options)
         self._heartbeat_task = asyncio.create_task(self._heartbeat())
+        self._arm_watchdog()
 
 
     async def _heartbeat(self):
+        # the first refresh loads every zone, after a reconnect it goes ahead
+        # of background work, to bring the stale zones up to date
+        self._mark_asked(self._heartbeat_zones(), time.monotonic())
+        await self.refresh(priority=HtdPriority.VALIDATION if self._stale else HtdPriority.BACKGROUND)
+
         while self._connected:
-            await self.refresh()
-            await asyncio.sleep(60)
+            await asyncio.sleep(self._jittered(self._next_heartbeat_in(time.monotonic())))
+
+            if not self._connected:
+                break
+
+            now = time.monotonic()
+            quiet = now - self._last_frame_at >= self._heartbeat_interval
+            stale = self._overdue_zones(now)
+
+            # one query reports on every zone, it's cheaper once most are due
+            if quiet or len(stale) * 2 > self.get_zone_count():
+                self._mark_asked(self._heartbeat_zones(), now)
+                await self.refresh(priority=HtdPriority.BACKGROUND)
+            else:
+                self._mark_asked(stale, now)
+
+                for zone in stale:
+                    await self.refresh(zone, priority=HtdPriority.BACKGROUND)
+
+            # a quiet link has to answer, or it's considered gone
+            if quiet:
+                await asyncio.sleep(self._heartbeat_timeout)
+
+                if self._connected and self._last_frame_at < now:
+                    _LOGGER.warning("No answer from the gateway in %s seconds, reconnecting", self._heartbeat_timeout)
+                    # a half open connection may never flush what's waiting to be written
+                    self._connection.abort()
+                    break
+
+    def _watchdog_timeout(self) -> float:
+        # the latest the heartbeat probes a quiet link, and the time it gives it
+        # to answer, with as long again to spare for the probe to go out
+        return self._heartbeat_interval * (1 + self._jitter) + 2 * self._heartbeat_timeout
+
+    def _arm_watchdog(self):
+        if self._watchdog_handle is not None:
+            self._watchdog_handle.cancel()
+            self._watchdog_handle = None
+
+        if not self._watchdog_enabled or not self._connected:
+            return
+
+        delay = self._last_frame_at + self._watchdog_timeout() - time.monotonic()
+        self._watchdog_handle = self._loop.call_later(max(delay, 0.0), self._watchdog)
+
+    def _watchdog(self):
+        self._watchdog_handle = None
+
+        if not self._connected or not self._watchdog_enabled:
+            return
+
+        quiet = time.monotonic() - self._last_frame_at
+
+        if quiet >= self._watchdog_timeout():
+            _LOGGER.warning("No valid frame from the gateway in %.1f seconds, reconnecting", quiet)
+            # a half open connection may never flush what's waiting to be written
+            self._connection.abort()
+            return
+
+        self._arm_watchdog()
+
+    def _heartbeat_zones(self) -> Iterable[int]:
+        # a zone that's disabled doesn't report, there's no point asking
+        return (
+            zone for zone in range(1, self.get_zone_count() + 1)
+            if not self._zone_data or zone not in self._zone_data or self._zone_data[zone].enabled
+        )
+
+    def _overdue_zones(self, now: float) -> List[int]:
+        """
+        The zones to refresh once one goes without being reported on for the
+        heartbeat interval, along with those close to it, so they share the
+        refresh.
+
+        Args:
+            now (float): the time on the monotonic clock
+
+        Returns:
+            List[int]: the zones to refresh, empty while none is overdue
+        """
+        checked_at = {zone: self._zone_checked_at(zone) for zone in self._heartbeat_zones()}
+
+        if not any(at <= now - self._heartbeat_interval for at in checked_at.values()):
+            return []
+
+        return [zone for zone, at in checked_at.items() if at <= now - self._heartbeat_interval * 0.75]
+
+    def _zone_checked_at(self, zone: int) -> float:
+        # a zone that was asked for and didn't answer isn't asked again right away
+        return max(self._zone_confirmed_at.get(zone, float("-inf")), self._zone_asked_at.get(zone, float("-inf")))
+
+    def _mark_asked(self, zones: Iterable[int], now: float):
+        for zone in zones:
+            self._zone_asked_at[zone] = now
+
+    def _next_heartbeat_in(self, now: float) -> float:
+        """
+        Args:
+            now (float): the time on the monotonic clock
+
+        Returns:
+            float: the seconds until a zone or the link is due for the heartbeat
+        """
+        deadline = self._last_frame_at + self._heartbeat_interval
+
+        for zone in self._heartbeat_zones():
+            deadline = min(deadline, self._zone_checked_at(zone) + self._heartbeat_interval)
+
+        return max(deadline - now, 0.0)
 
 
     def data_received(self, new_data):
+        self._received_at = time.monotonic()
+
         try:
             if self._buffer is None:
                 self._buffer = bytearray()
 
             self._buffer += new_data
 
-            _LOGGER.debug("Received new data %s" % htd_client.utils.stringify_bytes(new_data))
+            if self._wire_log.enabled:
+                self._wire_log.log("received", new_data)
 
-            while len(self._buffer) > 0:
-                (zone, chunk_length) = self._process_next_command(self._buffer)
+            # frames are decoded in place by advancing a read offset, the
+            # consumed bytes are only compacted away once per read
+            offset = 0
+            buffer_length = len(self._buffer)
+
+            while offset < buffer_length:
+                (zone, chunk_length) = self._process_next_command(self._buffer, offset)
 
                 if chunk_length == 0:
-                    return
+                    break
+
+                offset += chunk_length
 
-                self._buffer = self._buffer[chunk_length:]
+            del self._buffer[:offset]
 
-                self._loop.create_task(self._broadcast(zone))
+            self._schedule_broadcast()
 
         except Exception as e:
             _LOGGER.error(f"Error processing data!")
             _LOGGER.exception(e)
             self._buffer = None
-            self._loop.create_task(self.refresh())
+            self._loop.create_task(self.refresh(priority=HtdPriority.VALIDATION))
 
 
     def connection_lost(self, exc):
         _LOGGER.info("Connection has been disconnected!")
 
-        self._ready = False
         self._connected = False
+        self._connection = None
         self._buffer = None
+        # whatever didn't make it out is resent by the command retries
+        self._scheduler.clear()
+
+        # commands waiting on the gateway find out it's gone right away
+        for zone in tuple(self._zone_waiters):
+            self._wake_zone_waiters(zone)
         if self._heartbeat_task:
             self._heartbeat_task.cancel()
 
+        if self._watchdog_handle is not None:
+            self._watchdog_handle.cancel()
+            self._watchdog_handle = None
+
         if not self._disconnected:
             if self._reconnect_task is None or self._reconnect_task.done():
                 self._reconnect_task = asyncio.create_task(self._async_reconnect())
 
     async def _async_reconnect(self):
         """Reconnect with exponential backoff."""
-        _LOGGER.info(f"Attempting to reconnect in {self._reconnect_delay} seconds...")
-        await asyncio.sleep(self._reconnect_delay)
+        delay = self._jittered(self._reconnect_delay)
+        _LOGGER.info(f"Attempting to reconnect in {delay:.1f} seconds...")
+        await asyncio.sleep(delay)
         
         try:
             await self.async_connect()
@@ -191,33 +804,93 @@ class BaseClient(asyncio.Protocol):
     def has_zone_data(self, zone: int):
         return zone in self._zone_data
 
+    def restore_zones(self, zones_enabled: Dict[int, bool], zone_names: Dict[int, str]):
+        """
+        Remember which zones are enabled and their names from what was learned
+        before, e.g. from the model cache. They're applied to a zone once the
+        gateway first reports it, the zone isn't shown before it has a real
+        state. A zone that was already reported only gets a name it's missing.
+
+        Args:
+            zones_enabled (Dict[int, bool]): zone -> if the zone is enabled
+            zone_names (Dict[int, str]): zone -> the name of the zone
+        """
+        for zone, enabled in zones_enabled.items():
+            if zone not in self._zone_data:
+                self._restored.setdefault(zone, {})["enabled"] = enabled
+
+        for zone, name in zone_names.items():
+            zone_info = self._zone_data.get(zone)
+
+            if zone_info is None:
+                self._restored.setdefault(zone, {})["name"] = name
+
+            elif zone_info.name is None:
+                zone_info.name = name
+                self._record_zone_change(zone, ("name",))
+
+        self._schedule_broadcast()
+
+    def _apply_restored(self, zone_info: ZoneDetail, fields: Iterable[str]) -> List[str]:
+        """
+        Fill in what was restored for a zone that was just reported.
+
+        Args:
+            zone_info (ZoneDetail): the zone
+            fields (Iterable[str]): the restored fields the gateway didn't report yet
+
+        Returns:
+            List[str]: the fields that were filled in
+        """
+        restored = self._restored.pop(zone_info.number, {})
+        applied = [field for field in fields if field in restored]
+
+        for field in applied:
+            setattr(zone_info, field, restored[field])
+
+        return applied
+
 
     def disconnect(self):
         self._disconnected = True
-        self._connection.close()
 
+        # a reconnect that's waiting to happen doesn't anymore
+        if self._reconnect_task is not None:
+            self._reconnect_task.cancel()
 
-    def _process_next_command(self, data: bytes):
+        if self._connection is not None:
+            self._connection.close()
+
+
+    def _process_next_command(self, data: bytes, offset: int = 0):
         """
         Process the next command in the buffer.
         Credit to https://github.com/dustinmcintire/htd-lync
 
+        The buffer is never sliced, the frame handed to `_parse_command` is a
+        `memoryview` over the buffer which is released once it's been parsed.
+
         Args:
             data (bytes): the data to process
+            offset (int): the position in data to start reading from
+
+        Returns:
+            (int, int): the zone of the processed command, and how many bytes
+            past offset were consumed, 0 when more data is needed
         """
 
         # start with search for command header and id the command
         # not enough data, 2 reserved header bits, zone + command + data + checksum = 4, is minimum length
-        if len(data) < HtdConstants.MESSAGE_HEADER_LENGTH + 4:
+        if len(data) - offset < HtdConstants.MESSAGE_HEADER_LENGTH + 4:
             return None, 0
 
-        start_message_index = data.find(HtdConstants.MESSAGE_HEADER)
+        start_message_index = data.find(HtdConstants.MESSAGE_HEADER, offset)
 
         if start_message_index < 0:
-            return None, len(data)
+            return None, len(data) - offset
 
-        if start_message_index != 0:
-            _LOGGER.debug("Bad sync buffer! %s" % htd_client.utils.stringify_bytes(data))
+        if start_message_index != offset and self._wire_log.enabled:
+            self._wire_log.log("bad sync buffer!", data[offset:])
 
         # offsets to packet data, zones, command, and then data
         zone_idx = start_message_index + HtdConstants.MESSAGE_HEADER_LENGTH
@@ -231,131 +904,191 @@ class BaseClient(asyncio.Protocol):
         zone = int(data[zone_idx])
         command = data[cmd_idx]
 
+        if command == HtdCommonCommands.UNDEFINED_RECEIVE_COMMAND:
+            if self._wire_log.enabled:
+                self._wire_log.log("undefined command, packet buffer", data[offset:offset + 20])
+            return None, start_message_index + HtdConstants.MESSAGE_HEADER_LENGTH - offset
+
+        handler = self._receive_handlers.get(command)
+
         # Skip over bad command
         # return the minimum packet size for resync
-        if command not in HtdCommonCommands.EXPECTED_MESSAGE_LENGTH_MAP:
-            _LOGGER.error(
-                "Invalid command value: zone = %d, command = %s (%d).  data = %s" %
-                (
-                    zone,
-                    htd_client.utils.stringify_bytes_raw(bytearray([command])),
-                    command,
-                    htd_client.utils.stringify_bytes(data),
-                )
-            )
+        if handler is None:
+            _LOGGER.debug("Invalid command value: zone = %d, command = 0x%02x", zone, command)
 
-            return None, start_message_index + HtdConstants.MESSAGE_HEADER_LENGTH
+            if self._wire_log.enabled:
+                self._wire_log.log("invalid command, packet buffer", data[offset:offset + 20])
 
-        expected_length = HtdCommonCommands.EXPECTED_MESSAGE_LENGTH_MAP[command]
+            return None, start_message_index + HtdConstants.MESSAGE_HEADER_LENGTH - offset
 
-        if command == HtdCommonCommands.UNDEFINED_RECEIVE_COMMAND:
-            _LOGGER.debug("Packet buffer: %s", htd_client.utils.stringify_bytes(data[0:20]))
-            return None, start_message_index + HtdConstants.MESSAGE_HEADER_LENGTH
+        expected_length = handler.length
 
         # not enough data, wait for more
         if len(data) <= data_idx + expected_length:
             return None, 0
 
         end_message_index = start_message_index + HtdConstants.MESSAGE_HEADER_LENGTH + 2 + expected_length
-        chunk_length = end_message_index + 1
+        chunk_length = end_message_index + 1 - offset
 
         # process the content to the current state
-        frame = data[start_message_index:end_message_index]
         checksum = data[end_message_index]
-        frame_sum_checksum = htd_client.utils.calculate_checksum(frame)
 
-        # validate the checksum
-        if frame_sum_checksum == checksum:
-            # chunk = data[start_message_index:end_message_index]
-            _LOGGER.debug("Processing chunk %s" % htd_client.utils.stringify_bytes(frame))
+        with memoryview(data) as view:
+            frame = view[start_message_index:end_message_index]
 
-            frame = data[data_idx:data_idx + expected_length]
-            self._parse_command(zone, command, frame)
+            try:
+                frame_sum_checksum = htd_client.utils.calculate_checksum(frame)
 
-            if not self._ready and command == HtdCommonCommands.ZONE_STATUS_RECEIVE_COMMAND:
-                self._zones_loaded += 1
-                if self._zones_loaded == self._model_info['zones']:
-                    self._ready = True
+                # validate the checksum
+                if frame_sum_checksum == checksum:
+                    if self._wire_log.enabled:
+                        self._wire_log.log("processing chunk", frame)
 
-        else:
-            _LOGGER.info("Bad checksum %02x != %02x", frame_sum_checksum, checksum)
+                    self._last_frame_at = self._received_at
+
+                    frame.release()
+                    frame = view[data_idx:data_idx + expected_length]
+                    self._parse_command(zone, command, frame)
+
+                    for listener in self._frame_listeners:
+                        listener(bytes(view[start_message_index:end_message_index + 1]))
+
+                    if not self._ready and command == HtdCommonCommands.ZONE_STATUS_RECEIVE_COMMAND:
+                        self._zones_loaded += 1
+                        if self._zones_loaded == self._model_info['zones']:
+                            self._ready = True
+
+                else:
+                    _LOGGER.info("Bad checksum %02x != %02x", frame_sum_checksum, checksum)
+
+            finally:
+                # the buffer can't be resized while a view is still exported
+                frame.release()
 
         return zone, chunk_length
 
     def _parse_command(self, zone, cmd, data):
-        if cmd == HtdCommonCommands.KEYPAD_EXISTS_RECEIVE_COMMAND:
-            print(f"DEBUG: inside _parse_command _zone_data id: {id(self._zone_data)}")
-            # if len(self._zone_data) == 0:
-            # this is zone 0 with all zone data
-            # second byte is zone 1 - 8
-            for i in range(8):
-                enabled = data[1] & (1 << i) > 0
-                zone_info = ZoneDetail(i + 1) if i + 1 not in self._zone_data else self._zone_data[i + 1]
-                zone_info.enabled = enabled
-                self._zone_data[i + 1] = zone_info
-
-            # fourth byte is zone 9 - 16
-            for i in range(8):
-                enabled = data[3] & (1 << i) > 0
-                zone_info = ZoneDetail(i + 9) if i + 9 not in self._zone_data else self._zone_data[i + 9]
-                zone_info.enabled = enabled
-                self._zone_data[i + 9] = zone_info
-
-            # third byte is keypad 1 - 8
-            # for i in range(8):
-            #     if data[2] & (1 << i):
-            #         self.zone_info[i]['keypad'] = 'yes'
-            #     else:
-            #         self.zone_info[i]['keypad'] = 'no'
-
-            # fifth byte is keypad 8-15
-            # for i in range(8):
-            #     if data[4] & (1 << i):
-            #         self.zone_info[i + 8]['keypad'] = 'yes'
-            #     else:
-            #         self.zone_info[i + 8]['keypad'] = 'no'
-
-        elif cmd == HtdCommonCommands.ZONE_STATUS_RECEIVE_COMMAND:
-            zone_data = self._parse_zone(zone, data)
-            if self.has_zone_data(zone):
-                zone_data.enabled = self._zone_data[zone].enabled
-            self._zone_data[zone] = zone_data
-            _LOGGER.debug("Got new state: %s", zone_data)
-
-        elif cmd == HtdCommonCommands.ZONE_SOURCE_NAME_RECEIVE_COMMAND_MCA:
-            zone_source_name = str(data[2:9].decode(errors="ignore").strip('\0')).lower()
-
-        elif cmd == HtdCommonCommands.ZONE_SOURCE_NAME_RECEIVE_COMMAND_LYNC:
-            zone_source_name = str(data[0:11].decode().rstrip('\0')).lower()
-            # remove the extra null bytes
-
-        elif cmd == HtdCommonCommands.ZONE_NAME_RECEIVE_COMMAND:
-            name = str(data[0:11].decode().rstrip('\0')).lower()
-            self._zone_data[zone].name = name
-
-        elif cmd == HtdCommonCommands.SOURCE_NAME_RECEIVE_COMMAND:
-            source = data[11]
-            name = str(data[0:10].decode().rstrip('\0')).lower()
-            # self.zone_info[zone]['source_list'][source] = name
-            # self.source_info[zone][name] = source
-        #
-        # elif cmd == HtdCommonCommands.MP3_ON_RECEIVE_COMMAND:
-        #     self.mp3_status['state'] = 'on'
-        #
-        # elif cmd == HtdCommonCommands.MP3_OFF_RECEIVE_COMMAND:
-        #     self.mp3_status['state'] = 'off'
-        #
-        # elif cmd == HtdCommonCommands.MP3_FILE_NAME_RECEIVE_COMMAND:
-        #     self.mp3_status['file'] = data.decode().rstrip('\0')
-        #
-        # elif cmd == HtdCommonCommands.MP3_ARTIST_NAME_RECEIVE_COMMAND:
-        #     self.mp3_status['artist'] = data.decode().rstrip('\0')
-
-        elif cmd == HtdCommonCommands.ERROR_RECEIVE_COMMAND:
-            _LOGGER.warning("HTD Error Response Code: %s", data[0])
+        """
+        Dispatch the data of a received command to its registered handler,
+        every frame that passed its checksum goes through here.
+
+        Args:
+            zone (int): the zone the command is for
+            cmd (int): the command received
+            data (bytes): the data that followed the command
+        """
+        handler = self._receive_handlers.get(cmd)
+
+        if handler is None:
+            _LOGGER.debug("Unknown command processed, ignoring: %s", cmd)
+            return
+
+        handler.handler(self, zone, data)
+
+    @receive_command(HtdCommonCommands.KEYPAD_EXISTS_RECEIVE_COMMAND, 9)
+    def _on_keypad_exists(self, zone: int, data: bytes):
+        # if len(self._zone_data) == 0:
+        # this is zone 0 with all zone data
+        # second byte is zone 1 - 8
+        for i in range(8):
+            self._set_zone_enabled(i + 1, data[1] & (1 << i) > 0)
+
+        # fourth byte is zone 9 - 16
+        for i in range(8):
+            self._set_zone_enabled(i + 9, data[3] & (1 << i) > 0)
+
+        # third byte is keypad 1 - 8
+        # for i in range(8):
+        #     if data[2] & (1 << i):
+        #         self.zone_info[i]['keypad'] = 'yes'
+        #     else:
+        #         self.zone_info[i]['keypad'] = 'no'
+
+        # fifth byte is keypad 8-15
+        # for i in range(8):
+        #     if data[4] & (1 << i):
+        #         self.zone_info[i + 8]['keypad'] = 'yes'
+        #     else:
+        #         self.zone_info[i + 8]['keypad'] = 'no'
+
+    def _set_zone_enabled(self, zone: int, enabled: bool):
+        zone_info = self._zone_data.get(zone)
+        restored = []
+
+        if zone_info is None:
+            zone_info = self._zone_data[zone] = ZoneDetail(zone, enabled=enabled)
+            restored = self._apply_restored(zone_info, ("name",))
+        elif zone_info.enabled == enabled:
+            return
+
+        # a disabled zone doesn't report, it's as fresh as it gets
+        if not enabled:
+            self._stale.discard(zone)
+
+        zone_info.enabled = enabled
+        self._record_zone_change(zone, ["enabled"] + restored)
 
+    @receive_command(HtdCommonCommands.ZONE_STATUS_RECEIVE_COMMAND, 9)
+    def _on_zone_status(self, zone: int, data: bytes):
+        zone_info = self._zone_data.get(zone)
+
+        if zone_info is None:
+            zone_info = self._zone_data[zone] = self._parse_zone(zone, data)
+            changed = ZONE_STATUS_FIELDS + tuple(self._apply_restored(zone_info, ("enabled", "name")))
         else:
-            _LOGGER.info("Unknown command processed, ignoring: %s", cmd)
+            # update the existing zone in place, noting which fields changed
+            changed = []
+            pending = self._zone_pending.get(zone)
+
+            for field, value in zip(ZONE_STATUS_FIELDS, self._decode_zone_status(data)):
+                if pending and field in pending:
+                    # the field shows the value a command is setting, it's
+                    # confirmed once the gateway reports it
+                    if value == getattr(zone_info, field):
+                        del pending[field]
+                        changed.append(field)
+                    else:
+                        pending[field] = (value, pending[field][1])
+
+                elif getattr(zone_info, field) != value:
+                    setattr(zone_info, field, value)
+                    changed.append(field)
+
+            if pending is not None and not pending:
+                del self._zone_pending[zone]
+
+        self._zone_confirmed_at[zone] = self._received_at
+        self._stale.discard(zone)
+
+        if changed:
+            _LOGGER.debug("Got new state: %s", zone_info)
+            self._record_zone_change(zone, changed)
+
+        self._wake_zone_waiters(zone)
+
+    @receive_command(HtdCommonCommands.ZONE_NAME_RECEIVE_COMMAND, 13)  # should be 11
+    def _on_zone_name(self, zone: int, data: bytes):
+        name = str(bytes(data[0:11]).decode().rstrip('\0')).lower()
+        zone_info = self._zone_data[zone]
+
+        if zone_info.name != name:
+            zone_info.name = name
+            self._record_zone_change(zone, ("name",))
+
+    @receive_command(HtdCommonCommands.SOURCE_NAME_RECEIVE_COMMAND, 13)  # should be 11
+    def _on_source_name(self, zone: int, data: bytes):
+        source = data[11]
+        name = str(bytes(data[0:10]).decode().rstrip('\0')).lower()
+        # self.zone_info[zone]['source_list'][source] = name
+        # self.source_info[zone][name] = source
+
+    @receive_command(HtdCommonCommands.ERROR_RECEIVE_COMMAND, 9)
+    def _on_error(self, zone: int, data: bytes):
+        _LOGGER.warning("HTD Error Response Code: %s", data[0])
+
+        # a command waiting on the zone was rejected
+        self._zone_errors[zone] = data[0]
+        self._wake_zone_waiters(zone)
 
     def _parse_zone(self, zone_number: int, zone_data: bytearray) -> ZoneDetail | None:
         """
@@ -369,37 +1102,46 @@ class BaseClient(asyncio.Protocol):
             ZoneDetail - a parsed instance of zone_data normalized or None if invalid
         """
 
-        # the 4th position represent the toggles for power, mute, mode and party,
-        state_toggles = htd_client.utils.to_binary_string(
-            zone_data[HtdConstants.STATE_TOGGLES_ZONE_DATA_INDEX]
-        )
+        zone = ZoneDetail(zone_number)
 
-        volume = htd_client.utils.convert_volume(
-            self._model_info["kind"],
-            zone_data[HtdConstants.VOLUME_ZONE_DATA_INDEX]
-        )
+        for field, value in zip(ZONE_STATUS_FIELDS, self._decode_zone_status(zone_data)):
+            setattr(zone, field, value)
 
-        zone = ZoneDetail(zone_number)
+        return zone
 
-        if self._model_info["kind"] == HtdDeviceKind.lync:
-            state_toggles = state_toggles[::-1]
+    def _decode_zone_status(self, zone_data: bytearray) -> tuple:
+        """
+        Decode the data of a zone status.
 
-        zone.power = htd_client.utils.is_bit_on(
-            state_toggles,
-            HtdConstants.POWER_STATE_TOGGLE_INDEX
-        )
-        zone.mute = htd_client.utils.is_bit_on(state_toggles, HtdConstants.MUTE_STATE_TOGGLE_INDEX)
-        zone.mode = htd_client.utils.is_bit_on(state_toggles, HtdConstants.MODE_STATE_TOGGLE_INDEX)
+        Parameters:
+            zone_data (bytes): an array of bytes representing a zone
 
-        zone.source = zone_data[HtdConstants.SOURCE_ZONE_DATA_INDEX] + HtdConstants.SOURCE_QUERY_OFFSET
-        zone.volume = volume
-        zone.treble = htd_client.utils.convert_value(zone_data[HtdConstants.TREBLE_ZONE_DATA_INDEX])
-        zone.bass = htd_client.utils.convert_value(zone_data[HtdConstants.BASS_ZONE_DATA_INDEX])
-        zone.balance = htd_client.utils.convert_value(zone_data[HtdConstants.BALANCE_ZONE_DATA_INDEX])
+        Returns:
+            tuple: the values of the zone, in the order of `ZONE_STATUS_FIELDS`
+        """
 
-        return zone
+        # the 4th position represent the toggles for power, mute, mode and party,
+        # each flag is decoded ahead of time in a table for every byte value
+        state_toggles = htd_client.utils.STATE_TOGGLES_TABLES[self._model_info["kind"]][
+            zone_data[HtdConstants.STATE_TOGGLES_ZONE_DATA_INDEX]
+        ]
+
+        return state_toggles + (
+            zone_data[HtdConstants.SOURCE_ZONE_DATA_INDEX] + HtdConstants.SOURCE_QUERY_OFFSET,
+            htd_client.utils.VOLUME_TABLE[zone_data[HtdConstants.VOLUME_ZONE_DATA_INDEX]],
+            htd_client.utils.SIGNED_VALUE_TABLE[zone_data[HtdConstants.TREBLE_ZONE_DATA_INDEX]],
+            htd_client.utils.SIGNED_VALUE_TABLE[zone_data[HtdConstants.BASS_ZONE_DATA_INDEX]],
+            htd_client.utils.SIGNED_VALUE_TABLE[zone_data[HtdConstants.BALANCE_ZONE_DATA_INDEX]],
+        )
 
     async def async_subscribe(self, callback):
+        """
+        Subscribe to zone updates, the callback is called with the number of
+        each zone that was updated.
+
+        Args:
+            callback (callable): called with the zone number
+        """
         async with self._callback_lock:
             self._subscribers.add(callback)
             # if we're already ready, call the callback immediately and let them update
@@ -410,10 +1152,168 @@ class BaseClient(asyncio.Protocol):
         async with self._callback_lock:
             self._subscribers.discard(callback)
 
-    async def _broadcast(self, zone: int = None):
+    async def async_subscribe_changes(self, callback):
+        """
+        Subscribe to zone changes in batches. The callback is called at most
+        once per event loop iteration, with only the zones whose state really
+        changed, and which fields of each zone changed, e.g.
+        `{1: frozenset({"volume"}), 4: frozenset({"power", "source"})}`
+
+        Args:
+            callback (callable): called with a dict of zone number to the
+            frozenset of changed `ZoneDetail` field names
+        """
         async with self._callback_lock:
-            for callback in self._subscribers:
-                callback(zone)
+            self._change_subscribers.add(callback)
+            # if we're already ready, call the callback immediately and let them update
+            if self._ready:
+                callback({
+                    zone: frozenset(ZONE_STATUS_FIELDS + ("enabled", "name"))
+                    for zone in self._zone_data
+                })
+
+    async def async_unsubscribe_changes(self, callback):
+        async with self._callback_lock:
+            self._change_subscribers.discard(callback)
+
+    def add_frame_listener(self, callback: Callable[[bytes], None]):
+        """
+        Have a callback called with every valid frame received from the
+        gateway, once the client has processed it, e.g. to pass it on.
+
+        Args:
+            callback (callable): called with the frame, header and checksum included
+        """
+        self._frame_listeners.add(callback)
+
+    def remove_frame_listener(self, callback: Callable[[bytes], None]):
+        self._frame_listeners.discard(callback)
+
+    def _record_zone_change(self, zone: int, fields):
+        changes = self._zone_changes.get(zone)
+
+        if changes is None:
+            self._zone_changes[zone] = set(fields)
+        else:
+            changes.update(fields)
+
+    def _show_pending(self, zone: int, values: Dict[str, Any], owner: object):
+        """
+        In optimistic mode, show the values a command is setting on the zone
+        until the command settles.
+
+        Args:
+            zone (int): the zone
+            values (dict): the `ZoneDetail` fields the command sets, and their values
+            owner (object): the command, to settle the values by
+        """
+        if not self._optimistic or not values or not self._zone_data or zone not in self._zone_data:
+            return
+
+        zone_info = self._zone_data[zone]
+        pending = self._zone_pending.setdefault(zone, {})
+        changed = []
+
+        for field, value in values.items():
+            current = getattr(zone_info, field)
+
+            if field in pending:
+                pending[field] = (pending[field][0], owner)
+            elif current != value:
+                pending[field] = (current, owner)
+            else:
+                continue
+
+            if current != value:
+                setattr(zone_info, field, value)
+
+            changed.append(field)
+
+        if not pending:
+            del self._zone_pending[zone]
+
+        if changed:
+            self._record_zone_change(zone, changed)
+            self._schedule_broadcast()
+
+    def _settle_pending(self, zone: int, owner: object):
+        """
+        Put back what the gateway confirmed in the fields a command is still
+        showing. After a command succeeded that's the value it set, otherwise
+        the value is rolled back.
+
+        Args:
+            zone (int): the zone
+            owner (object): the command
+        """
+        pending = self._zone_pending.get(zone)
+
+        if not pending:
+            return
+
+        zone_info = self._zone_data[zone]
+        settled = [field for field, (_, field_owner) in pending.items() if field_owner is owner]
+
+        for field in settled:
+            confirmed, _ = pending.pop(field)
+
+            if getattr(zone_info, field) != confirmed:
+                _LOGGER.debug("Rolling back %s of zone %d to %s", field, zone, confirmed)
+                setattr(zone_info, field, confirmed)
+
+        if not pending:
+            del self._zone_pending[zone]
+
+        if settled:
+            self._record_zone_change(zone, settled)
+            self._schedule_broadcast()
+
+    def _confirmed_zone(self, zone: int) -> ZoneView | ZoneDetail:
+        """
+        The state of a zone as the gateway last reported it, without the
+        values shown while commands are pending. Commands reason about this
+        state, not about what's shown.
+
+        Args:
+            zone (int): the zone
+
+        Returns:
+            ZoneView | ZoneDetail: the confirmed state of the zone
+        """
+        pending = self._zone_pending.get(zone)
+
+        if not pending:
+            return self.get_zone(zone)
+
+        return replace(self._zone_data[zone], **{field: confirmed for field, (confirmed, _) in pending.items()})
+
+    def _schedule_broadcast(self):
+        # every zone changed until the loop gets back to us goes out together,
+        # so a burst of frames is a single notification
+        if self._zone_changes and self._broadcast_handle is None:
+            self._broadcast_handle = self._loop.call_soon(self._broadcast)
+
+    def _broadcast(self):
+        self._broadcast_handle = None
+
+        if not self._zone_changes:
+            return
+
+        changes = {zone: frozenset(fields) for zone, fields in self._zone_changes.items()}
+        self._zone_changes.clear()
+
+        for callback in tuple(self._change_subscribers):
+            try:
+                callback(changes)
+            except Exception as e:
+                _LOGGER.exception(e)
+
+        for callback in tuple(self._subscribers):
+            for zone in sorted(changes):
+                try:
+                    callback(zone)
+                except Exception as e:
+                    _LOGGER.exception(e)
 
     async def _async_send_and_validate(
         self,
@@ -422,11 +1322,19 @@ class BaseClient(asyncio.Protocol):
         command: int,
         data_code: int,
         extra_data: bytearray = None,
-        follow_up = None
+        follow_up = None,
+        intent: str = None,
+        timeout: float = None,
+        expected: Dict[str, Any] = None,
     ):
         """
         Send a command to the gateway and parse the response.
 
+        The commands of a zone are queued and executed one at a time, in order.
+        A command with an intent replaces a queued command with the same intent
+        that hasn't been sent yet, e.g. when the volume is changed many times
+        in a row, only the latest volume is sent.
+
         Args:
             validate (callable): a function that validates the response
             zone (int): the zone to send this instruction to
@@ -434,50 +1342,243 @@ class BaseClient(asyncio.Protocol):
             data_code (int): the data value for the accompany command
             extra_data (bytes): the extra data to send with the command
             follow_up (tuple): a tuple of command and data_code to send after the initial command
+            intent (str): the setting this command changes, e.g. volume, source, mute
+            timeout (float): the most seconds to wait for the command, None to wait until it's done or fails
+            expected (dict): the `ZoneDetail` fields the command sets and their values, shown right away in optimistic mode
 
         Returns:
             bytes: the response of the command
+
+        Raises:
+            HtdTimeoutError: the command didn't complete within the timeout
+            HtdCommandRejectedError: the gateway didn't carry out the command
+            HtdDisconnectedError: the connection to the gateway was lost
+        """
+
+        queue = self._command_queues.get(zone)
+
+        if queue is None:
+            queue = self._command_queues[zone] = ZoneCommandQueue(self._async_execute_command)
+
+        command = QueuedCommand(validate, zone, command, data_code, extra_data, follow_up, intent)
+        self._show_pending(zone, expected, command)
+
+        try:
+            # on a timeout the command is cancelled, which withdraws it from the queue
+            return await self._async_with_timeout(queue.submit(command), timeout, zone)
+
+        except BaseException:
+            # its frames are taken back before the caller hears about it
+            self._scheduler.withdraw(command)
+            raise
+
+        finally:
+            self._settle_pending(zone, command)
+
+    @staticmethod
+    async def _async_with_timeout(awaitable, timeout: float | None, zone: int = None):
+        try:
+            async with asyncio.timeout(timeout):
+                return await awaitable
+
+        except HtdError:
+            raise
+
+        except TimeoutError:
+            raise HtdTimeoutError(f"Command for zone {zone} didn't complete within {timeout} seconds") from None
+
+    def _has_queued_intent(self, zone: int, intent: str) -> bool:
+        """
+        Check if a command for the zone with this intent is waiting to be sent,
+        in which case the current state of the zone isn't going to last.
+
+        Args:
+            zone (int): the zone
+            intent (str): the intent, e.g. volume
+
+        Returns:
+            bool: if a command is queued
         """
+        queue = self._command_queues.get(zone)
+        return queue is not None and queue.has_intent(intent)
 
+    async def _async_execute_command(self, queued: QueuedCommand):
+        """
+        Send a queued command to the gateway, retrying until it's validated.
+
+        Args:
+            queued (QueuedCommand): the command to execute
+        """
+
+        validate = queued.validate
+        zone = queued.zone
+
+        loop = asyncio.get_running_loop()
         attempts = 0
-        last_attempt_time = 0
+        retry_at = None
+        sent_at = None
 
-        while not validate(self.get_zone(zone)):
-            if int(time.time() - last_attempt_time) > self._command_retry_timeout:
-                attempts += 1
+        try:
+            while not validate(self._confirmed_zone(zone)):
+                if self._connection is None:
+                    raise HtdDisconnectedError(f"Not connected, can't execute command for zone {zone}")
+
+                error = self._zone_errors.pop(zone, None)
+
+                if error is not None and attempts > 0:
+                    raise HtdCommandRejectedError(f"Gateway rejected command for zone {zone} with code {error}")
+
+                if retry_at is None or loop.time() >= retry_at:
+                    attempts += 1
+
+                    if attempts > self._retry_attempts:
+                        raise HtdCommandRejectedError(f"Failed to execute command after {self._retry_attempts} attempts")
+
+                    # we only want to call refresh if we have already tried
+                    if attempts > 1:
+                        await self.refresh(zone, priority=HtdPriority.VALIDATION)
+
+                    await self._send_cmd(zone, queued.command, queued.data_code, queued.extra_data, owner=queued)
+
+                    # setting volume on lync requires you to unmute, so a followup command is used
+                    if queued.follow_up is not None:
+                        await self._send_cmd(zone, queued.follow_up[0], queued.follow_up[1], owner=queued)
+
+                    # the retry timer starts once the frames are expected to be
+                    # out, not while they're still waiting their turn
+                    sent_at = loop.time() + self._scheduler.drain_time(HtdPriority.INTERACTIVE)
+                    retry_at = sent_at + self._rtt.timeout(attempts, self._command_retry_timeout)
 
-                if attempts > self._retry_attempts:
-                    raise Exception(f"Failed to execute command after {self._retry_attempts} attempts")
+                # sleep until the gateway reports on the zone, or it's time to retry
+                await self._async_wait_for_zone(zone, retry_at - loop.time())
 
-                # we only want to call refresh if we have already tried
-                if attempts > 1:
-                    await self.refresh(zone)
+        except BaseException:
+            # a command that failed or was cancelled takes back what it hasn't sent yet
+            self._scheduler.withdraw(queued)
+            raise
 
-                await self._send_cmd(zone, command, data_code, extra_data)
+        # a command that was resent can't tell which of its sends took effect
+        if attempts == 1:
+            self._rtt.sample(loop.time() - sent_at)
 
-                # setting volume on lync requires you to unmute, so a followup command is used
-                if follow_up is not None:
-                    await self._send_cmd(zone, follow_up[0], follow_up[1])
+    async def _async_wait_for_zone(self, zone: int, timeout: float) -> bool:
+        """
+        Wait for the next status of a zone to be received.
+
+        Args:
+            zone (int): the zone to wait for
+            timeout (float): the most seconds to wait
+
+        Returns:
+            bool: if a status was received before the timeout
+        """
+        return await self._async_wait_for_zones((zone,), timeout)
+
+    async def _async_wait_for_zones(self, zones: Iterable[int], timeout: float) -> bool:
+        """
+        Wait for the next status of any of the zones to be received.
 
-                last_attempt_time = time.time()
-            await asyncio.sleep(0.1) # Wait for hardware response without hogging CPU
+        Args:
+            zones (Iterable[int]): the zones to wait for
+            timeout (float): the most seconds to wait
 
+        Returns:
+            bool: if a status was received before the timeout
+        """
+        loop = asyncio.get_running_loop()
+        waiting = []
 
+        for zone in zones:
+            waiter = loop.create_future()
+            self._zone_waiters.setdefault(zone, []).append(waiter)
+            waiting.append((zone, waiter))
+
+        try:
+            done, _ = await asyncio.wait(
+                [waiter for _, waiter in waiting],
+                timeout=max(timeout, 0),
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            return len(done) > 0
+
+        finally:
+            for zone, waiter in waiting:
+                if not waiter.done():
+                    waiter.cancel()
+                    waiters = self._zone_waiters[zone]
+                    waiters.remove(waiter)
+
+                    if not waiters:
+                        del self._zone_waiters[zone]
+
+    def _wake_zone_waiters(self, zone: int):
+        waiters = self._zone_waiters.pop(zone, None)
+
+        if waiters is None:
+            return
+
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
 
     async def _send_cmd(
         self,
         zone: int,
         command: int,
         data_code: int,
-        extra_data: bytearray = None
+        extra_data: bytearray = None,
+        priority: HtdPriority = HtdPriority.INTERACTIVE,
+        owner: object = None,
+        gap: float = None,
     ):
 
-        cmd = htd_client.utils.build_command(zone, command, data_code, extra_data)
+        cmd = self._frame_cache.get(zone, command, data_code, extra_data)
+
+        if self._wire_log.enabled:
+            self._wire_log.log("sending command", cmd)
+
+        # frames are paced to what the gateway keeps up with, and every frame
+        # released together goes out in a single write, in the order they were
+        # sent, the gateway handles a whole command per segment much better
+        # than fragments of one
+        self._scheduler.submit(cmd, priority, owner, gap)
+
+    def submit_frame(self, frame: bytes, priority: HtdPriority = HtdPriority.INTERACTIVE, owner: object = None):
+        """
+        Queue a frame that was built elsewhere, e.g. by a client behind a
+        proxy, to be written to the gateway, paced along with the client's own.
+        It's dropped when the client isn't connected by the time it goes out.
+
+        Args:
+            frame (bytes): the frame, header and checksum included
+            priority (HtdPriority): how urgent the frame is
+            owner (object): who sent the frame, to withdraw it by
+        """
+        if self._wire_log.enabled:
+            self._wire_log.log("sending frame", frame)
+
+        self._scheduler.submit(bytes(frame), priority, owner)
+
+    def withdraw_frames(self, owner: object) -> int:
+        """
+        Drop the frames of an owner that are still waiting to be written.
+
+        Args:
+            owner (object): who sent the frames
+
+        Returns:
+            int: the number of frames dropped
+        """
+        return self._scheduler.withdraw(owner)
 
-        _LOGGER.debug("sending command %s" % htd_client.utils.stringify_bytes(cmd))
+    def _write_frames(self, frames: List[bytes]):
+        if self._connection is None:
+            _LOGGER.debug("Not connected, dropping %d outgoing frames", len(frames))
+            return
 
-        async with self._socket_lock:
-            self._connection.write(cmd)
+        self._connection.writelines(frames)
+        self._writes += 1
+        self._frames_written += len(frames)
 
     def get_zone_count(self) -> int:
         """
@@ -497,37 +1598,156 @@ class BaseClient(asyncio.Protocol):
         """
         return self._model_info['sources']
 
-    def get_zone(self, zone: int):
+    def get_zone(self, zone: int) -> ZoneView:
         """
-        Query a zone and return `ZoneDetail`
+        Query a zone and return a read-only view of its `ZoneDetail`
 
         Args:
             zone (int): the zone
 
         Returns:
-            ZoneDetail: a ZoneDetail instance representing the zone requested
+            ZoneView: a live, read-only view of the zone requested
 
         Raises:
             Exception: zone X is invalid
         """
-        return self._zone_data[zone]
+        zone_info = self._zone_data[zone]
+        view = self._zone_views.get(zone)
+
+        if view is None or view._zone is not zone_info:
+            view = self._zone_views[zone] = ZoneView(zone_info)
 
-    async def async_toggle_mute(self, zone: int):
+        return view
+
+    async def async_toggle_mute(self, zone: int, timeout: float = None):
         """
         Toggle the mute state of a zone.
 
         Args:
             zone (int): the zone to toggle
+            timeout (float): the most seconds to wait for the command, None to wait until it's done or fails
         """
         zone_detail = self.get_zone(zone)
 
         if zone_detail.mute:
-            await self.async_unmute(zone)
+            await self.async_unmute(zone, timeout=timeout)
         else:
-            await self.async_mute(zone)
+            await self.async_mute(zone, timeout=timeout)
+
+    async def async_apply_scene(self, scene: Dict[int, ZoneDetail], timeout: float = None) -> Dict[int, SceneResult]:
+        """
+        Apply settings to many zones at once. For every zone, only the fields
+        set on its `ZoneDetail` are applied, anything left as None is kept as
+        is, and a zone that's powered off ignores its other fields. The
+        commands of every zone are sent in a single paced burst followed by a
+        refresh of all zones, and zones that don't match afterwards are sent
+        their remaining commands again, up to the retry attempts. A zone the
+        gateway hasn't reported on yet is left out, its result lists every
+        field it asked for as mismatched.
+
+        .. code-block:: python
+
+            results = await client.async_apply_scene({
+                1: ZoneDetail(1, power=True, source=3, volume=30),
+                2: ZoneDetail(2, power=False),
+            })
+
+        Args:
+            scene (Dict[int, ZoneDetail]): the zone number to the settings of the zone
+            timeout (float): the most seconds to wait for the scene, None to wait until it's done
+
+        Returns:
+            Dict[int, SceneResult]: the zone number to the outcome for the zone
+        """
+
+        return await self._async_with_timeout(self._async_apply_scene(scene), timeout)
+
+    async def _async_apply_scene(self, scene: Dict[int, ZoneDetail]) -> Dict[int, SceneResult]:
+        loop = asyncio.get_running_loop()
+        owner = asyncio.current_task()
+        # there's nothing to plan from for a zone that has no state yet
+        unknown = {zone: desired for zone, desired in scene.items() if not self.has_zone_data(zone)}
+        scene = {zone: desired for zone, desired in scene.items() if zone not in unknown}
+        pending = {zone: desired for zone, desired in scene.items() if self._scene_mismatches(zone, desired)}
+        attempts = 0
+
+        for zone, desired in pending.items():
+            self._show_pending(
+                zone,
+                {field: getattr(desired, field) for field in self._scene_mismatches(zone, desired)},
+                owner,
+            )
+
+        try:
+            while pending and attempts < self._retry_attempts:
+                attempts += 1
+
+                for zone, desired in pending.items():
+                    for command, data_code, extra_data in self._plan_scene_zone(self._confirmed_zone(zone), desired):
+                        await self._send_cmd(zone, command, data_code, extra_data, owner=owner)
+
+                # one refresh reports on every zone at once
+                await self.refresh(priority=HtdPriority.VALIDATION)
+
+                deadline = loop.time() + self._scheduler.drain_time(HtdPriority.VALIDATION) + self._rtt.timeout(
+                    attempts, self._command_retry_timeout
+                )
+
+                while pending:
+                    if self._connection is None:
+                        raise HtdDisconnectedError("Not connected, can't apply the scene")
+
+                    pending = {zone: desired for zone, desired in pending.items() if self._scene_mismatches(zone, desired)}
+
+                    if not pending or not await self._async_wait_for_zones(pending, deadline - loop.time()):
+                        break
+
+        except BaseException:
+            # a scene that failed or was cancelled takes back what it hasn't sent yet
+            self._scheduler.withdraw(owner)
+            raise
+
+        finally:
+            for zone in scene:
+                self._settle_pending(zone, owner)
+
+        results = {zone: SceneResult(self._scene_mismatches(zone, desired)) for zone, desired in scene.items()}
+
+        for zone, desired in unknown.items():
+            asked = [field for field in SCENE_FIELDS if getattr(desired, field) is not None]
+            results[zone] = SceneResult(frozenset(("power",) if desired.power is False else asked))
+
+        return results
+
+    def _scene_mismatches(self, zone: int, desired: ZoneDetail) -> frozenset:
+        current = self._confirmed_zone(zone)
+
+        # nothing but the power matters on a zone that's to be off
+        if desired.power is False:
+            return frozenset(() if current.power is False else ("power",))
+
+        return frozenset(
+            field for field in SCENE_FIELDS
+            if getattr(desired, field) is not None and getattr(desired, field) != getattr(current, field)
+        )
 
     @abstractmethod
-    async def refresh(self, zone: int = None):
+    def _plan_scene_zone(self, current: ZoneView, desired: ZoneDetail) -> List[PlannedCommand]:
+        """
+        Plan the commands that take a zone from its current state to the
+        settings of a scene, in the order they're to be sent.
+
+        Args:
+            current (ZoneView): the current state of the zone
+            desired (ZoneDetail): the settings of the scene for the zone
+
+        Returns:
+            List[PlannedCommand]: the command, data code and extra data to send
+        """
+        pass
+
+    @abstractmethod
+    async def refresh(self, zone: int = None, priority: HtdPriority = HtdPriority.INTERACTIVE):
         pass
 
     @abstractmethod
@@ -539,57 +1759,60 @@ class BaseClient(asyncio.Protocol):
         pass
 
     @abstractmethod
-    async def async_set_source(self, zone: int, source: int):
+    async def async_set_source(self, zone: int, source: int, timeout: float = None):
         pass
 
     @abstractmethod
-    async def async_volume_up(self, zone: int):
+    async def async_volume_up(self, zone: int, timeout: float = None):
         pass
 
     @abstractmethod
-    async def async_set_volume(self, zone: int, volume: int):
+    async def async_set_volume(self, zone: int, volume: int, timeout: float = None):
         pass
 
     @abstractmethod
-    async def async_volume_down(self, zone: int):
+    async def async_volume_down(self, zone: int, timeout: float = None):
         pass
 
     @abstractmethod
-    async def async_mute(self, zone: int):
+    async def async_mute(self, zone: int, timeout: float = None):
         pass
 
     @abstractmethod
-    async def async_unmute(self, zone: int):
+    async def async_unmute(self, zone: int, timeout: float = None):
         pass
 
     @abstractmethod
-    async def async_power_on(self, zone: int):
+    async def async_power_on(self, zone: int, timeout: float = None):
         pass
 
     @abstractmethod
-    async def async_power_off(self, zone: int):
+    async def async_power_off(self, zone: int, timeout: float = None):
         pass
 
     @abstractmethod
-    async def async_bass_up(self, zone: int):
+    async def async_bass_up(self, zone: int, timeout: float = None):
         pass
 
     @abstractmethod
-    async def async_bass_down(self, zone: int):
+    async def async_bass_down(self, zone: int, timeout: float = None):
         pass
 
     @abstractmethod
-    async def async_treble_up(self, zone: int):
+    async def async_treble_up(self, zone: int, timeout: float = None):
         pass
 
     @abstractmethod
-    async def async_treble_down(self, zone: int):
+    async def async_treble_down(self, zone: int, timeout: float = None):
         pass
 
     @abstractmethod
-    async def async_balance_left(self, zone: int):
+    async def async_balance_left(self, zone: int, timeout: float = None):
         pass
 
     @abstractmethod
-    async def async_balance_right(self, zone: int):
+    async def async_balance_right(self, zone: int, timeout: float = None):
         pass
+
+
+BaseClient._receive_handlers = BaseClient._build_receive_handlers()
@@ -0,0 +1,148 @@
+import asyncio
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Tuple
+
+from .exceptions import HtdError
+
+
+class QueuedCommand:
+    """
+    A command waiting its turn to be sent to a zone and validated.
+
+    Args:
+        validate (callable): a function that validates the zone once the command took effect
+        zone (int): the zone to send this instruction to
+        command (int): the command to send
+        data_code (int): the data value for the accompany command
+        extra_data (bytes): the extra data to send with the command
+        follow_up (tuple): a tuple of command and data_code to send after the initial command
+        intent (str): what the command sets, e.g. volume, a newer command with the same
+        intent replaces this one while it's still queued
+    """
+
+    __slots__ = ("validate", "zone", "command", "data_code", "extra_data", "follow_up", "intent", "future")
+
+    def __init__(
+        self,
+        validate: Callable,
+        zone: int,
+        command: int,
+        data_code: int,
+        extra_data: bytearray = None,
+        follow_up: Tuple[int, int] = None,
+        intent: str = None,
+    ):
+        self.validate = validate
+        self.zone = zone
+        self.command = command
+        self.data_code = data_code
+        self.extra_data = extra_data
+        self.follow_up = follow_up
+        self.intent = intent
+        self.future: asyncio.Future | None = None
+
+
+def _forward_result(source: asyncio.Future, target: asyncio.Future):
+    if target.done():
+        return
+
+    if source.cancelled():
+        # the newer caller gave up, e.g. it timed out, that's not a cancellation of the older one
+        target.set_exception(HtdError("The command was replaced by a newer one that was withdrawn"))
+    elif source.exception() is not None:
+        target.set_exception(source.exception())
+    else:
+        target.set_result(source.result())
+
+
+class ZoneCommandQueue:
+    """
+    Runs the commands of a single zone one at a time, in the order they were
+    submitted. When a command with an intent is submitted while another with
+    the same intent is still waiting, the newer one takes the older one's
+    place in the queue, so only the latest volume, source, etc. goes on the
+    wire. Whoever submitted the replaced command gets the outcome of the
+    command that replaced it, or an `HtdError` when that one is withdrawn
+    before it completes.
+
+    Args:
+        execute (callable): the coroutine function that sends and validates a command
+    """
+
+    def __init__(self, execute: Callable[[QueuedCommand], Awaitable[Any]]):
+        self._execute = execute
+        self._pending: Deque[QueuedCommand] = deque()
+        self._task: asyncio.Task | None = None
+
+    def __len__(self):
+        return len(self._pending)
+
+    def has_intent(self, intent: str) -> bool:
+        """
+        Returns:
+            bool: if a command with the intent is waiting to be executed
+        """
+        return any(queued.intent == intent for queued in self._pending)
+
+    def submit(self, command: QueuedCommand) -> asyncio.Future:
+        """
+        Queue a command to be executed.
+
+        Args:
+            command (QueuedCommand): the command
+
+        Returns:
+            asyncio.Future: resolved with the outcome of the command
+        """
+        loop = asyncio.get_running_loop()
+        command.future = loop.create_future()
+
+        if not self._replace(command):
+            self._pending.append(command)
+
+        if self._task is None or self._task.done():
+            self._task = loop.create_task(self._run())
+
+        return command.future
+
+    def _replace(self, command: QueuedCommand) -> bool:
+        if command.intent is None:
+            return False
+
+        for index, queued in enumerate(self._pending):
+            if queued.intent == command.intent and not queued.future.done():
+                self._pending[index] = command
+                command.future.add_done_callback(
+                    lambda future, replaced=queued.future: _forward_result(future, replaced)
+                )
+                return True
+
+        return False
+
+    async def _run(self):
+        while self._pending:
+            command = self._pending.popleft()
+
+            # the caller gave up on it while it was waiting
+            if command.future.done():
+                continue
+
+            # giving up on the command, e.g. a timeout, stops its execution
+            execution = asyncio.ensure_future(self._execute(command))
+            command.future.add_done_callback(lambda _, execution=execution: execution.cancel())
+
+            try:
+                result = await execution
+
+            except asyncio.CancelledError:
+                # only the command was cancelled, carry on with the next one
+                if not execution.cancelled() or not command.future.done():
+                    raise
+
+            except Exception as e:
+                if not command.future.done():
+                    command.future.set_exception(e)
+
+            else:
+                if not command.future.done():
+                    command.future.set_result(result)
@@ -1,5 +1,5 @@
-from enum import Enum
-from typing import TypedDict, Dict
+from enum import Enum, IntEnum
+from typing import TypedDict, Dict, Optional
 
 MAX_BYTES_TO_RECEIVE = 2 ** 10  # receive 1024 bytes
 ONE_SECOND = 1_000
@@ -10,6 +10,19 @@ class HtdDeviceKind(Enum):
     lync = "lync"
 
 
+class HtdPriority(IntEnum):
+    """
+    The order outgoing frames are written in, lower goes first. Frames of a
+    lower priority wait while any of a higher priority are queued.
+    """
+    # commands a user is waiting on
+    INTERACTIVE = 0
+    # refreshes validating a command
+    VALIDATION = 1
+    # heartbeats and other housekeeping
+    BACKGROUND = 2
+
+
 class HtdModelInfo(TypedDict):
     zones: int
     sources: int
@@ -19,6 +32,30 @@ class HtdModelInfo(TypedDict):
     identifier: bytes
 
 
+class HtdPacing(TypedDict):
+    # seconds between two frames written to the gateway
+    min_gap: float
+    # frames per second the gateway keeps up with
+    rate: float
+    # frames that go out ahead of the rate, each still min_gap apart
+    burst: int
+
+
+class HtdSocketOptions(TypedDict):
+    # write small frames right away, instead of waiting to fill a segment
+    nodelay: bool
+    # have the kernel probe an idle connection, to notice a gateway that's gone
+    keepalive: bool
+    # seconds idle before the first probe, seconds between probes, and the
+    # unanswered probes before the connection is dropped
+    keepalive_idle: int
+    keepalive_interval: int
+    keepalive_count: int
+    # the size of the send and receive buffers in bytes, None for the system default
+    send_buffer: Optional[int]
+    receive_buffer: Optional[int]
+
+
 class HtdConstants:
     """
     A constants class representing values used.
@@ -66,9 +103,51 @@ class HtdConstants:
     # is not what we expect, we will retry the command after this amount of time
     DEFAULT_COMMAND_RETRY_TIMEOUT = .5
 
+    # once the round trip time to a gateway is measured, the retry timeout is
+    # derived from it, within these bounds
+    MIN_COMMAND_RETRY_TIMEOUT = .05
+    MAX_COMMAND_RETRY_TIMEOUT = 5
+
+    # how long the gateway has to tell its model when connecting, in seconds
+    MODEL_QUERY_TIMEOUT = 5
+
+    # a zone the gateway hasn't reported on for this many seconds is
+    # refreshed, and a link that's been quiet as long is probed
+    DEFAULT_HEARTBEAT_INTERVAL = 60
+
+    # a probed link that doesn't answer within this many seconds is dropped
+    DEFAULT_HEARTBEAT_TIMEOUT = 10
+
+    # network connections are tuned for small frames, and a gateway that
+    # disappears is noticed by the kernel within about 11 seconds
+    DEFAULT_SOCKET_OPTIONS: HtdSocketOptions = {
+        "nodelay": True,
+        "keepalive": True,
+        "keepalive_idle": 5,
+        "keepalive_interval": 2,
+        "keepalive_count": 3,
+        "send_buffer": None,
+        "receive_buffer": None,
+    }
+
     # the device is flakey, let's retry a bunch of times
     DEFAULT_RETRY_ATTEMPTS = 3
 
+    # the gateways drop commands that arrive faster than the firmware handles
+    # them, so outgoing frames are paced per device kind
+    DEFAULT_PACING: Dict[HtdDeviceKind, HtdPacing] = {
+        HtdDeviceKind.mca: {
+            "min_gap": 0.05,
+            "rate": 10,
+            "burst": 4,
+        },
+        HtdDeviceKind.lync: {
+            "min_gap": 0.02,
+            "rate": 25,
+            "burst": 8,
+        },
+    }
+
     # the port of the device, default is 10006
     DEFAULT_PORT = 10006
 
@@ -106,6 +185,7 @@ class HtdConstants:
     POWER_STATE_TOGGLE_INDEX = 0
     MUTE_STATE_TOGGLE_INDEX = 1
     MODE_STATE_TOGGLE_INDEX = 2
+    PARTY_STATE_TOGGLE_INDEX = 3
 
     # the byte index for where to locate the corresponding setting
     SOURCE_ZONE_DATA_INDEX = 4
@@ -136,27 +216,15 @@ class HtdCommonCommands:
     MP3_OFF_RECEIVE_COMMAND = 0x14
     ERROR_RECEIVE_COMMAND = 0x1b
 
-    EXPECTED_MESSAGE_LENGTH_MAP = {
-        UNDEFINED_RECEIVE_COMMAND: 1,
-        ZONE_STATUS_RECEIVE_COMMAND: 9,
-        KEYPAD_EXISTS_RECEIVE_COMMAND: 9,
-        MP3_PLAY_END_RECEIVE_COMMAND: 1,
-        ZONE_SOURCE_NAME_RECEIVE_COMMAND_MCA: 9,
-        ZONE_SOURCE_NAME_RECEIVE_COMMAND_LYNC: 12,
-        ZONE_NAME_RECEIVE_COMMAND: 13,  # should be 11
-        SOURCE_NAME_RECEIVE_COMMAND: 13,  # should be 11
-        MP3_FILE_NAME_RECEIVE_COMMAND: 64,
-        MP3_ARTIST_NAME_RECEIVE_COMMAND: 64,
-        MP3_ON_RECEIVE_COMMAND: 1,
-        MP3_OFF_RECEIVE_COMMAND: 17,
-        ERROR_RECEIVE_COMMAND: 9,
-    }
-
 class HtdMcaConstants:
     # when setting the source, you use the SET command and add this to the
     # source number desired, e.g Zone 3 + 2 = data value 5, or 0x05 for mca
     SOURCE_COMMAND_OFFSET = 2
 
+    # the mca only steps the volume up or down, this many steps are sent
+    # ahead of the gateway confirming them when ramping to a volume
+    VOLUME_RAMP_WINDOW = 4
+
 
 class HtdLyncCommands:
     COMMON_COMMAND_CODE = 0x04
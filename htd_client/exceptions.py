@@ -0,0 +1,24 @@
+class HtdError(Exception):
+    """
+    The base of the errors raised by the client.
+    """
+
+
+class HtdTimeoutError(HtdError, TimeoutError):
+    """
+    A command didn't complete within its timeout.
+    """
+
+
+class HtdCommandRejectedError(HtdError):
+    """
+    The gateway didn't carry out a command, it reported an error for the
+    zone, or never reported the change after every attempt.
+    """
+
+
+class HtdDisconnectedError(HtdError, ConnectionError):
+    """
+    The connection to the gateway was lost, or never made, while a command
+    was waiting on it.
+    """
@@ -13,11 +13,12 @@
 """
 import asyncio
 import logging
-from typing import Tuple
+from typing import Iterable, List, Tuple
 
 import htd_client.utils
-from .base_client import BaseClient
-from .constants import HtdConstants, HtdLyncCommands, HtdLyncConstants, HtdModelInfo
+from .base_client import BaseClient, PlannedCommand, receive_command
+from .constants import HtdCommonCommands, HtdConstants, HtdLyncCommands, HtdLyncConstants, HtdModelInfo, HtdPriority
+from .models import ZoneDetail, ZoneView
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -33,6 +34,7 @@ class HtdLyncClient(BaseClient):
         network_address (Tuple[str, int]): ip address and port of the gateway
         retry_attempts(int): if a response is not valid or incorrect,
         socket_timeout(int): the amount of time before we will time out from the device, in milliseconds
+        optimistic (bool): show the values being set right away, before the gateway confirms them
     """
 
     def __init__(
@@ -44,6 +46,7 @@ class HtdLyncClient(BaseClient):
         command_retry_timeout: int = HtdConstants.DEFAULT_COMMAND_RETRY_TIMEOUT,
         retry_attempts: int = HtdConstants.DEFAULT_RETRY_ATTEMPTS,
         socket_timeout: int = HtdConstants.DEFAULT_SOCKET_TIMEOUT,
+        optimistic: bool = False,
     ):
 
         super().__init__(
@@ -54,15 +57,76 @@ class HtdLyncClient(BaseClient):
             command_retry_timeout=command_retry_timeout,
             retry_attempts=retry_attempts,
             socket_timeout=socket_timeout,
+            optimistic=optimistic,
         )
 
-    async def async_set_volume(self, zone: int, volume: int):
+    @classmethod
+    def _frame_cache_codes(cls, model_info: HtdModelInfo) -> Iterable[Tuple[int, int]]:
+        common = HtdLyncCommands.COMMON_COMMAND_CODE
+
+        yield HtdLyncCommands.QUERY_COMMAND_CODE, 1
+
+        for data_code in (
+            HtdLyncCommands.POWER_ON_ZONE_COMMAND_CODE,
+            HtdLyncCommands.POWER_OFF_ZONE_COMMAND_CODE,
+            HtdLyncCommands.POWER_ON_ALL_ZONES_COMMAND_CODE,
+            HtdLyncCommands.POWER_OFF_ALL_ZONES_COMMAND_CODE,
+            HtdLyncCommands.MUTE_ON_COMMAND_CODE,
+            HtdLyncCommands.MUTE_OFF_COMMAND_CODE,
+        ):
+            yield common, data_code
+
+        for source in range(1, model_info["sources"] + 1):
+            yield common, cls._source_data(model_info, source)
+
+        for volume in range(HtdConstants.MAX_VOLUME + 1):
+            yield HtdLyncCommands.VOLUME_SETTING_CONTROL_COMMAND_CODE, htd_client.utils.convert_volume_to_raw(volume)
+
+    @staticmethod
+    def _source_data(model_info: HtdModelInfo, source: int) -> int:
+        if source == model_info["sources"]:
+            return HtdLyncConstants.INTERCOM_SOURCE_DATA
+
+        source_offset = HtdLyncConstants.SOURCE_13_HIGHER_COMMAND_OFFSET if source > 12 else HtdLyncConstants.SOURCE_COMMAND_OFFSET
+        return source + source_offset
+
+    @receive_command(HtdCommonCommands.ZONE_SOURCE_NAME_RECEIVE_COMMAND_LYNC, 12)
+    def _on_zone_source_name(self, zone: int, data: bytes):
+        # remove the extra null bytes
+        zone_source_name = str(bytes(data[0:11]).decode().rstrip('\0')).lower()
+
+    @receive_command(HtdCommonCommands.MP3_PLAY_END_RECEIVE_COMMAND, 1)
+    def _on_mp3_play_end(self, zone: int, data: bytes):
+        pass
+
+    @receive_command(HtdCommonCommands.MP3_ON_RECEIVE_COMMAND, 1)
+    def _on_mp3_on(self, zone: int, data: bytes):
+        # self.mp3_status['state'] = 'on'
+        pass
+
+    @receive_command(HtdCommonCommands.MP3_OFF_RECEIVE_COMMAND, 17)
+    def _on_mp3_off(self, zone: int, data: bytes):
+        # self.mp3_status['state'] = 'off'
+        pass
+
+    @receive_command(HtdCommonCommands.MP3_FILE_NAME_RECEIVE_COMMAND, 64)
+    def _on_mp3_file_name(self, zone: int, data: bytes):
+        # self.mp3_status['file'] = data.decode().rstrip('\0')
+        pass
+
+    @receive_command(HtdCommonCommands.MP3_ARTIST_NAME_RECEIVE_COMMAND, 64)
+    def _on_mp3_artist_name(self, zone: int, data: bytes):
+        # self.mp3_status['artist'] = data.decode().rstrip('\0')
+        pass
+
+    async def async_set_volume(self, zone: int, volume: int, timeout: float = None):
         """
         Set the volume of a zone.
 
         Args:
             zone (int): the zone
             volume (int): the volume to set as an HTD value, usually between 0 and 60 (HtdConstants.MAX_VOLUME)
+            timeout (float): the most seconds to wait for the command, None to wait until it's done or fails
         """
 
         volume_raw = htd_client.utils.convert_volume_to_raw(volume)
@@ -72,21 +136,26 @@ class HtdLyncClient(BaseClient):
             zone,
             HtdLyncCommands.VOLUME_SETTING_CONTROL_COMMAND_CODE,
             volume_raw,
-            follow_up=(HtdLyncCommands.COMMON_COMMAND_CODE, HtdLyncCommands.MUTE_OFF_COMMAND_CODE)
+            follow_up=(HtdLyncCommands.COMMON_COMMAND_CODE, HtdLyncCommands.MUTE_OFF_COMMAND_CODE),
+            intent="volume",
+            expected={"volume": volume},
+            timeout=timeout,
         )
 
 
-    async def refresh(self, zone: int = None):
+    async def refresh(self, zone: int = None, priority: HtdPriority = HtdPriority.INTERACTIVE):
         """
         Refresh a zone or all zones.
 
         Args:
             zone (int): the zone to refresh, or None to refresh all zones
+            priority (HtdPriority): how urgent the refresh is
         """
         await self._send_cmd(
             zone if zone is not None else 0,
             HtdLyncCommands.QUERY_COMMAND_CODE,
-            1
+            1,
+            priority=priority,
         )
 
     async def power_on_all_zones(self):
@@ -111,33 +180,32 @@ class HtdLyncClient(BaseClient):
             HtdLyncCommands.POWER_OFF_ALL_ZONES_COMMAND_CODE
         )
 
-    async def async_set_source(self, zone: int, source: int):
+    async def async_set_source(self, zone: int, source: int, timeout: float = None):
         """
         Set the source of a zone.
 
         Args:
             zone (int): the zone
             source (int): the source to set
+            timeout (float): the most seconds to wait for the command, None to wait until it's done or fails
         """
-        if source == self.model["sources"]:
-            source_data = HtdLyncConstants.INTERCOM_SOURCE_DATA
-        else:
-            source_offset = HtdLyncConstants.SOURCE_13_HIGHER_COMMAND_OFFSET if source > 12 else HtdLyncConstants.SOURCE_COMMAND_OFFSET
-            source_data = source + source_offset
-
         return await self._async_send_and_validate(
             lambda z: z.source == source,
             zone,
             HtdLyncCommands.COMMON_COMMAND_CODE,
-            source_data,
+            self._source_data(self.model, source),
+            intent="source",
+            expected={"source": source},
+            timeout=timeout,
         )
 
-    async def async_volume_up(self, zone: int):
+    async def async_volume_up(self, zone: int, timeout: float = None):
         """
         Increase the volume of a zone.
 
         Args:
             zone (int): the zone
+            timeout (float): the most seconds to wait for the command, None to wait until it's done or fails
         """
 
         current_zone = self.get_zone(zone)
@@ -147,14 +215,15 @@ class HtdLyncClient(BaseClient):
         if new_volume > HtdConstants.MAX_VOLUME:
             return
 
-        await self.async_set_volume(zone, new_volume)
+        await self.async_set_volume(zone, new_volume, timeout=timeout)
 
-    async def async_volume_down(self, zone: int):
+    async def async_volume_down(self, zone: int, timeout: float = None):
         """
         Decrease the volume of a zone.
 
         Args:
             zone (int): the zone
+            timeout (float): the most seconds to wait for the command, None to wait until it's done or fails
         """
 
         current_zone = self.get_zone(zone)
@@ -164,74 +233,91 @@ class HtdLyncClient(BaseClient):
         if new_volume < 0:
             return
 
-        await self.async_set_volume(zone, new_volume)
+        await self.async_set_volume(zone, new_volume, timeout=timeout)
 
-    async def async_mute(self, zone: int):
+    async def async_mute(self, zone: int, timeout: float = None):
         """
         Toggle the mute state of a zone.
 
         Args:
             zone (int): the zone
+            timeout (float): the most seconds to wait for the command, None to wait until it's done or fails
         """
 
         await self._async_send_and_validate(
             lambda z: z.mute,
             zone,
             HtdLyncCommands.COMMON_COMMAND_CODE,
-            HtdLyncCommands.MUTE_ON_COMMAND_CODE
+            HtdLyncCommands.MUTE_ON_COMMAND_CODE,
+            intent="mute",
+            expected={"mute": True},
+            timeout=timeout,
         )
 
-    async def async_unmute(self, zone: int):
+    async def async_unmute(self, zone: int, timeout: float = None):
         """
         Unmute this zone.
 
         Args:
             zone (int): the zone
+            timeout (float): the most seconds to wait for the command, None to wait until it's done or fails
         """
 
         await self._async_send_and_validate(
             lambda z: not z.mute,
             zone,
             HtdLyncCommands.COMMON_COMMAND_CODE,
-            HtdLyncCommands.MUTE_OFF_COMMAND_CODE
+            HtdLyncCommands.MUTE_OFF_COMMAND_CODE,
+            intent="mute",
+            expected={"mute": False},
+            timeout=timeout,
         )
 
-    async def async_power_on(self, zone: int):
+    async def async_power_on(self, zone: int, timeout: float = None):
         """
         Power on a zone.
 
         Args:
             zone (int): the zone
+            timeout (float): the most seconds to wait for the command, None to wait until it's done or fails
         """
 
         await self._async_send_and_validate(
             lambda z: z.power,
             zone,
             HtdLyncCommands.COMMON_COMMAND_CODE,
-            HtdLyncCommands.POWER_ON_ZONE_COMMAND_CODE
+            HtdLyncCommands.POWER_ON_ZONE_COMMAND_CODE,
+            intent="power",
+            expected={"power": True},
+            timeout=timeout,
         )
 
-    async def async_power_off(self, zone: int):
+    async def async_power_off(self, zone: int, timeout: float = None):
         """
         Power off a zone.
 
         Args:
             zone (int): the zone
+            timeout (float): the most seconds to wait for the command, None to wait until it's done or fails
         """
 
         await self._async_send_and_validate(
             lambda z: not z.power,
             zone,
             HtdLyncCommands.COMMON_COMMAND_CODE,
-            HtdLyncCommands.POWER_OFF_ZONE_COMMAND_CODE
+            HtdLyncCommands.POWER_OFF_ZONE_COMMAND_CODE,
+            intent="power",
+            expected={"power": False},
+            timeout=timeout,
         )
 
-    async def async_bass_up(self, zone: int):
+    async def async_bass_up(self, zone: int, timeout: float = None):
         """
         Increase the bass of a zone.
 
         Args:
              zone (int): the zone
+            timeout (float): the most seconds to wait for the command, None to wait until it's done or fails
         """
 
         current_zone = self.get_zone(zone)
@@ -240,14 +326,15 @@ class HtdLyncClient(BaseClient):
         if new_bass >= HtdConstants.MAX_BASS:
             return
 
-        await self.async_set_bass(zone, new_bass)
+        await self.async_set_bass(zone, new_bass, timeout=timeout)
 
-    async def async_bass_down(self, zone: int):
+    async def async_bass_down(self, zone: int, timeout: float = None):
         """
         Decrease the bass of a zone.
 
         Args:
              zone (int): the zone
+            timeout (float): the most seconds to wait for the command, None to wait until it's done or fails
         """
 
         current_zone = self.get_zone(zone)
@@ -256,19 +343,20 @@ class HtdLyncClient(BaseClient):
         if new_bass < HtdConstants.MIN_BASS:
             return
 
-        await self.async_set_bass(zone, new_bass)
+        await self.async_set_bass(zone, new_bass, timeout=timeout)
 
-    async def async_set_bass(self, zone: int, bass: int):
+    async def async_set_bass(self, zone: int, bass: int, timeout: float = None):
         """
         Set the bass of a zone.
 
         Args:
             zone (int): the zone
             bass (int): the bass value to set
+            timeout (float): the most seconds to wait for the command, None to wait until it's done or fails
         """
         zone_info = self.get_zone(zone)
 
-        if zone_info.bass == bass:
+        if zone_info.bass == bass and not self._has_queued_intent(zone, "bass"):
             return
 
         return await self._async_send_and_validate(
@@ -276,15 +364,19 @@ class HtdLyncClient(BaseClient):
             zone,
             HtdLyncCommands.COMMON_COMMAND_CODE,
             HtdLyncCommands.BASS_SETTING_CONTROL_COMMAND_CODE,
-            bytearray([bass])
+            bytearray([bass]),
+            intent="bass",
+            expected={"bass": bass},
+            timeout=timeout,
         )
 
-    async def async_treble_up(self, zone: int):
+    async def async_treble_up(self, zone: int, timeout: float = None):
         """
         Increase the treble of a zone.
 
         Args:
              zone (int): the zone
+            timeout (float): the most seconds to wait for the command, None to wait until it's done or fails
         """
 
         current_zone = self.get_zone(zone)
@@ -293,14 +385,15 @@ class HtdLyncClient(BaseClient):
         if new_treble >= HtdConstants.MAX_TREBLE:
             return
 
-        await self.async_set_treble(zone, new_treble)
+        await self.async_set_treble(zone, new_treble, timeout=timeout)
 
-    async def async_treble_down(self, zone: int):
+    async def async_treble_down(self, zone: int, timeout: float = None):
         """
         Decrease the treble of a zone.
 
         Args:
              zone (int): the zone
+            timeout (float): the most seconds to wait for the command, None to wait until it's done or fails
         """
 
         current_zone = self.get_zone(zone)
@@ -309,20 +402,21 @@ class HtdLyncClient(BaseClient):
         if new_treble < HtdConstants.MIN_TREBLE:
             return
 
-        await self.async_set_treble(zone, new_treble)
+        await self.async_set_treble(zone, new_treble, timeout=timeout)
 
-    async def async_set_treble(self, zone: int, treble: int):
+    async def async_set_treble(self, zone: int, treble: int, timeout: float = None):
         """
         Set the treble of a zone.
 
         Args:
             zone (int): the zone
             treble (int): the treble value to set
+            timeout (float): the most seconds to wait for the command, None to wait until it's done or fails
         """
 
         zone_info = self.get_zone(zone)
 
-        if treble == zone_info.treble:
+        if treble == zone_info.treble and not self._has_queued_intent(zone, "treble"):
             return
 
         return await self._async_send_and_validate(
@@ -330,15 +424,19 @@ class HtdLyncClient(BaseClient):
             zone,
             HtdLyncCommands.COMMON_COMMAND_CODE,
             HtdLyncCommands.TREBLE_SETTING_CONTROL_COMMAND_CODE,
-            bytearray([treble])
+            bytearray([treble]),
+            intent="treble",
+            expected={"treble": treble},
+            timeout=timeout,
         )
 
-    async def async_balance_left(self, zone: int):
+    async def async_balance_left(self, zone: int, timeout: float = None):
         """
         Increase the balance of a zone to the left.
 
         Args:
              zone (int): the zone
+            timeout (float): the most seconds to wait for the command, None to wait until it's done or fails
         """
 
         current_zone = self.get_zone(zone)
@@ -347,14 +445,15 @@ class HtdLyncClient(BaseClient):
         if new_balance < HtdConstants.MIN_BALANCE:
             return
 
-        await self.async_set_balance(zone, new_balance)
+        await self.async_set_balance(zone, new_balance, timeout=timeout)
 
-    async def async_balance_right(self, zone: int):
+    async def async_balance_right(self, zone: int, timeout: float = None):
         """
         Increase the balance of a zone to the right.
 
         Args:
              zone (int): the zone
+            timeout (float): the most seconds to wait for the command, None to wait until it's done or fails
         """
 
         current_zone = self.get_zone(zone)
@@ -363,29 +462,71 @@ class HtdLyncClient(BaseClient):
         if new_balance > HtdConstants.MAX_BALANCE:
             return
 
-        await self.async_set_balance(zone, new_balance)
+        await self.async_set_balance(zone, new_balance, timeout=timeout)
 
-    async def async_set_balance(self, zone: int, balance: int):
+    async def async_set_balance(self, zone: int, balance: int, timeout: float = None):
         """
         Set the balance of a zone.
 
         Args:
             zone (int): the zone
             balance (int): the balance value to set
+            timeout (float): the most seconds to wait for the command, None to wait until it's done or fails
         """
 
         current_zone = self.get_zone(zone)
 
-        if balance == current_zone.balance:
+        if balance == current_zone.balance and not self._has_queued_intent(zone, "balance"):
             return
 
         return await self._async_send_and_validate(
             lambda z: z.balance == balance,
             zone,
             HtdLyncCommands.BALANCE_SETTING_CONTROL_COMMAND_CODE,
-            balance
+            balance,
+            intent="balance",
+            expected={"balance": balance},
+            timeout=timeout,
         )
 
+    def _plan_scene_zone(self, current: ZoneView, desired: ZoneDetail) -> List[PlannedCommand]:
+        common = HtdLyncCommands.COMMON_COMMAND_CODE
+        planned = []
+
+        if desired.power is not None and desired.power != current.power:
+            power = HtdLyncCommands.POWER_ON_ZONE_COMMAND_CODE if desired.power else HtdLyncCommands.POWER_OFF_ZONE_COMMAND_CODE
+            planned.append((common, power, None))
+
+        if desired.power is False:
+            return planned
+
+        if desired.source is not None and desired.source != current.source:
+            planned.append((common, self._source_data(self.model, desired.source), None))
+
+        mute = desired.mute if desired.mute != current.mute else None
+
+        if desired.volume is not None and desired.volume != current.volume:
+            volume_raw = htd_client.utils.convert_volume_to_raw(desired.volume)
+            planned.append((HtdLyncCommands.VOLUME_SETTING_CONTROL_COMMAND_CODE, volume_raw, None))
+
+            # setting the volume requires unmuting, unless the scene mutes it
+            if desired.mute is not True:
+                mute = False
+
+        if mute is not None:
+            planned.append((common, HtdLyncCommands.MUTE_ON_COMMAND_CODE if mute else HtdLyncCommands.MUTE_OFF_COMMAND_CODE, None))
+
+        if desired.bass is not None and desired.bass != current.bass:
+            planned.append((common, HtdLyncCommands.BASS_SETTING_CONTROL_COMMAND_CODE, bytearray([desired.bass])))
+
+        if desired.treble is not None and desired.treble != current.treble:
+            planned.append((common, HtdLyncCommands.TREBLE_SETTING_CONTROL_COMMAND_CODE, bytearray([desired.treble])))
+
+        if desired.balance is not None and desired.balance != current.balance:
+            planned.append((HtdLyncCommands.BALANCE_SETTING_CONTROL_COMMAND_CODE, desired.balance, None))
+
+        return planned
+
     # def query_zone_name(self, zone: int) -> str:
     #     """
     #     Query a zone and return `ZoneDetail`
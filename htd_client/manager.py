@@ -0,0 +1,261 @@
+import asyncio
+import logging
+import random
+from typing import Awaitable, Callable, Dict, Iterable, Iterator, NamedTuple, Set, Tuple
+
+import htd_client
+from .base_client import BaseClient, WriteStats
+from .scheduler import SchedulerStats
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class GatewayStats(NamedTuple):
+    connected: bool
+    ready: bool
+    # the smoothed round trip time in seconds, None until measured
+    rtt: float | None
+    scheduler: SchedulerStats
+    writes: WriteStats
+
+
+class HtdGatewayManager:
+    """
+    Runs the clients of many gateways on one event loop. Gateways are added
+    by name, and can be put in groups, e.g. per building, to act on a group
+    at once.
+
+    Connecting is limited to `max_connecting` gateways at a time, each with a
+    small random delay, so a large fleet doesn't flood the network with
+    connections at once. Every client's heartbeats and reconnects are
+    jittered, so clients started together drift apart instead of polling and
+    reconnecting in lockstep.
+
+    Args:
+        loop (asyncio.AbstractEventLoop): the event loop to use
+        max_connecting (int): the most gateways connecting at once
+        cache_path (str): the model cache shared by the gateways, see `async_get_client`
+        optimistic (bool): run the clients in optimistic mode
+    """
+
+    # how far heartbeats and reconnects stray from their delay
+    JITTER = 0.25
+
+    # the most seconds a connection waits before it starts, spreading them out
+    CONNECT_SPREAD = 0.5
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop = None,
+        max_connecting: int = 8,
+        cache_path: str = None,
+        optimistic: bool = False,
+    ):
+        if max_connecting < 1:
+            raise ValueError("max_connecting must be at least 1")
+
+        self._loop = loop
+        self._connecting = asyncio.Semaphore(max_connecting)
+        self._cache_path = cache_path
+        self._optimistic = optimistic
+        self._clients: Dict[str, BaseClient] = {}
+        self._groups: Dict[str, frozenset] = {}
+        # the names of the gateways still connecting, taken until they're added or fail
+        self._connecting_names: Set[str] = set()
+
+    def __len__(self):
+        return len(self._clients)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._clients)
+
+    def __contains__(self, name: str):
+        return name in self._clients
+
+    def __getitem__(self, name: str) -> BaseClient:
+        return self._clients[name]
+
+    def clients(self, group: str = None) -> Dict[str, BaseClient]:
+        """
+        Args:
+            group (str): only the gateways in this group, None for all of them
+
+        Returns:
+            Dict[str, BaseClient]: the clients by the name of their gateway
+        """
+        if group is None:
+            return dict(self._clients)
+
+        return {name: client for name, client in self._clients.items() if group in self._groups[name]}
+
+    async def async_add(
+        self,
+        name: str,
+        network_address: Tuple[str, int] = None,
+        serial_address: str = None,
+        groups: Iterable[str] = (),
+    ) -> BaseClient:
+        """
+        Connect to a gateway and manage its client.
+
+        Args:
+            name (str): the name of the gateway, unique in the manager
+            network_address (Tuple[str, int]): the host and port of the gateway
+            serial_address (str): the location of the serial port
+            groups (Iterable[str]): the groups the gateway is in
+
+        Returns:
+            BaseClient: the client of the gateway
+        """
+        if name in self._clients or name in self._connecting_names:
+            raise ValueError(f"Gateway {name} is already managed")
+
+        self._connecting_names.add(name)
+
+        try:
+            async with self._connecting:
+                await asyncio.sleep(random.uniform(0, self.CONNECT_SPREAD))
+
+                client = await htd_client.async_get_client(
+                    serial_address=serial_address,
+                    network_address=network_address,
+                    loop=self._loop,
+                    optimistic=self._optimistic,
+                    cache_path=self._cache_path,
+                )
+
+        finally:
+            self._connecting_names.discard(name)
+
+        client.set_jitter(self.JITTER)
+
+        self._clients[name] = client
+        self._groups[name] = frozenset(groups)
+
+        return client
+
+    async def async_add_many(
+        self,
+        gateways: Dict[str, dict],
+    ) -> Dict[str, BaseClient | BaseException]:
+        """
+        Connect to many gateways at once, a gateway that fails to connect
+        doesn't stop the others.
+
+        Args:
+            gateways (Dict[str, dict]): the name of each gateway, to the arguments of `async_add`
+
+        Returns:
+            Dict[str, BaseClient | BaseException]: the client of each gateway, or why it couldn't connect
+        """
+        names = list(gateways)
+        results = await asyncio.gather(
+            *(self.async_add(name, **gateways[name]) for name in names),
+            return_exceptions=True,
+        )
+
+        for name, result in zip(names, results):
+            if isinstance(result, BaseException):
+                _LOGGER.warning("Unable to connect to gateway %s: %s", name, result)
+
+        return dict(zip(names, results))
+
+    def remove(self, name: str):
+        """
+        Disconnect from a gateway and stop managing it.
+
+        Args:
+            name (str): the name of the gateway
+        """
+        client = self._clients.pop(name)
+        del self._groups[name]
+        client.disconnect()
+
+    def close(self):
+        """
+        Disconnect from every gateway.
+        """
+        for name in list(self._clients):
+            self.remove(name)
+
+    async def async_each(
+        self,
+        action: Callable[[BaseClient], Awaitable],
+        group: str = None,
+    ) -> Dict[str, object]:
+        """
+        Run an action on every gateway at once, a failure on a gateway doesn't
+        stop the others.
+
+        Args:
+            action (callable): called with each client, returns what to await
+            group (str): only the gateways in this group, None for all of them
+
+        Returns:
+            Dict[str, object]: the result of each gateway, or the exception it raised
+        """
+        clients = self.clients(group)
+        results = await asyncio.gather(
+            *(action(client) for client in clients.values()),
+            return_exceptions=True,
+        )
+
+        for name, result in zip(clients, results):
+            if isinstance(result, BaseException):
+                _LOGGER.warning("Failed on gateway %s: %s", name, result)
+
+        return dict(zip(clients, results))
+
+    async def async_power_on(self, group: str = None) -> Dict[str, object]:
+        """
+        Power on every zone of the gateways.
+
+        Args:
+            group (str): only the gateways in this group, None for all of them
+
+        Returns:
+            Dict[str, object]: None for each gateway, or the exception it raised
+        """
+        return await self.async_each(lambda client: client.power_on_all_zones(), group)
+
+    async def async_power_off(self, group: str = None) -> Dict[str, object]:
+        """
+        Power off every zone of the gateways.
+
+        Args:
+            group (str): only the gateways in this group, None for all of them
+
+        Returns:
+            Dict[str, object]: None for each gateway, or the exception it raised
+        """
+        return await self.async_each(lambda client: client.power_off_all_zones(), group)
+
+    def set_pacing(self, min_gap: float = None, rate: float = None, burst: int = None, group: str = None):
+        """
+        Change how fast frames are written to the gateways, see `BaseClient.set_pacing`.
+
+        Args:
+            min_gap (float): the least seconds between two frames
+            rate (float): the frames per second a gateway keeps up with
+            burst (int): the most frames that go out ahead of the rate
+            group (str): only the gateways in this group, None for all of them
+        """
+        for client in self.clients(group).values():
+            client.set_pacing(min_gap, rate, burst)
+
+    @property
+    def stats(self) -> Dict[str, GatewayStats]:
+        """
+        Returns:
+            Dict[str, GatewayStats]: the connection state and traffic of each gateway
+        """
+        return {
+            name: GatewayStats(
+                client.connected,
+                client.ready,
+                client.rtt,
+                client.scheduler_stats,
+                client.write_stats,
+            )
+            for name, client in self._clients.items()
+        }
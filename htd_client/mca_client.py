@@ -13,18 +13,22 @@
 """
 import asyncio
 import logging
-from typing import Dict, Tuple
+from typing import Dict, Iterable, List, Tuple
 
-from .base_client import BaseClient
-from .constants import HtdConstants, HtdMcaCommands, HtdMcaConstants, HtdModelInfo
-from .models import ZoneDetail
+from .base_client import BaseClient, PlannedCommand, receive_command
+from .constants import HtdCommonCommands, HtdConstants, HtdMcaCommands, HtdMcaConstants, HtdModelInfo, HtdPriority
+from .exceptions import HtdCommandRejectedError, HtdDisconnectedError
+from .models import ZoneDetail, ZoneView
 
 _LOGGER = logging.getLogger(__name__)
 
 
 class HtdMcaClient(BaseClient):
     _target_volumes: Dict[int, int | None] = None
-    _subscribed: bool = None
+    _volume_ramps: Dict[int, asyncio.Task] = None
+    _volume_ramp_callers: Dict[int, int] = None
+    # zone -> field -> where the latest queued step leaves the field
+    _step_targets: Dict[int, Dict[str, int]] = None
 
     def __init__(
         self,
@@ -35,6 +39,7 @@ class HtdMcaClient(BaseClient):
         command_retry_timeout: int = HtdConstants.DEFAULT_COMMAND_RETRY_TIMEOUT,
         retry_attempts: int = HtdConstants.DEFAULT_RETRY_ATTEMPTS,
         socket_timeout: int = HtdConstants.DEFAULT_SOCKET_TIMEOUT,
+        optimistic: bool = False,
     ):
         """
         This is the client for the HTD gateway device. It can communicate with
@@ -49,6 +54,7 @@ class HtdMcaClient(BaseClient):
             amount of time inbetween commands, in milliseconds
             socket_timeout(int): the amount of time before we will time out from
             the device, in milliseconds
+            optimistic (bool): show the values being set right away, before the gateway confirms them
         """
         super().__init__(
             loop,
@@ -58,121 +64,231 @@ class HtdMcaClient(BaseClient):
             command_retry_timeout=command_retry_timeout,
             retry_attempts=retry_attempts,
             socket_timeout=socket_timeout,
+            optimistic=optimistic,
         )
 
         # the mca does not support changing the volume directly to the target, therefore we record the target,
-        # and everytime we get a zone status update, we'll check to see if there is a new volume being targeted, if so
-        # we'll re-run _set_volume to get to the target
-        self._subscribed = False
-        self._target_volumes = {key: None for key in range(1, self._model_info["sources"] + 1)}
+        # and ramp to it with volume up / down steps, the target can move while the ramp is running
+        self._target_volumes = {zone: None for zone in range(1, self._model_info["zones"] + 1)}
+        self._volume_ramps = {}
+        self._volume_ramp_callers = {}
+        self._step_targets = {}
+
+    @classmethod
+    def _frame_cache_codes(cls, model_info: HtdModelInfo) -> Iterable[Tuple[int, int]]:
+        common = HtdMcaCommands.COMMON_COMMAND_CODE
+
+        yield HtdMcaCommands.QUERY_COMMAND_CODE, 0
+
+        for data_code in (
+            HtdMcaCommands.POWER_ON_ZONE_COMMAND_CODE,
+            HtdMcaCommands.POWER_OFF_ZONE_COMMAND_CODE,
+            HtdMcaCommands.POWER_ON_ALL_ZONES_COMMAND_CODE,
+            HtdMcaCommands.POWER_OFF_ALL_ZONES_COMMAND_CODE,
+            HtdMcaCommands.TOGGLE_MUTE_COMMAND,
+            HtdMcaCommands.VOLUME_UP_COMMAND,
+            HtdMcaCommands.VOLUME_DOWN_COMMAND,
+            HtdMcaCommands.BASS_UP_COMMAND,
+            HtdMcaCommands.BASS_DOWN_COMMAND,
+            HtdMcaCommands.TREBLE_UP_COMMAND,
+            HtdMcaCommands.TREBLE_DOWN_COMMAND,
+            HtdMcaCommands.BALANCE_RIGHT_COMMAND,
+            HtdMcaCommands.BALANCE_LEFT_COMMAND,
+        ):
+            yield common, data_code
+
+        for source in range(1, model_info["sources"] + 1):
+            yield common, HtdMcaConstants.SOURCE_COMMAND_OFFSET + source
+
+    @receive_command(HtdCommonCommands.ZONE_SOURCE_NAME_RECEIVE_COMMAND_MCA, 9)
+    def _on_zone_source_name(self, zone: int, data: bytes):
+        zone_source_name = str(bytes(data[2:9]).decode(errors="ignore").strip('\0')).lower()
+
+    async def async_mute(self, zone: int, timeout: float = None):
+        if self._zone_data[zone].mute:
+            return
 
+        await self._async_toggle_mute(zone, timeout=timeout)
 
-    async def async_connect(self):
-        if not self._subscribed:
-            await self.async_subscribe(self._on_zone_update)
-            self._subscribed = True
+    async def async_unmute(self, zone: int, timeout: float = None):
+        if not self._zone_data[zone].mute:
+            return
 
-        await super().async_connect()
+        await self._async_toggle_mute(zone, timeout=timeout)
 
+    def has_volume_target(self, zone: int):
+        return self._target_volumes.get(zone) is not None
 
-    def _on_zone_update(self, zone: int = None):
-        if zone is None or zone == 0:
-            return
+    async def async_set_volume(self, zone: int, volume: int, timeout: float = None):
+        """
+        Set the volume of a zone, by ramping it up or down to the volume.
 
-        if self._target_volumes[zone] is not None:
-            if self._zone_data[zone].volume == self._target_volumes[zone]:
-                self._target_volumes[zone] = None
-            else:
-                asyncio.run_coroutine_threadsafe(self._async_set_volume(zone), self._loop)
+        Args:
+            zone (int): the zone
+            volume (int): the volume to set as an HTD value, between 0 and 60 (HtdConstants.MAX_VOLUME)
+            timeout (float): the most seconds to wait for the command, None to wait until it's done or fails
+        """
 
-    async def async_mute(self, zone: int):
-        if self._zone_data[zone].mute:
-            return
+        self._target_volumes[zone] = max(0, min(volume, HtdConstants.MAX_VOLUME))
 
-        await self._async_toggle_mute(zone)
+        # a ramp that's already running picks up the new target
+        ramp = self._volume_ramps.get(zone)
 
-    async def async_unmute(self, zone: int):
-        if not self._zone_data[zone].mute:
-            return
+        if ramp is None or ramp.done():
+            ramp = self._volume_ramps[zone] = asyncio.create_task(self._async_ramp_volume(zone))
 
-        await self._async_toggle_mute(zone)
+        self._show_pending(zone, {"volume": self._target_volumes[zone]}, ramp)
+        self._volume_ramp_callers[zone] = self._volume_ramp_callers.get(zone, 0) + 1
 
-    def has_volume_target(self, zone: int):
-        return self._target_volumes[zone] is not None
+        try:
+            return await self._async_with_timeout(asyncio.shield(ramp), timeout, zone)
 
-    async def async_set_volume(self, zone: int, volume: int):
-        existing = False
+        finally:
+            self._volume_ramp_callers[zone] -= 1
 
-        if self._target_volumes[zone] is not None:
-            existing = True
+            # the ramp stops once nobody is waiting on it anymore
+            if not self._volume_ramp_callers[zone] and not ramp.done():
+                ramp.cancel()
 
-        self._target_volumes[zone] = volume
+    async def _async_ramp_volume(self, zone: int):
+        """
+        Ramp the volume of a zone to its target.
 
-        if existing:
-            return
+        Args:
+            zone (int): the zone
+        """
+
+        try:
+            if not self._confirmed_zone(zone).power:
+                await self.async_power_on(zone)
 
-        zone_info = self._zone_data[zone]
+            await self._async_step_volume(zone)
 
-        if not zone_info.power:
-            await self.async_power_on(zone)
+        except BaseException:
+            self._scheduler.withdraw(asyncio.current_task())
+            raise
 
-        return await self._async_set_volume(zone)
+        finally:
+            self._target_volumes[zone] = None
+            self._settle_pending(zone, asyncio.current_task())
 
-    async def _async_set_volume(self, zone: int):
+    async def _async_step_volume(self, zone: int):
         """
-        Resume setting the volume of a zone.
+        Send volume steps until the gateway confirms the zone is at its target.
+        Up to `HtdMcaConstants.VOLUME_RAMP_WINDOW` steps are sent ahead of the
+        confirmations. They're a round trip apart, the pace the gateway kept
+        up with a step at a time, or the gateway's minimum gap apart when
+        that's shorter, the token bucket doesn't hold them back, the window
+        does. Until the round trip is measured a single step goes out, and its
+        confirmation measures it. Steps that run past the target land before
+        the ramp turns around to correct it.
 
         Args:
             zone (int): the zone
         """
 
-        zone_info = self._zone_data[zone]
+        loop = asyncio.get_running_loop()
+        owner = asyncio.current_task()
+        confirmed = self._confirmed_zone(zone).volume
+        # the steps sent but not confirmed yet, and which way they go
+        in_flight = 0
+        direction = 0
+        attempts = 0
+        # when the first step is expected to go out, until it's confirmed
+        sent_at = None
 
-        if not zone_info.power:
-            self._target_volumes[zone] = None
-            return
+        while True:
+            if self._connection is None:
+                raise HtdDisconnectedError(f"Not connected, can't set the volume of zone {zone}")
 
-        diff = self._target_volumes[zone] - zone_info.volume
+            zone_info = self._confirmed_zone(zone)
 
-        if diff == 0:
-            return
+            if not zone_info.power:
+                return
 
-        if diff < 0:
-            volume_command = HtdMcaCommands.VOLUME_DOWN_COMMAND
-        else:
-            volume_command = HtdMcaCommands.VOLUME_UP_COMMAND
+            if zone_info.volume != confirmed:
+                moved = zone_info.volume - confirmed
+                confirmed = zone_info.volume
+                attempts = 0
 
-        await self._async_send_and_validate(
-            lambda z: z.volume != zone_info.volume,
-            zone,
-            HtdMcaCommands.COMMON_COMMAND_CODE,
-            volume_command
-        )
+                if moved * direction > 0:
+                    in_flight = max(in_flight - abs(moved), 0)
+
+                    if sent_at is not None:
+                        self._rtt.sample(loop.time() - sent_at)
+                        sent_at = None
+
+            target = self._target_volumes[zone]
+
+            if in_flight == 0 and confirmed == target:
+                return
+
+            remaining = target - (confirmed + in_flight * direction)
+
+            if remaining != 0 and (in_flight == 0 or (remaining > 0) == (direction > 0)):
+                direction = 1 if remaining > 0 else -1
+                volume_command = HtdMcaCommands.VOLUME_UP_COMMAND if direction > 0 else HtdMcaCommands.VOLUME_DOWN_COMMAND
+                srtt = self._rtt.srtt
+
+                if srtt is None:
+                    window, gap = 1, None
+
+                    if in_flight == 0:
+                        sent_at = loop.time() + self._scheduler.drain_time(HtdPriority.INTERACTIVE)
+
+                else:
+                    # the steps are paced here, the confirmations hold them back
+                    window, gap = HtdMcaConstants.VOLUME_RAMP_WINDOW, min(srtt, self._scheduler.min_gap)
+
+                for _ in range(min(abs(remaining), window - in_flight)):
+                    await self._send_cmd(zone, HtdMcaCommands.COMMON_COMMAND_CODE, volume_command, owner=owner, gap=gap)
+                    in_flight += 1
+
+            timeout = self._scheduler.drain_time(HtdPriority.INTERACTIVE) + self._rtt.timeout(
+                attempts + 1, self._command_retry_timeout
+            )
+
+            if not await self._async_wait_for_zone(zone, timeout):
+                attempts += 1
+
+                if attempts > self._retry_attempts:
+                    raise HtdCommandRejectedError(f"Failed to execute command after {self._retry_attempts} attempts")
+
+                # the steps in flight, or their confirmations, were lost
+                in_flight = 0
+                sent_at = None
+                await self.refresh(zone, priority=HtdPriority.VALIDATION)
 
-    async def refresh(self, zone: int = None):
+    async def refresh(self, zone: int = None, priority: HtdPriority = HtdPriority.INTERACTIVE):
         """
         Query all zones and return a dict of `ZoneDetail`
 
+        Args:
+            zone (int): the zone to refresh, or None to refresh all zones
+            priority (HtdPriority): how urgent the refresh is
+
         Returns:
             dict[int, ZoneDetail]: a dict where the key represents the zone
             number, and the value are the details of the zone
         """
 
         refresh_zone = zone if zone is not None else 0
-        await self.refresh_zone(refresh_zone)
+        await self.refresh_zone(refresh_zone, priority=priority)
 
-    async def refresh_zone(self, zone: int):
+    async def refresh_zone(self, zone: int, priority: HtdPriority = HtdPriority.INTERACTIVE):
         """
         Refresh a specific zone
 
         Args:
             zone (int): the zone number
+            priority (HtdPriority): how urgent the refresh is
         """
 
         await self._send_cmd(
             zone,
             HtdMcaCommands.QUERY_COMMAND_CODE,
-            0
+            0,
+            priority=priority,
         )
 
     async def power_on_all_zones(self):
@@ -197,100 +313,132 @@ class HtdMcaClient(BaseClient):
             HtdMcaCommands.POWER_OFF_ALL_ZONES_COMMAND_CODE
         )
 
-    async def async_set_source(self, zone: int, source: int):
+    async def async_set_source(self, zone: int, source: int, timeout: float = None):
         """
         Set the source of a zone.
 
         Args:
             zone (int): the zone
             source (int): the source to set
+            timeout (float): the most seconds to wait for the command, None to wait until it's done or fails
         """
 
         return await self._async_send_and_validate(
             lambda z: z.source == source,
             zone,
             HtdMcaCommands.COMMON_COMMAND_CODE,
-            HtdMcaConstants.SOURCE_COMMAND_OFFSET + source
+            HtdMcaConstants.SOURCE_COMMAND_OFFSET + source,
+            intent="source",
+            expected={"source": source},
+            timeout=timeout,
         )
 
-    async def async_volume_up(self, zone: int):
+    async def async_volume_up(self, zone: int, timeout: float = None):
         """
         Increase the volume of a zone.
 
         Args:
             zone (int): the zone
+            timeout (float): the most seconds to wait for the command, None to wait until it's done or fails
         """
 
-        zone_info = self._zone_data[zone]
+        await self._async_step(zone, "volume", 1, HtdConstants.MAX_VOLUME, HtdMcaCommands.VOLUME_UP_COMMAND, timeout)
 
-        if zone_info.volume == HtdConstants.MAX_VOLUME:
-            return
+    async def async_volume_down(self, zone: int, timeout: float = None):
+        """
+        Decrease the volume of a zone.
 
-        await self._async_send_and_validate(
-            lambda z: z.volume >= zone_info.volume + 1,
-            zone,
-            HtdMcaCommands.COMMON_COMMAND_CODE,
-            HtdMcaCommands.VOLUME_UP_COMMAND
-        )
+        Args:
+            zone (int): the zone
+            timeout (float): the most seconds to wait for the command, None to wait until it's done or fails
+        """
+
+        await self._async_step(zone, "volume", -1, 0, HtdMcaCommands.VOLUME_DOWN_COMMAND, timeout)
 
-    async def async_volume_down(self, zone: int):
+    async def _async_step(self, zone: int, field: str, step: int, limit: int, data_code: int, timeout: float):
         """
-        Decrease the volume of a zone.
+        Step a setting of a zone up or down by one. A step taken while others
+        are still queued goes on from where those leave the zone, so quick
+        presses add up instead of all aiming for one past the current value.
 
         Args:
             zone (int): the zone
+            field (str): the setting, e.g. volume
+            step (int): 1 to step up, -1 to step down
+            limit (int): the furthest the setting goes that way
+            data_code (int): the command that steps the setting
+            timeout (float): the most seconds to wait for the command, None to wait until it's done or fails
         """
 
-        zone_info = self._zone_data[zone]
+        targets = self._step_targets.setdefault(zone, {})
+        value = targets.get(field, getattr(self._zone_data[zone], field)) + step
 
-        if zone_info.volume == 0:
+        if (value - limit) * step > 0:
             return
 
-        await self._async_send_and_validate(
-            lambda z: z.volume <= zone_info.volume - 1,
-            zone,
-            HtdMcaCommands.COMMON_COMMAND_CODE,
-            HtdMcaCommands.VOLUME_DOWN_COMMAND
-        )
+        targets[field] = value
+
+        try:
+            await self._async_send_and_validate(
+                lambda z: (getattr(z, field) - value) * step >= 0,
+                zone,
+                HtdMcaCommands.COMMON_COMMAND_CODE,
+                data_code,
+                expected={field: value},
+                timeout=timeout,
+            )
+
+        finally:
+            # once the latest step is done, the next one starts from the zone
+            if targets.get(field) == value:
+                del targets[field]
 
-    async def _async_toggle_mute(self, zone: int):
+    async def _async_toggle_mute(self, zone: int, timeout: float = None):
         """
         Toggle the mute state of a zone.
 
         Args:
             zone (int): the zone
+            timeout (float): the most seconds to wait for the command, None to wait until it's done or fails
         """
 
-        zone_info = self._zone_data[zone]
+        mute = not self._zone_data[zone].mute
 
         await self._async_send_and_validate(
-            lambda z: zone_info.mute != z.mute,
+            lambda z: z.mute == mute,
             zone,
             HtdMcaCommands.COMMON_COMMAND_CODE,
-            HtdMcaCommands.TOGGLE_MUTE_COMMAND
+            HtdMcaCommands.TOGGLE_MUTE_COMMAND,
+            timeout=timeout,
+            expected={"mute": mute},
         )
 
-    async def async_power_on(self, zone: int):
+    async def async_power_on(self, zone: int, timeout: float = None):
         """
         Power on a zone.
 
         Args:
             zone (int): the zone
+            timeout (float): the most seconds to wait for the command, None to wait until it's done or fails
         """
 
         await self._async_send_and_validate(
             lambda z: z.power,
             zone,
             HtdMcaCommands.COMMON_COMMAND_CODE,
-            HtdMcaCommands.POWER_ON_ZONE_COMMAND_CODE
+            HtdMcaCommands.POWER_ON_ZONE_COMMAND_CODE,
+            intent="power",
+            expected={"power": True},
+            timeout=timeout,
         )
 
-    async def async_power_off(self, zone: int):
+    async def async_power_off(self, zone: int, timeout: float = None):
         """
         Power off a zone.
 
         Args:
             zone (int): the zone
+            timeout (float): the most seconds to wait for the command, None to wait until it's done or fails
 
         """
 
@@ -298,134 +446,110 @@ class HtdMcaClient(BaseClient):
             lambda z: not z.power,
             zone,
             HtdMcaCommands.COMMON_COMMAND_CODE,
-            HtdMcaCommands.POWER_OFF_ZONE_COMMAND_CODE
+            HtdMcaCommands.POWER_OFF_ZONE_COMMAND_CODE,
+            intent="power",
+            expected={"power": False},
+            timeout=timeout,
         )
 
-    async def async_bass_up(self, zone: int):
+    async def async_bass_up(self, zone: int, timeout: float = None):
         """
         Increase the bass of a zone.
 
         Args:
             zone (int): the zone
+            timeout (float): the most seconds to wait for the command, None to wait until it's done or fails
         """
 
-        zone_info = self._zone_data[zone]
-
-        new_bass = zone_info.bass + 1
-        if new_bass > HtdConstants.MAX_BASS:
-            return
-
-        await self._async_send_and_validate(
-            lambda z: z.bass >= zone_info.bass + 1,
-            zone,
-            HtdMcaCommands.COMMON_COMMAND_CODE,
-            HtdMcaCommands.BASS_UP_COMMAND
-        )
+        await self._async_step(zone, "bass", 1, HtdConstants.MAX_BASS, HtdMcaCommands.BASS_UP_COMMAND, timeout)
 
-    async def async_bass_down(self, zone: int):
+    async def async_bass_down(self, zone: int, timeout: float = None):
         """
         Decrease the bass of a zone.
 
         Args:
             zone (int): the zone
+            timeout (float): the most seconds to wait for the command, None to wait until it's done or fails
         """
 
-        zone_info = self._zone_data[zone]
+        await self._async_step(zone, "bass", -1, HtdConstants.MIN_BASS, HtdMcaCommands.BASS_DOWN_COMMAND, timeout)
 
-        new_bass = zone_info.bass - 1
-        if new_bass < HtdConstants.MIN_BASS:
-            return
-
-        await self._async_send_and_validate(
-            lambda z: z.bass <= zone_info.bass - 1,
-            zone,
-            HtdMcaCommands.COMMON_COMMAND_CODE,
-            HtdMcaCommands.BASS_DOWN_COMMAND
-        )
-
-    async def async_treble_up(self, zone: int):
+    async def async_treble_up(self, zone: int, timeout: float = None):
         """
         Increase the treble of a zone.
 
         Args:
             zone (int): the zone
+            timeout (float): the most seconds to wait for the command, None to wait until it's done or fails
         """
 
-        zone_info = self._zone_data[zone]
-
-        new_treble = zone_info.treble + 1
-        if new_treble > HtdConstants.MAX_TREBLE:
-            return
-
-        await self._async_send_and_validate(
-            lambda z: z.treble >= zone_info.treble + 1,
-            zone,
-            HtdMcaCommands.COMMON_COMMAND_CODE,
-            HtdMcaCommands.TREBLE_UP_COMMAND
-        )
+        await self._async_step(zone, "treble", 1, HtdConstants.MAX_TREBLE, HtdMcaCommands.TREBLE_UP_COMMAND, timeout)
 
-    async def async_treble_down(self, zone: int):
+    async def async_treble_down(self, zone: int, timeout: float = None):
         """
         Decrease the treble of a zone.
 
         Args:
             zone (int): the zone
+            timeout (float): the most seconds to wait for the command, None to wait until it's done or fails
         """
 
-        zone_info = self._zone_data[zone]
+        await self._async_step(zone, "treble", -1, HtdConstants.MIN_TREBLE, HtdMcaCommands.TREBLE_DOWN_COMMAND, timeout)
 
-        new_treble = zone_info.treble - 1
-        if new_treble < HtdConstants.MIN_TREBLE:
-            return
-
-        await self._async_send_and_validate(
-            lambda z: z.treble <= zone_info.treble - 1,
-            zone,
-            HtdMcaCommands.COMMON_COMMAND_CODE,
-            HtdMcaCommands.TREBLE_DOWN_COMMAND
-        )
-
-    async def async_balance_left(self, zone: int):
+    async def async_balance_left(self, zone: int, timeout: float = None):
         """
         Increase the balance toward the left for a zone.
 
         Args:
             zone (int): the zone
+            timeout (float): the most seconds to wait for the command, None to wait until it's done or fails
         """
 
-        zone_info = self._zone_data[zone]
-
-        new_balance = zone_info.balance - 1
-        if new_balance < HtdConstants.MIN_BALANCE:
-            return
-
-        await self._async_send_and_validate(
-            lambda z: z.balance <= zone_info.balance - 1,
-            zone,
-            HtdMcaCommands.COMMON_COMMAND_CODE,
-            HtdMcaCommands.BALANCE_LEFT_COMMAND
-        )
+        await self._async_step(zone, "balance", -1, HtdConstants.MIN_BALANCE, HtdMcaCommands.BALANCE_LEFT_COMMAND, timeout)
 
-    async def async_balance_right(self, zone: int):
+    async def async_balance_right(self, zone: int, timeout: float = None):
         """
         Increase the balance toward the right for a zone.
 
         Args:
             zone (int): the zone
+            timeout (float): the most seconds to wait for the command, None to wait until it's done or fails
         """
 
-        zone_info = self._zone_data[zone]
+        await self._async_step(zone, "balance", 1, HtdConstants.MAX_BALANCE, HtdMcaCommands.BALANCE_RIGHT_COMMAND, timeout)
 
-        new_balance = zone_info.balance + 1
-        if new_balance > HtdConstants.MAX_BALANCE:
-            return
+    def _plan_scene_zone(self, current: ZoneView, desired: ZoneDetail) -> List[PlannedCommand]:
+        common = HtdMcaCommands.COMMON_COMMAND_CODE
+        planned = []
 
-        await self._async_send_and_validate(
-            lambda z: z.balance >= zone_info.balance + 1,
-            zone,
-            HtdMcaCommands.COMMON_COMMAND_CODE,
-            HtdMcaCommands.BALANCE_RIGHT_COMMAND
-        )
+        def steps(current_value, desired_value, up_command, down_command):
+            if desired_value is None or current_value is None or desired_value == current_value:
+                return
+
+            command = up_command if desired_value > current_value else down_command
+            planned.extend((common, command, None) for _ in range(abs(desired_value - current_value)))
+
+        if desired.power is not None and desired.power != current.power:
+            power = HtdMcaCommands.POWER_ON_ZONE_COMMAND_CODE if desired.power else HtdMcaCommands.POWER_OFF_ZONE_COMMAND_CODE
+            planned.append((common, power, None))
+
+        if desired.power is False:
+            return planned
+
+        if desired.source is not None and desired.source != current.source:
+            planned.append((common, HtdMcaConstants.SOURCE_COMMAND_OFFSET + desired.source, None))
+
+        # the mca only steps the volume and tone, and toggles the mute
+        steps(current.volume, desired.volume, HtdMcaCommands.VOLUME_UP_COMMAND, HtdMcaCommands.VOLUME_DOWN_COMMAND)
+
+        if desired.mute is not None and desired.mute != current.mute:
+            planned.append((common, HtdMcaCommands.TOGGLE_MUTE_COMMAND, None))
+
+        steps(current.bass, desired.bass, HtdMcaCommands.BASS_UP_COMMAND, HtdMcaCommands.BASS_DOWN_COMMAND)
+        steps(current.treble, desired.treble, HtdMcaCommands.TREBLE_UP_COMMAND, HtdMcaCommands.TREBLE_DOWN_COMMAND)
+        steps(current.balance, desired.balance, HtdMcaCommands.BALANCE_RIGHT_COMMAND, HtdMcaCommands.BALANCE_LEFT_COMMAND)
+
+        return planned
 
     # def get_source_names(self):
     #     """
@@ -0,0 +1,269 @@
+import asyncio
+import json
+import logging
+import os
+import tempfile
+from pathlib import Path
+from typing import Dict, NamedTuple, Tuple
+
+import htd_client
+from .constants import HtdConstants, HtdModelInfo
+from .exceptions import HtdError
+from .models import ZoneDetail
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class CachedGateway(NamedTuple):
+    model: HtdModelInfo
+    # zone -> if the zone is enabled, from the keypads the gateway reported
+    zones_enabled: Dict[int, bool]
+    # zone -> the name of the zone
+    zone_names: Dict[int, str]
+
+
+class ModelCache:
+    """
+    A JSON file of what was learned about gateways, their model, which zones
+    are enabled and the zone names, keyed by the address of the gateway. A
+    client for a gateway in the cache is created right away, without waiting
+    for the gateway to report its model.
+
+    The file is read once, a missing or unreadable file is an empty cache.
+    Every save rereads it and only replaces the entry of the gateway saved,
+    so processes connected to other gateways can share the file. On an event
+    loop, use `async_open` and `async_save`, they do the file I/O in the
+    executor instead of blocking the loop.
+
+    Args:
+        path (str | Path): the location of the cache file
+    """
+
+    VERSION = 1
+
+    def __init__(self, path: str | Path):
+        self._path = Path(path)
+        self._entries = self._read()
+        # saves from the loop take turns, each rereads and rewrites the file
+        self._lock = asyncio.Lock()
+
+    @classmethod
+    async def async_open(cls, path: str | Path) -> "ModelCache":
+        """
+        Read the cache, in the executor.
+
+        Args:
+            path (str | Path): the location of the cache file
+
+        Returns:
+            ModelCache: the cache
+        """
+        return await asyncio.get_running_loop().run_in_executor(None, cls, path)
+
+    @staticmethod
+    def key(network_address: Tuple[str, int] = None, serial_address: str = None) -> str:
+        """
+        The key of a gateway in the cache.
+
+        Args:
+            network_address (Tuple[str, int]): the host and port of the gateway
+            serial_address (str): the location of the serial port
+
+        Returns:
+            str: the key
+        """
+        if serial_address is not None:
+            return "serial:%s" % serial_address
+
+        if network_address is not None:
+            host, port = network_address
+            return "tcp:%s:%d" % (host, port)
+
+        raise ValueError("No address provided")
+
+    def get(self, key: str) -> CachedGateway | None:
+        """
+        Args:
+            key (str): the key of the gateway
+
+        Returns:
+            CachedGateway: what's known about the gateway, None if it's not in the cache
+        """
+        entry = self._entries.get(key)
+
+        if entry is None:
+            return None
+
+        model = next(
+            (model for model in HtdConstants.SUPPORTED_MODELS.values() if model["name"] == entry.get("model")),
+            None,
+        )
+
+        # a model this version doesn't support is as good as not cached
+        if model is None:
+            return None
+
+        return CachedGateway(
+            model,
+            {int(zone): enabled for zone, enabled in entry.get("zones_enabled", {}).items()},
+            {int(zone): name for zone, name in entry.get("zone_names", {}).items()},
+        )
+
+    def save(self, key: str, model: HtdModelInfo, zones: Dict[int, ZoneDetail] = None):
+        """
+        Store what's known about a gateway.
+
+        Args:
+            key (str): the key of the gateway
+            model (HtdModelInfo): the model of the gateway
+            zones (Dict[int, ZoneDetail]): the zones of the gateway, for which are enabled and their names
+        """
+        self._store(key, self._entry(model, zones))
+
+    async def async_save(self, key: str, model: HtdModelInfo, zones: Dict[int, ZoneDetail] = None):
+        """
+        Store what's known about a gateway, the file is written in the executor.
+
+        Args:
+            key (str): the key of the gateway
+            model (HtdModelInfo): the model of the gateway
+            zones (Dict[int, ZoneDetail]): the zones of the gateway, for which are enabled and their names
+        """
+        # the zones are read here, they may change on the loop while the file is written
+        entry = self._entry(model, zones)
+
+        async with self._lock:
+            await asyncio.get_running_loop().run_in_executor(None, self._store, key, entry)
+
+    @staticmethod
+    def _entry(model: HtdModelInfo, zones: Dict[int, ZoneDetail] = None) -> dict:
+        zones = zones or {}
+
+        return {
+            "model": model["name"],
+            "zones_enabled": {str(number): zone.enabled for number, zone in zones.items()},
+            "zone_names": {str(number): zone.name for number, zone in zones.items() if zone.name is not None},
+        }
+
+    def _store(self, key: str, entry: dict):
+        self._entries = self._read()
+        self._entries[key] = entry
+        self._write()
+
+    def _read(self) -> Dict[str, dict]:
+        try:
+            with open(self._path, "r", encoding="utf-8") as file:
+                data = json.load(file)
+
+        except FileNotFoundError:
+            return {}
+
+        except (OSError, ValueError) as e:
+            _LOGGER.warning("Ignoring the model cache %s: %s", self._path, e)
+            return {}
+
+        if not isinstance(data, dict) or data.get("version") != self.VERSION:
+            return {}
+
+        return dict(data.get("gateways", {}))
+
+    def _write(self):
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+
+        # written next to the cache and moved over it, a reader never sees half a file
+        descriptor, temporary = tempfile.mkstemp(dir=self._path.parent, prefix=self._path.name, suffix=".tmp")
+
+        try:
+            with os.fdopen(descriptor, "w", encoding="utf-8") as file:
+                json.dump({"version": self.VERSION, "gateways": self._entries}, file, indent=2, sort_keys=True)
+
+            os.replace(temporary, self._path)
+
+        except BaseException:
+            os.unlink(temporary)
+            raise
+
+
+async def async_maintain_cache(
+    cache: ModelCache,
+    key: str,
+    client: "htd_client.base_client.BaseClient",
+    probe: "htd_client.model_probe.ModelProbe",
+    cached: CachedGateway | None,
+):
+    """
+    Keep the cache entry of a client's gateway up to date. A cached model is
+    verified once the gateway reports its model, and which zones are enabled
+    and their names are saved whenever they change. Changes that arrive while
+    a save is under way are saved together once it's done.
+
+    Args:
+        cache (ModelCache): the cache
+        key (str): the key of the gateway
+        client (BaseClient): the client connected to the gateway
+        probe (ModelProbe): the connection the model is detected on
+        cached (CachedGateway): the entry the client was created from, None if it wasn't cached
+    """
+    async def save(model: HtdModelInfo, zones: Dict[int, ZoneDetail] = None):
+        # the cache is a convenience, a gateway works the same when it can't be written
+        try:
+            await cache.async_save(key, model, zones)
+
+        except OSError as e:
+            _LOGGER.warning("Unable to save the model cache: %s", e)
+
+    if cached is None:
+        await save(client.model)
+
+    else:
+        try:
+            detected = await probe.async_detect()
+
+        except HtdError as e:
+            # e.g. the connection dropped before the model was reported, the
+            # cached model stays until a later connection verifies it
+            _LOGGER.warning("Unable to verify the cached model of %s: %s", key, e)
+            detected = None
+
+        if detected is not None and detected["name"] != cached.model["name"]:
+            # the client can't change its kind, the next one is created with the right model
+            _LOGGER.warning(
+                "The gateway at %s is a %s, not the cached %s, reconnect to use it",
+                key, detected["name"], cached.model["name"],
+            )
+            await save(detected)
+            return
+
+    saving: asyncio.Task | None = None
+    dirty = False
+
+    async def save_zones():
+        nonlocal dirty
+
+        while dirty:
+            dirty = False
+            zones = {
+                zone: client.get_zone(zone)
+                for zone in range(1, client.get_zone_count() + 1)
+                if client.has_zone_data(zone)
+            }
+
+            # a zone the gateway hasn't reported yet keeps what was cached for it
+            if cached is not None:
+                for zone in (cached.zones_enabled.keys() | cached.zone_names.keys()) - zones.keys():
+                    zones[zone] = ZoneDetail(
+                        zone, enabled=cached.zones_enabled.get(zone, True), name=cached.zone_names.get(zone),
+                    )
+
+            await save(client.model, zones)
+
+    def on_changes(changes: Dict[int, frozenset]):
+        nonlocal saving, dirty
+
+        if any("enabled" in fields or "name" in fields for fields in changes.values()):
+            dirty = True
+
+            if saving is None or saving.done():
+                saving = asyncio.ensure_future(save_zones())
+
+    await client.async_subscribe_changes(on_changes)
@@ -0,0 +1,198 @@
+import asyncio
+import logging
+from asyncio import Transport
+from typing import Tuple
+
+import htd_client.utils
+from .base_client import async_open_connection
+from .constants import HtdCommonCommands, HtdConstants, HtdModelInfo, MAX_BYTES_TO_RECEIVE, ONE_SECOND
+from .exceptions import HtdDisconnectedError
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class ModelProbe(asyncio.Protocol):
+    """
+    The first protocol on a connection to a gateway. It asks the gateway for
+    its model, and once the model is recognized, the client for it takes the
+    connection over with `attach`, so the model is detected without opening a
+    connection of its own. A client that already knows the model, e.g. from
+    the model cache, can take the connection over right away, the model is
+    still detected on the side to verify it.
+
+    Args:
+        loop (asyncio.AbstractEventLoop): the event loop to use
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+        self._transport: Transport | None = None
+        self._buffer = bytearray()
+        self._detected = loop.create_future()
+        self._client: asyncio.Protocol | None = None
+
+    @property
+    def model(self) -> HtdModelInfo | None:
+        """
+        Returns:
+            HtdModelInfo: the model of the gateway, None while it's unknown
+        """
+        if not self._detected.done() or self._detected.exception() is not None:
+            return None
+
+        return self._detected.result()
+
+    def connection_made(self, transport: Transport):
+        self._transport = transport
+        transport.write(htd_client.utils.build_command(1, HtdCommonCommands.MODEL_QUERY_COMMAND_CODE, 0))
+
+    def data_received(self, data: bytes):
+        if self._client is not None:
+            self._client.data_received(data)
+
+            if self._detected.done():
+                return
+
+        self._buffer += data
+
+        if self._detected.done():
+            return
+
+        self._detect()
+
+        # the client already has the data, only the end of it is kept, in
+        # case an identifier is split over two reads
+        if self._client is not None:
+            if self._detected.done():
+                self._buffer.clear()
+            else:
+                del self._buffer[:-MAX_BYTES_TO_RECEIVE]
+
+    def _detect(self):
+        for model in HtdConstants.SUPPORTED_MODELS.values():
+            index = self._buffer.find(model["identifier"])
+
+            if index != -1:
+                # whatever follows the identifier is for the client
+                del self._buffer[:index + len(model["identifier"])]
+                self._detected.set_result(model)
+                return
+
+        # a frame after the reply means the reply is complete, and it's not a known model
+        if self._buffer.find(HtdConstants.MESSAGE_HEADER) != -1:
+            _LOGGER.warning("Unknown model %s", htd_client.utils.stringify_bytes(self._buffer))
+            self._detected.set_result(None)
+
+    def connection_lost(self, exc: Exception | None):
+        self._transport = None
+
+        if self._client is not None:
+            self._client.connection_lost(exc)
+
+        elif not self._detected.done():
+            self._detected.set_exception(HtdDisconnectedError("The connection was lost while detecting the model"))
+
+    async def async_detect(self, timeout: float = HtdConstants.MODEL_QUERY_TIMEOUT) -> HtdModelInfo | None:
+        """
+        Wait for the model to be recognized.
+
+        Args:
+            timeout (float): the most seconds to wait for the gateway to reply
+
+        Returns:
+            HtdModelInfo: the model of the gateway, None if it's not supported
+        """
+        try:
+            return await asyncio.wait_for(asyncio.shield(self._detected), timeout)
+
+        except asyncio.TimeoutError:
+            _LOGGER.warning("The gateway didn't report its model within %s seconds", timeout)
+            return None
+
+    def attach(self, client: asyncio.Protocol):
+        """
+        Hand the connection over to a client, along with anything the gateway
+        sent after its model.
+
+        Args:
+            client (asyncio.Protocol): the client taking the connection over
+        """
+        if self._transport is None:
+            raise HtdDisconnectedError("The connection the model was detected on is gone")
+
+        self._client = client
+        client.connection_made(self._transport)
+
+        if self._buffer:
+            data = bytes(self._buffer)
+
+            # what's still being scanned for the model is kept
+            if self._detected.done():
+                self._buffer.clear()
+
+            client.data_received(data)
+
+    def close(self):
+        """
+        Close the connection, when no client is going to take it over.
+        """
+        if self._transport is not None:
+            self._transport.close()
+
+
+async def async_open_probe(
+    loop: asyncio.AbstractEventLoop,
+    network_address: Tuple[str, int] = None,
+    serial_address: str = None,
+) -> ModelProbe:
+    """
+    Connect to a gateway and ask for its model, without waiting for it.
+
+    Args:
+        loop (asyncio.AbstractEventLoop): the event loop to use
+        network_address (Tuple[str, int]): the host and port of the gateway
+        serial_address (str): the location of the serial port
+
+    Returns:
+        ModelProbe: the connection
+    """
+    _, probe = await async_open_connection(
+        loop,
+        lambda: ModelProbe(loop),
+        serial_address=serial_address,
+        network_address=network_address,
+        timeout=HtdConstants.DEFAULT_SOCKET_TIMEOUT / ONE_SECOND,
+    )
+
+    return probe
+
+
+async def async_probe_model(
+    loop: asyncio.AbstractEventLoop,
+    network_address: Tuple[str, int] = None,
+    serial_address: str = None,
+    timeout: float = HtdConstants.MODEL_QUERY_TIMEOUT,
+) -> ModelProbe:
+    """
+    Connect to a gateway and detect its model, the connection is kept open
+    for the client to take over.
+
+    Args:
+        loop (asyncio.AbstractEventLoop): the event loop to use
+        network_address (Tuple[str, int]): the host and port of the gateway
+        serial_address (str): the location of the serial port
+        timeout (float): the most seconds to wait for the gateway to report its model
+
+    Returns:
+        ModelProbe: the connection, with the model detected, or None as the model if it's not supported
+    """
+    probe = await async_open_probe(loop, network_address=network_address, serial_address=serial_address)
+
+    try:
+        await probe.async_detect(timeout)
+
+    except BaseException:
+        probe.close()
+        raise
+
+    return probe
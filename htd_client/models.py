@@ -1,6 +1,9 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, fields, replace
 
-@dataclass
+# the fields of a ZoneDetail reported by a zone status
+ZONE_STATUS_FIELDS = ("power", "mute", "mode", "party", "source", "volume", "treble", "bass", "balance")
+
+@dataclass(slots=True)
 class ZoneDetail:
     number: int
     enabled: bool = True
@@ -13,11 +16,12 @@ class ZoneDetail:
     bass: int = None
     balance: int = None
     name: str = None
+    party: bool = None
 
     def __str__(self):
         return (
             "zone_number = %s, enabled = %s, name = %s, power = %s, "
-            "mute = %s, mode = %s, source = %s, volume = %s, "
+            "mute = %s, mode = %s, party = %s, source = %s, volume = %s, "
             "treble = %s, bass = %s, balance = %s" %
             (
                 self.number,
@@ -26,6 +30,7 @@ class ZoneDetail:
                 self.power,
                 self.mute,
                 self.mode,
+                self.party,
                 self.source,
                 self.volume,
                 self.treble,
@@ -33,3 +38,43 @@ class ZoneDetail:
                 self.balance,
             )
         )
+
+
+class ZoneView:
+    """
+    A read-only view of a zone's `ZoneDetail`. The client updates its zones
+    in place as status frames arrive, so a view always reflects the latest
+    state, use `snapshot()` to keep a copy of the state at a point in time.
+    """
+
+    __slots__ = ("_zone",)
+
+    def __init__(self, zone: ZoneDetail):
+        self._zone = zone
+
+    def snapshot(self) -> ZoneDetail:
+        """
+        Returns:
+            ZoneDetail: a copy of the zone's current state
+        """
+        return replace(self._zone)
+
+    def __eq__(self, other):
+        if isinstance(other, ZoneView):
+            return self._zone == other._zone
+
+        return self._zone == other
+
+    def __str__(self):
+        return str(self._zone)
+
+    def __repr__(self):
+        return "ZoneView(%r)" % (self._zone,)
+
+
+def _view_property(name: str):
+    return property(lambda view: getattr(view._zone, name))
+
+
+for _field in fields(ZoneDetail):
+    setattr(ZoneView, _field.name, _view_property(_field.name))
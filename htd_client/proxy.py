@@ -0,0 +1,306 @@
+"""
+Share a single connection to a gateway among many clients. The gateways
+accept very few connections at once, the proxy holds the only one and clients
+connect to the proxy instead, exactly as they would to the gateway.
+
+.. code-block:: shell
+
+    # proxy the gateway at 192.168.1.2 on port 10006 of this host
+    python -m htd_client.proxy --host 192.168.1.2
+"""
+import argparse
+import asyncio
+import logging
+from typing import List, Set, Tuple
+
+import htd_client
+from .base_client import BaseClient, apply_socket_options
+from .constants import HtdCommonCommands, HtdConstants, HtdDeviceKind, HtdLyncCommands, HtdMcaCommands, HtdPriority
+
+_LOGGER = logging.getLogger(__name__)
+
+# the commands that only ask the gateway for its state, per device kind
+QUERY_COMMANDS = {
+    HtdDeviceKind.mca: frozenset({HtdMcaCommands.QUERY_COMMAND_CODE}),
+    HtdDeviceKind.lync: frozenset({
+        HtdLyncCommands.QUERY_COMMAND_CODE,
+        HtdLyncCommands.QUERY_ALL_ZONE_STATUS_COMMAND_CODE,
+        HtdLyncCommands.QUERY_ZONE_NAME_COMMAND_CODE,
+        HtdLyncCommands.QUERY_SOURCE_NAME_COMMAND_CODE,
+    }),
+}
+
+# the header, zone, command, data code and checksum
+MIN_COMMAND_LENGTH = HtdConstants.MESSAGE_HEADER_LENGTH + 4
+
+# the bytes of extra data a command carries after its data code, per device
+# kind, by command or by command and data code, every other command has none
+EXTRA_DATA_LENGTHS = {
+    HtdDeviceKind.mca: {
+        HtdMcaCommands.SET_SOURCE_NAME_COMMAND_CODE: 8,
+    },
+    HtdDeviceKind.lync: {
+        HtdLyncCommands.SET_ZONE_NAME_COMMAND_CODE: 11,
+        HtdLyncCommands.SET_SOURCE_NAME_COMMAND_CODE: 11,
+        (HtdLyncCommands.COMMON_COMMAND_CODE, HtdLyncCommands.TREBLE_SETTING_CONTROL_COMMAND_CODE): 1,
+        (HtdLyncCommands.COMMON_COMMAND_CODE, HtdLyncCommands.BASS_SETTING_CONTROL_COMMAND_CODE): 1,
+    },
+}
+
+
+def split_commands(data: bytes, kind: HtdDeviceKind) -> Tuple[List[bytes], int]:
+    """
+    Split what a client sent into command frames. A command carries no
+    length, it's known from the command and its data code, the checksum only
+    tells whether the frame is intact. Anything that isn't part of an intact
+    command is skipped.
+
+    Args:
+        data (bytes): what the client sent
+        kind (HtdDeviceKind): the kind of gateway the commands are for
+
+    Returns:
+        (List[bytes], int): the frames, and how many bytes they used up
+    """
+    extra_lengths = EXTRA_DATA_LENGTHS[kind]
+    frames = []
+    offset = 0
+
+    while True:
+        start = data.find(HtdConstants.MESSAGE_HEADER, offset)
+
+        if start < 0:
+            # the first byte of a header may be at the end, waiting for the rest
+            return frames, max(offset, len(data) - HtdConstants.MESSAGE_HEADER_LENGTH + 1)
+
+        command_index = start + HtdConstants.MESSAGE_HEADER_LENGTH + 1
+
+        # the command and its data code haven't arrived yet
+        if len(data) <= command_index + 1:
+            return frames, start
+
+        command = data[command_index]
+        extra_length = extra_lengths.get(command, extra_lengths.get((command, data[command_index + 1]), 0))
+        end = start + MIN_COMMAND_LENGTH + extra_length
+
+        # the rest of the command hasn't arrived yet
+        if len(data) < end:
+            return frames, start
+
+        if htd_client.utils.calculate_checksum(data[start:end - 1]) == data[end - 1]:
+            frames.append(bytes(data[start:end]))
+            offset = end
+
+        else:
+            _LOGGER.debug("Skipping a command with a bad checksum")
+            offset = start + HtdConstants.MESSAGE_HEADER_LENGTH
+
+
+class ProxyConnection(asyncio.Protocol):
+    """
+    The connection of a client to the proxy.
+
+    Args:
+        proxy (HtdProxy): the proxy the client connected to
+    """
+
+    def __init__(self, proxy: "HtdProxy"):
+        self._proxy = proxy
+        self._transport: asyncio.Transport | None = None
+        self._buffer = bytearray()
+
+    def connection_made(self, transport: asyncio.Transport):
+        self._transport = transport
+        apply_socket_options(transport.get_extra_info("socket"), HtdConstants.DEFAULT_SOCKET_OPTIONS)
+        self._proxy._connections.add(self)
+        _LOGGER.info("Client %s connected", transport.get_extra_info("peername"))
+
+    def data_received(self, data: bytes):
+        self._buffer += data
+        frames, consumed = split_commands(self._buffer, self._proxy.client.model["kind"])
+        del self._buffer[:consumed]
+
+        for frame in frames:
+            self._proxy._on_command(self, frame)
+
+    def connection_lost(self, exc: Exception | None):
+        self._proxy._connections.discard(self)
+        # commands of a client that's gone aren't sent for it anymore
+        self._proxy.client.withdraw_frames(self)
+        self._transport = None
+
+    def write(self, frames: List[bytes]):
+        if self._transport is None:
+            return
+
+        # a client that stopped reading is dropped, instead of the proxy holding everything for it
+        if self._transport.get_write_buffer_size() > HtdProxy.MAX_CLIENT_BUFFER:
+            _LOGGER.warning("Client %s isn't keeping up, disconnecting", self._transport.get_extra_info("peername"))
+            self._transport.abort()
+            return
+
+        self._transport.writelines(frames)
+
+    def close(self):
+        if self._transport is not None:
+            self._transport.close()
+
+
+class HtdProxy:
+    """
+    Serves the connection of a client to a gateway to many clients. Every
+    frame the gateway sends is passed on to every client, and the commands of
+    the clients are sent to the gateway one at a time, paced by the client's
+    scheduler. The same query sent by many clients while it's waiting is only
+    sent once, the answer reaches all of them. The model query is answered by
+    the proxy, the gateway isn't asked again.
+
+    Args:
+        client (BaseClient): the client connected to the gateway
+    """
+
+    # bytes waiting to be written to a client before it's dropped
+    MAX_CLIENT_BUFFER = 64 * 1024
+
+    def __init__(self, client: BaseClient):
+        self._client = client
+        self._connections: Set[ProxyConnection] = set()
+        self._server: asyncio.AbstractServer | None = None
+        self._outgoing: List[bytes] = []
+        self._flush_handle: asyncio.Handle | None = None
+        self._queries = QUERY_COMMANDS[client.model["kind"]]
+
+        client.add_frame_listener(self._on_frame)
+
+    @property
+    def client(self) -> BaseClient:
+        return self._client
+
+    @property
+    def connections(self) -> int:
+        """
+        Returns:
+            int: the number of clients connected to the proxy
+        """
+        return len(self._connections)
+
+    async def async_serve(self, host: str = None, port: int = HtdConstants.DEFAULT_PORT) -> asyncio.AbstractServer:
+        """
+        Start accepting clients.
+
+        Args:
+            host (str): the address to listen on, None for every address
+            port (int): the port to listen on
+
+        Returns:
+            asyncio.AbstractServer: the server
+        """
+        loop = asyncio.get_running_loop()
+        self._server = await loop.create_server(lambda: ProxyConnection(self), host, port)
+
+        return self._server
+
+    def close(self):
+        """
+        Stop accepting clients and disconnect the ones connected, the
+        connection to the gateway is left to its client.
+        """
+        self._client.remove_frame_listener(self._on_frame)
+
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        for connection in tuple(self._connections):
+            connection.close()
+
+    def _on_command(self, connection: ProxyConnection, frame: bytes):
+        command = frame[HtdConstants.MESSAGE_HEADER_LENGTH + 1]
+
+        if command == HtdCommonCommands.MODEL_QUERY_COMMAND_CODE:
+            connection.write([self._client.model["identifier"]])
+            return
+
+        # queries go out after the commands, and an identical one that's waiting stands in for it
+        priority = HtdPriority.VALIDATION if command in self._queries else HtdPriority.INTERACTIVE
+        self._client.submit_frame(frame, priority, owner=connection)
+
+    def _on_frame(self, frame: bytes):
+        self._outgoing.append(frame)
+
+        # everything from one read of the gateway goes to the clients in a single write
+        if self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_soon(self._flush)
+
+    def _flush(self):
+        self._flush_handle = None
+        frames, self._outgoing = self._outgoing, []
+
+        for connection in tuple(self._connections):
+            connection.write(frames)
+
+
+async def async_run_proxy(
+    network_address: Tuple[str, int] = None,
+    serial_address: str = None,
+    host: str = None,
+    port: int = HtdConstants.DEFAULT_PORT,
+):
+    """
+    Connect to a gateway and serve the connection to clients, until cancelled.
+
+    Args:
+        network_address (Tuple[str, int]): the host and port of the gateway
+        serial_address (str): the location of the serial port
+        host (str): the address to listen on, None for every address
+        port (int): the port to listen on
+    """
+    client = await htd_client.async_get_client(network_address=network_address, serial_address=serial_address)
+    proxy = HtdProxy(client)
+
+    try:
+        server = await proxy.async_serve(host, port)
+        _LOGGER.info("Serving the %s on port %d", client.model["friendly_name"], port)
+
+        async with server:
+            await server.serve_forever()
+
+    finally:
+        proxy.close()
+        client.disconnect()
+
+
+def main(args: List[str] = None):
+    parser = argparse.ArgumentParser(
+        prog="python -m htd_client.proxy",
+        description="Share a single connection to an HTD gateway among many clients.",
+    )
+    gateway = parser.add_mutually_exclusive_group(required=True)
+    gateway.add_argument("--host", help="the address of the gateway")
+    gateway.add_argument("--serial", help="the serial port of the gateway")
+    parser.add_argument("--gateway-port", type=int, default=HtdConstants.DEFAULT_PORT, help="the port of the gateway")
+    parser.add_argument("--listen", default=None, help="the address to listen on, every address by default")
+    parser.add_argument("--port", type=int, default=HtdConstants.DEFAULT_PORT, help="the port to listen on")
+    parser.add_argument("--verbose", action="store_true", help="log every client and warning")
+    options = parser.parse_args(args)
+
+    logging.basicConfig(level=logging.INFO if options.verbose else logging.WARNING)
+
+    try:
+        asyncio.run(async_run_proxy(
+            network_address=(options.host, options.gateway_port) if options.host is not None else None,
+            serial_address=options.serial,
+            host=options.listen,
+            port=options.port,
+        ))
+
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
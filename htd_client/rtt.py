@@ -0,0 +1,94 @@
+class RttEstimator:
+    """
+    Estimates the round trip time to a gateway, from a command being written
+    to its effect being reported, and the retry timeout that follows from it.
+    It's the smoothed average and mean deviation TCP uses for its
+    retransmission timeout (RFC 6298). Only commands that went out once are
+    measured, a reply to a resent command can't be told apart from a late
+    reply to the first one.
+
+    Args:
+        minimum (float): the shortest retry timeout, in seconds
+        maximum (float): the longest retry timeout, in seconds
+    """
+
+    __slots__ = ("_minimum", "_maximum", "_srtt", "_rttvar", "_samples")
+
+    # the weight of a new sample in the average and in the deviation
+    ALPHA = 1 / 8
+    BETA = 1 / 4
+
+    def __init__(self, minimum: float, maximum: float):
+        self._minimum = minimum
+        self._maximum = maximum
+        self._srtt: float | None = None
+        self._rttvar = 0.0
+        self._samples = 0
+
+    @property
+    def srtt(self) -> float | None:
+        """
+        Returns:
+            float: the smoothed round trip time in seconds, None until measured
+        """
+        return self._srtt
+
+    @property
+    def rttvar(self) -> float:
+        """
+        Returns:
+            float: the mean deviation of the round trip time in seconds
+        """
+        return self._rttvar
+
+    @property
+    def samples(self) -> int:
+        return self._samples
+
+    @property
+    def rto(self) -> float | None:
+        """
+        Returns:
+            float: the retry timeout in seconds, None until measured
+        """
+        if self._srtt is None:
+            return None
+
+        return min(max(self._srtt + 4 * self._rttvar, self._minimum), self._maximum)
+
+    def sample(self, rtt: float):
+        """
+        Add a measured round trip time.
+
+        Args:
+            rtt (float): the seconds between a command being written and its effect being reported
+        """
+        rtt = max(rtt, 0.0)
+        self._samples += 1
+
+        if self._srtt is None:
+            self._srtt = rtt
+            self._rttvar = rtt / 2
+            return
+
+        self._rttvar += self.BETA * (abs(self._srtt - rtt) - self._rttvar)
+        self._srtt += self.ALPHA * (rtt - self._srtt)
+
+    def timeout(self, attempt: int, fallback: float) -> float:
+        """
+        The retry timeout of an attempt at a command, doubled for every
+        attempt after the first one.
+
+        Args:
+            attempt (int): the attempt, starting at 1
+            fallback (float): the retry timeout until the round trip time is measured
+
+        Returns:
+            float: the seconds to wait before retrying
+        """
+        rto = self.rto
+
+        if rto is None:
+            rto = fallback
+
+        return min(rto * 2 ** (attempt - 1), max(self._maximum, fallback))
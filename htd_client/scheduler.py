@@ -0,0 +1,315 @@
+import asyncio
+from collections import deque
+from typing import Callable, Deque, List, NamedTuple, Tuple
+
+from .constants import HtdConstants, HtdPriority
+
+
+# a queued frame, when it was queued, who sent it and its own gap
+QueuedFrame = Tuple[bytes, float, object, float | None]
+
+
+class SchedulerStats(NamedTuple):
+    queue_depth: int
+    max_queue_depth: int
+    frames: int
+    writes: int
+    total_wait: float
+    max_wait: float
+    dropped: int
+
+    @property
+    def mean_wait(self) -> float:
+        return self.total_wait / self.frames if self.frames else 0.0
+
+
+class OutboundScheduler:
+    """
+    Paces the frames written to a gateway. Frames are at least `min_gap`
+    seconds apart, the firmware drops commands that arrive closer together,
+    and a token bucket refilled at `rate` frames per second, holding at most
+    `burst` frames, caps how many go out over time. Frames go out by
+    priority, then in the order they were submitted, and a single timer is
+    armed at any time, for when the next frame may go out. With a `min_gap`
+    of 0 as many frames as there are tokens are released at once, otherwise
+    only frames one sender queued back to back for the same zone, e.g. a
+    volume and the mute off that follows it, the gateway gets them as one
+    command. Everything released together is handed to `write` at once.
+
+    A frame submitted with a `gap` of its own is flow controlled by its
+    sender, e.g. a volume step the sender waits on the gateway to confirm. It
+    goes out `gap` seconds after the previous frame, alone, and neither waits
+    for nor takes a token.
+
+    Lower priority frames are deferred while higher priority ones are queued,
+    and a validation or background frame that's already waiting isn't queued
+    a second time, e.g. a heartbeat refresh stuck behind a burst of commands.
+
+    Args:
+        write (callable): called with the list of frames to write
+        min_gap (float): the least seconds between two frames
+        rate (float): the frames per second refilled into the bucket
+        burst (int): the most frames the bucket holds
+    """
+
+    __slots__ = (
+        "_write", "_min_gap", "_rate", "_burst", "_tokens", "_refilled_at", "_written_at", "_pending", "_handle",
+        "_max_queue_depth", "_frames", "_writes", "_total_wait", "_max_wait", "_dropped",
+    )
+
+    def __init__(self, write: Callable[[List[bytes]], None], min_gap: float, rate: float, burst: int):
+        self._write = write
+        # a queue per priority
+        self._pending: Tuple[Deque[QueuedFrame], ...] = tuple(deque() for _ in HtdPriority)
+        self._handle: asyncio.Handle | None = None
+        self._written_at = None
+        self._refilled_at = None
+        self._max_queue_depth = 0
+        self._frames = 0
+        self._writes = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._dropped = 0
+        self.configure(min_gap, rate, burst)
+
+    def __len__(self):
+        return sum(len(queue) for queue in self._pending)
+
+    @property
+    def stats(self) -> SchedulerStats:
+        """
+        Returns:
+            SchedulerStats: the queue depth, and how long frames waited to go out
+        """
+        return SchedulerStats(
+            len(self),
+            self._max_queue_depth,
+            self._frames,
+            self._writes,
+            self._total_wait,
+            self._max_wait,
+            self._dropped,
+        )
+
+    @property
+    def min_gap(self) -> float:
+        """
+        Returns:
+            float: the least seconds between two frames
+        """
+        return self._min_gap
+
+    def configure(self, min_gap: float, rate: float, burst: int):
+        """
+        Change the pacing, it applies from the next write on.
+
+        Args:
+            min_gap (float): the least seconds between two frames
+            rate (float): the frames per second refilled into the bucket
+            burst (int): the most frames the bucket holds
+        """
+        if min_gap < 0:
+            raise ValueError("min_gap can't be negative")
+
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+
+        if burst < 1:
+            raise ValueError("burst must be at least 1")
+
+        self._min_gap = min_gap
+        self._rate = rate
+        self._burst = burst
+        self._tokens = float(burst)
+        self._refilled_at = None
+
+    def submit(
+        self,
+        frame: bytes,
+        priority: HtdPriority = HtdPriority.INTERACTIVE,
+        owner: object = None,
+        gap: float = None,
+    ):
+        """
+        Queue a frame to be written.
+
+        Args:
+            frame (bytes): the frame
+            priority (HtdPriority): how urgent the frame is
+            owner (object): who sent the frame, to withdraw it by
+            gap (float): the least seconds after the previous frame, for a frame its sender paces, None to pace it here
+        """
+        queue = self._pending[priority]
+
+        if priority != HtdPriority.INTERACTIVE and any(entry[0] == frame for entry in queue):
+            self._dropped += 1
+            return
+
+        loop = asyncio.get_running_loop()
+        queue.append((frame, loop.time(), owner, gap))
+
+        depth = len(self)
+
+        if depth > self._max_queue_depth:
+            self._max_queue_depth = depth
+
+        if self._handle is None:
+            self._arm(loop)
+
+    def clear(self):
+        """
+        Drop every frame that's still waiting.
+        """
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+        for queue in self._pending:
+            queue.clear()
+
+    def withdraw(self, owner: object) -> int:
+        """
+        Drop the frames of an owner that are still waiting, e.g. of a command
+        that was cancelled.
+
+        Args:
+            owner (object): who sent the frames
+
+        Returns:
+            int: the number of frames dropped
+        """
+        withdrawn = 0
+
+        for queue in self._pending:
+            kept = [entry for entry in queue if entry[2] is not owner]
+
+            if len(kept) != len(queue):
+                withdrawn += len(queue) - len(kept)
+                queue.clear()
+                queue.extend(kept)
+
+        return withdrawn
+
+    def drain_time(self, priority: HtdPriority = HtdPriority.BACKGROUND) -> float:
+        """
+        Estimate how long until the frames waiting now, that go out before a
+        frame of the priority, are all written.
+
+        Args:
+            priority (HtdPriority): the priority of the frame that's to wait
+
+        Returns:
+            float: the seconds until those frames are written
+        """
+        ahead = sum(len(queue) for queue in self._pending[:priority + 1])
+
+        if not ahead:
+            return 0.0
+
+        now = asyncio.get_running_loop().time()
+        self._refill(now)
+
+        start = 0.0 if self._written_at is None else max(self._written_at + self._min_gap - now, 0.0)
+        missing = max(ahead - self._tokens, 0.0)
+
+        # every frame after the first waits out the gap
+        return max(start + (ahead - 1) * self._min_gap, missing / self._rate)
+
+    def _refill(self, now: float):
+        if self._refilled_at is not None:
+            self._tokens = min(self._tokens + (now - self._refilled_at) * self._rate, self._burst)
+
+        self._refilled_at = now
+
+    def _next(self) -> QueuedFrame | None:
+        for queue in self._pending:
+            if queue:
+                return queue[0]
+
+        return None
+
+    @staticmethod
+    def _joins(first: QueuedFrame, entry: QueuedFrame) -> bool:
+        # sent by the same sender for the same zone
+        zone = HtdConstants.MESSAGE_HEADER_LENGTH
+
+        return first[2] is not None and entry[2] is first[2] and entry[0][zone:zone + 1] == first[0][zone:zone + 1]
+
+    def _arm(self, loop: asyncio.AbstractEventLoop):
+        now = loop.time()
+        self._refill(now)
+
+        gap = self._next()[3]
+        release_at = now
+
+        if self._written_at is not None:
+            release_at = max(release_at, self._written_at + (self._min_gap if gap is None else gap))
+
+        if gap is None and self._tokens < 1:
+            release_at = max(release_at, now + (1 - self._tokens) / self._rate)
+
+        # even when a frame may go out right away, wait for the loop to come
+        # back around, so everything sent in the meantime shares the write
+        if release_at <= now:
+            self._handle = loop.call_soon(self._release, loop)
+        else:
+            self._handle = loop.call_at(release_at, self._release, loop)
+
+    def _release(self, loop: asyncio.AbstractEventLoop):
+        self._handle = None
+
+        now = loop.time()
+        self._refill(now)
+
+        following = self._next()
+
+        if following is None:
+            return
+
+        # a frame paced by its sender goes out alone, without a token
+        paced = following[3] is None
+        count = int(self._tokens) if paced else 1
+        frames = []
+
+        interactive = len(self._pending[HtdPriority.INTERACTIVE]) > 0
+
+        for priority, queue in enumerate(self._pending):
+            # background work doesn't share a write, or the tokens, with user commands
+            if priority == HtdPriority.BACKGROUND and interactive:
+                break
+
+            while queue and len(frames) < count:
+                # nor does a frame paced by its sender with one that isn't, they keep their order
+                if (queue[0][3] is None) != paced:
+                    break
+
+                # frames that have to be apart only share a write as parts of one command
+                if self._min_gap > 0 and frames and not self._joins(following, queue[0]):
+                    break
+
+                frame, queued_at, _, _ = queue.popleft()
+                frames.append(frame)
+
+                wait = now - queued_at
+                self._total_wait += wait
+
+                if wait > self._max_wait:
+                    self._max_wait = wait
+
+            if queue and len(frames) < count:
+                break
+
+        if frames:
+            if paced:
+                self._tokens -= len(frames)
+
+            self._written_at = now
+            self._frames += len(frames)
+            self._writes += 1
+
+        # arm for the rest first, a failing write mustn't strand them
+        if any(self._pending):
+            self._arm(loop)
+
+        if frames:
+            self._write(frames)
@@ -1,6 +1,6 @@
 import asyncio
 import logging
-from typing import Literal, Tuple
+from typing import Dict, Iterable, Literal, Tuple
 
 from serial_asyncio import open_serial_connection
 
@@ -39,6 +39,63 @@ def build_command(zone: int, command: int, data_code: int, extra_data: bytearray
     return bytearray(cmd)
 
 
+class CommandFrameCache:
+    """
+    Prebuilt command frames as immutable bytes, keyed by zone, command and
+    data code. The commands a client can send are a small, finite set, so
+    they're built once, up front, instead of on every send. Frames with extra
+    data are built from the cached frame of their zone, command and data code.
+    """
+
+    __slots__ = ("_frames",)
+
+    def __init__(self):
+        self._frames: Dict[Tuple[int, int, int], bytes] = {}
+
+    def __len__(self):
+        return len(self._frames)
+
+    def warm(self, zones: int, codes: Iterable[Tuple[int, int]]):
+        """
+        Build the frames of every command and data code for zones 0 to zones.
+
+        Args:
+            zones (int): the number of zones of the device
+            codes (Iterable[Tuple[int, int]]): the command and data code pairs
+        """
+        codes = tuple(codes)
+
+        for zone in range(zones + 1):
+            for command, data_code in codes:
+                self.get(zone, command, data_code)
+
+    def get(self, zone: int, command: int, data_code: int, extra_data: bytearray = None) -> bytes:
+        """
+        Get the frame for a command, see `build_command`.
+
+        Args:
+            zone (int): the zone this command is for
+            command (int): the command itself
+            data_code (int): a value associated to the command
+            extra_data (int, optional): additional data to send with the command, if any. Defaults to None.
+
+        Returns:
+            bytes: the frame to send
+        """
+        key = (zone, command, data_code)
+        frame = self._frames.get(key)
+
+        if frame is None:
+            frame = self._frames[key] = bytes(build_command(zone, command, data_code))
+
+        if extra_data is None:
+            return frame
+
+        # the checksum is a plain sum, so it carries on from the cached frame's
+        checksum = (frame[-1] + sum(extra_data)) & 0xff
+        return frame[:-1] + bytes(extra_data) + bytes((checksum,))
+
+
 def stringify_bytes_raw(data: bytes, fmt: Literal["hex", "dec"] = "hex") -> str:
     if fmt == "hex":
         prefix = "0x"
@@ -189,6 +246,37 @@ def to_binary_string(raw_value: int) -> str:
     return state_toggles
 
 
+def _build_state_toggles_table(kind: HtdDeviceKind) -> Tuple[Tuple[bool, bool, bool, bool], ...]:
+    table = []
+
+    for raw_value in range(256):
+        state_toggles = to_binary_string(raw_value)
+
+        # the lync reports its flags starting from the least significant bit
+        if kind == HtdDeviceKind.lync:
+            state_toggles = state_toggles[::-1]
+
+        table.append((
+            is_bit_on(state_toggles, HtdConstants.POWER_STATE_TOGGLE_INDEX),
+            is_bit_on(state_toggles, HtdConstants.MUTE_STATE_TOGGLE_INDEX),
+            is_bit_on(state_toggles, HtdConstants.MODE_STATE_TOGGLE_INDEX),
+            is_bit_on(state_toggles, HtdConstants.PARTY_STATE_TOGGLE_INDEX),
+        ))
+
+    return tuple(table)
+
+
+# every possible state toggles byte decoded up front, per device kind,
+# into a (power, mute, mode, party) tuple
+STATE_TOGGLES_TABLES: Dict[HtdDeviceKind, Tuple[Tuple[bool, bool, bool, bool], ...]] = {
+    kind: _build_state_toggles_table(kind) for kind in HtdDeviceKind
+}
+
+# every possible byte converted with convert_value and convert_volume
+SIGNED_VALUE_TABLE: Tuple[int, ...] = tuple(convert_value(raw_value) for raw_value in range(256))
+VOLUME_TABLE: Tuple[int, ...] = tuple(convert_volume(HtdDeviceKind.mca, raw_value) for raw_value in range(256))
+
+
 def parse_zone_name(data: bytes):
     start = HtdConstants.NAME_START_INDEX
     end = start + HtdConstants.ZONE_NAME_MAX_LENGTH
@@ -0,0 +1,62 @@
+import logging
+
+import htd_client.utils
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class WireLogger:
+    """
+    Logs the raw bytes sent to and received from a gateway as hex and decimal
+    dumps. It's off by default and switched on per client, and nothing is
+    formatted unless it's enabled and this module's logger accepts debug
+    records. Under heavy traffic, only 1 in every `sample_rate` dumps is
+    logged.
+
+    Args:
+        name (str): how the gateway is identified in the log
+    """
+
+    __slots__ = ("enabled", "_name", "_sample_rate", "_count")
+
+    def __init__(self, name: str):
+        self.enabled = False
+        self._name = name
+        self._sample_rate = 1
+        self._count = 0
+
+    def configure(self, enabled: bool, sample_rate: int = 1):
+        """
+        Turn wire logging on or off.
+
+        Args:
+            enabled (bool): if the bytes should be logged
+            sample_rate (int): log 1 in every N dumps
+        """
+        if sample_rate < 1:
+            raise ValueError("sample_rate must be at least 1")
+
+        self.enabled = enabled
+        self._sample_rate = sample_rate
+        self._count = 0
+
+    def log(self, message: str, data: bytes):
+        """
+        Log a dump of data, if enabled and sampled.
+
+        Args:
+            message (str): what the data is, e.g. received, sent
+            data (bytes): the raw bytes
+        """
+        if not self.enabled:
+            return
+
+        self._count += 1
+
+        if self._count < self._sample_rate:
+            return
+
+        self._count = 0
+
+        if _LOGGER.isEnabledFor(logging.DEBUG):
+            _LOGGER.debug("[%s] %s %s", self._name, message, htd_client.utils.stringify_bytes(data))
@@ -2,7 +2,7 @@ import pytest
 import asyncio
 from unittest.mock import MagicMock, AsyncMock, patch
 from htd_client.base_client import BaseClient
-from htd_client.constants import HtdConstants, HtdCommonCommands, HtdDeviceKind
+from htd_client.constants import HtdConstants, HtdCommonCommands, HtdDeviceKind, HtdPriority
 
 @pytest.fixture
 def client():
@@ -23,13 +23,12 @@ def client():
     c._connection = MagicMock()
     c._subscribers = set()
     c._zone_data = {}
-    c._socket_lock = asyncio.Lock()
     c._callback_lock = asyncio.Lock()
     c._connected = True
     return c
 
 class ConcreteClient(BaseClient):
-    async def refresh(self, zone: int = None): pass
+    async def refresh(self, zone: int = None, priority=None): pass
     async def power_on_all_zones(self): pass
     async def power_off_all_zones(self): pass
     async def async_set_source(self, zone: int, source: int): pass
@@ -53,15 +52,88 @@ async def test_heartbeat_task(client):
     # Mock sleep to yield control but not wait.
     
     # We can mock refresh to set connected=False?
-    client.refresh.side_effect = lambda: setattr(client, "_connected", False)
+    client.refresh.side_effect = lambda priority: setattr(client, "_connected", False)
     client._connected = True
     
     with patch("asyncio.sleep", new_callable=AsyncMock) as mock_sleep:
         # Run heartbeat
         await client._heartbeat()
-        mock_sleep.assert_called_with(60)
+        mock_sleep.assert_not_called()
     
-    client.refresh.assert_called_once()
+    client.refresh.assert_called_once_with(priority=HtdPriority.BACKGROUND)
+
+def test_heartbeat_only_refreshes_stale_zones(client):
+    client._zone_data = {}
+    client.set_heartbeat(interval=60)
+    now = 1000.0
+    client._last_frame_at = now
+    client._zone_confirmed_at = {zone: now - 10 for zone in range(1, 17)}
+
+    assert client._overdue_zones(now) == []
+    assert client._next_heartbeat_in(now) == 50
+
+    # zone 2 is overdue, zone 3 is close and shares the refresh
+    client._zone_confirmed_at[2] = now - 61
+    client._zone_confirmed_at[3] = now - 50
+
+    assert client._overdue_zones(now) == [2, 3]
+    assert client._next_heartbeat_in(now) == 0
+
+    # a zone that was just asked for isn't asked again right away
+    client._mark_asked([2, 3], now)
+    assert client._overdue_zones(now) == []
+
+    # nor is a disabled zone
+    client._zone_data[4] = MagicMock(enabled=False)
+    client._zone_confirmed_at[4] = now - 100
+    assert client._overdue_zones(now) == []
+
+@pytest.mark.asyncio
+async def test_heartbeat_drops_a_quiet_link(client):
+    client.refresh = AsyncMock()
+    client._connected = True
+    client._connection = MagicMock()
+    client._zone_data = {}
+    client._last_frame_at = 0
+
+    with patch("asyncio.sleep", new_callable=AsyncMock) as mock_sleep:
+        await client._heartbeat()
+
+    # a refresh to load the zones, and one that went unanswered
+    assert client.refresh.call_count == 2
+    mock_sleep.assert_called_with(HtdConstants.DEFAULT_HEARTBEAT_TIMEOUT)
+    client._connection.abort.assert_called_once()
+
+@pytest.mark.asyncio
+async def test_heartbeat_keeps_a_link_that_answers(client):
+    import time
+
+    client._connected = True
+    client._connection = MagicMock()
+    client._zone_data = {}
+    client._last_frame_at = 0
+    refreshes = []
+
+    async def refresh(zone=None, priority=None):
+        refreshes.append(zone)
+
+        # the gateway answers the probe, then the test stops the heartbeat
+        if len(refreshes) == 2:
+            client._last_frame_at = time.monotonic() + 1
+        elif len(refreshes) == 3:
+            client._connected = False
+
+    client.refresh = refresh
+    client.set_heartbeat(interval=0.01, timeout=0.01)
+
+    with patch("asyncio.sleep", new_callable=AsyncMock):
+        await client._heartbeat()
+
+    client._connection.abort.assert_not_called()
+
+def test_invalid_heartbeat(client):
+    with pytest.raises(ValueError):
+        client.set_heartbeat(interval=0)
 
 @pytest.mark.asyncio
 async def test_broadcast_subscribers(client):
@@ -74,7 +146,8 @@ async def test_broadcast_subscribers(client):
     await client.async_subscribe(callback)
     assert callback in client._subscribers
     
-    await client._broadcast(1)
+    client._record_zone_change(1, ("volume",))
+    client._broadcast()
     callback.assert_called_with(1)
 
 @pytest.mark.asyncio
@@ -87,10 +160,10 @@ async def test_toggle_mute(client):
     }
     
     await client.async_toggle_mute(1)
-    client.async_unmute.assert_called_with(1)
+    client.async_unmute.assert_called_with(1, timeout=None)
     
     await client.async_toggle_mute(2)
-    client.async_mute.assert_called_with(2)
+    client.async_mute.assert_called_with(2, timeout=None)
 
 def test_parse_keypad_exists(client):
     client._zone_data = {}
@@ -132,3 +205,149 @@ def test_parse_unknown(client):
     cmd = 0xFE
     data = bytes([0])
     client._parse_command(0, cmd, data)
+
+def test_receive_handlers_built_per_class(client):
+    from htd_client.base_client import receive_command
+    from htd_client.lync_client import HtdLyncClient
+    from htd_client.mca_client import HtdMcaClient
+
+    handlers = ConcreteClient._receive_handlers
+    assert handlers[HtdCommonCommands.ZONE_STATUS_RECEIVE_COMMAND].length == 9
+    assert HtdCommonCommands.MP3_ON_RECEIVE_COMMAND not in handlers
+
+    assert HtdCommonCommands.MP3_ON_RECEIVE_COMMAND in HtdLyncClient._receive_handlers
+    assert HtdCommonCommands.ZONE_SOURCE_NAME_RECEIVE_COMMAND_MCA in HtdMcaClient._receive_handlers
+    assert HtdCommonCommands.ZONE_SOURCE_NAME_RECEIVE_COMMAND_LYNC not in HtdMcaClient._receive_handlers
+
+    received = []
+
+    class ExtendedClient(ConcreteClient):
+        @receive_command(0x42, 2)
+        def _on_custom(self, zone, data):
+            received.append((zone, bytes(data)))
+
+    extended = ExtendedClient(client._loop, client._model_info)
+    frame = bytes([HtdConstants.HEADER_BYTE, HtdConstants.RESERVED_BYTE, 3, 0x42, 7, 8])
+    frame += bytes([sum(frame) & 0xff])
+
+    assert extended._process_next_command(frame) == (3, len(frame))
+    assert received == [(3, b"\x07\x08")]
+    assert 0x42 not in ConcreteClient._receive_handlers
+
+@pytest.mark.asyncio
+async def test_broadcast_coalesced_per_loop_iteration(client):
+    client._loop = asyncio.get_running_loop()
+    client._ready = False
+
+    zone_callback = MagicMock()
+    change_callback = MagicMock()
+    await client.async_subscribe(zone_callback)
+    await client.async_subscribe_changes(change_callback)
+
+    changes = iter([(1, "volume"), (2, "source"), (1, "mute")])
+
+    def process_next_command(data, offset):
+        zone, field = next(changes)
+        client._record_zone_change(zone, (field,))
+        return zone, 5
+
+    client._process_next_command = MagicMock(side_effect=process_next_command)
+    client.data_received(b"1234512345")
+    client.data_received(b"12345")
+
+    # nothing is delivered until the loop runs the broadcast
+    change_callback.assert_not_called()
+    await asyncio.sleep(0)
+
+    change_callback.assert_called_once_with({1: frozenset({"volume", "mute"}), 2: frozenset({"source"})})
+    assert [c.args for c in zone_callback.call_args_list] == [(1,), (2,)]
+
+    await client.async_unsubscribe_changes(change_callback)
+    client._record_zone_change(3, ("power",))
+    client._broadcast()
+    change_callback.assert_called_once()
+
+def test_jitter(client):
+    assert client._jittered(60) == 60
+
+    client.set_jitter(0.25)
+
+    for _ in range(100):
+        assert 45 <= client._jittered(60) <= 75
+
+    with pytest.raises(ValueError):
+        client.set_jitter(1)
+
+def test_disconnect_cancels_reconnect(client):
+    client._connection = None
+    client._reconnect_task = MagicMock()
+
+    client.disconnect()
+
+    assert client._disconnected
+    client._reconnect_task.cancel.assert_called_once()
+
+def test_socket_options_tune_network_connections(client):
+    import socket
+    from htd_client.base_client import apply_socket_options
+
+    client.set_socket_options(keepalive_idle=7, receive_buffer=8192)
+    options = client._socket_options
+
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        apply_socket_options(sock, options)
+
+        assert sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY)
+        assert sock.getsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE)
+        assert sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF) >= 8192
+
+        if hasattr(socket, "TCP_KEEPIDLE"):
+            assert sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE) == 7
+            assert sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPCNT) == 3
+
+    # a serial port has no socket
+    apply_socket_options(None, options)
+
+    with pytest.raises(ValueError):
+        client.set_socket_options(keepalive_count=0)
+
+@pytest.mark.asyncio
+async def test_watchdog_backs_up_the_heartbeat(client):
+    client._loop = asyncio.get_running_loop()
+    client.refresh = AsyncMock()
+    client._heartbeat = AsyncMock()
+    client.set_heartbeat(interval=0.02, timeout=0.01)
+
+    transport = MagicMock()
+    client.connection_made(transport)
+
+    # the heartbeat is given its interval and timeout, and as long again to probe
+    await asyncio.sleep(0.03)
+    transport.abort.assert_not_called()
+
+    await asyncio.sleep(0.03)
+    transport.abort.assert_called_once()
+
+    # the watchdog leaves the probing to the heartbeat
+    client.refresh.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_watchdog_kept_quiet_by_frames(client):
+    import time
+
+    client._loop = asyncio.get_running_loop()
+    client._heartbeat = AsyncMock()
+    client.set_heartbeat(interval=0.02, timeout=0.01)
+
+    transport = MagicMock()
+    client.connection_made(transport)
+
+    for _ in range(6):
+        await asyncio.sleep(0.02)
+        client._last_frame_at = time.monotonic()
+
+    transport.abort.assert_not_called()
+
+    # and it can be turned off
+    client.set_watchdog(False)
+    assert client._watchdog_handle is None
@@ -2,10 +2,11 @@ import pytest
 import asyncio
 from unittest.mock import MagicMock, AsyncMock, patch
 from htd_client.base_client import BaseClient
-from htd_client.constants import HtdConstants, HtdModelInfo, HtdDeviceKind, HtdCommonCommands
+from htd_client.constants import HtdConstants, HtdModelInfo, HtdDeviceKind, HtdCommonCommands, HtdPriority
+from htd_client.exceptions import HtdCommandRejectedError, HtdDisconnectedError, HtdTimeoutError
 
 class ConcreteClient(BaseClient):
-    async def refresh(self, zone: int = None): pass
+    async def refresh(self, zone: int = None, priority=None): pass
     async def power_on_all_zones(self): pass
     async def power_off_all_zones(self): pass
     async def async_set_source(self, zone: int, source: int): pass
@@ -56,6 +57,16 @@ async def test_connect_network(client):
     await client.async_connect()
     client._loop.create_connection.assert_called_once()
 
+@pytest.mark.asyncio
+async def test_connect_takes_over_probe(client):
+    client._loop.create_connection = AsyncMock()
+    probe = MagicMock()
+
+    await client.async_connect(probe)
+
+    probe.attach.assert_called_once_with(client)
+    client._loop.create_connection.assert_not_called()
+
 @pytest.mark.asyncio
 async def test_connect_serial(mock_model_info):
     loop = MagicMock()
@@ -113,15 +124,20 @@ async def test_reconnect_logic(client):
 
 def test_data_received(client):
     # Mock _process_next_command to consume data
-    client._process_next_command = MagicMock(return_value=(1, 5)) # zone 1, 5 bytes consumed
-    client._broadcast = MagicMock() # Needs to be async? create_task handles it.
-    client._loop.create_task = MagicMock()
+    def process_next_command(data, offset):
+        client._record_zone_change(1, ("volume",))
+        return 1, 5 # zone 1, 5 bytes consumed
+
+    client._process_next_command = MagicMock(side_effect=process_next_command)
+    client._loop.call_soon = MagicMock()
     
-    client.data_received(b"12345")
+    client.data_received(b"1234512345")
     
     client._process_next_command.assert_called()
     assert len(client._buffer) == 0
-    client._loop.create_task.assert_called() # Broadcast
+    # one broadcast for the whole read
+    client._loop.call_soon.assert_called_once_with(client._broadcast)
+    assert client._zone_changes == {1: {"volume"}}
 
 def test_data_received_partial(client):
     # Mock processing that consumes nothing (waiting for more data)
@@ -179,8 +195,7 @@ def test_process_next_command_parsing(client):
 @pytest.mark.asyncio
 async def test_send_and_validate_success(client):
     client._connection = MagicMock()
-    client._connection.write = MagicMock()
-    client._socket_lock = asyncio.Lock()
+    client._loop = asyncio.get_running_loop()
     
     validate_func = MagicMock(side_effect=[False, True]) # Fail first check, succeed second
     # get_zone calls validate. 
@@ -190,12 +205,14 @@ async def test_send_and_validate_success(client):
     
     await client._async_send_and_validate(validate_func, 1, 0x01, 0x02)
     
-    assert client._connection.write.call_count >= 1
+    assert client._connection.writelines.call_count >= 1
+    # the command took effect on the first attempt, so it measured the round trip
+    assert client.rtt is not None
+    assert client.retry_timeout == client._rtt.rto
 
 @pytest.mark.asyncio
 async def test_send_and_validate_timeout(client):
     client._connection = MagicMock()
-    client._socket_lock = asyncio.Lock()
     client._retry_attempts = 1
     client._command_retry_timeout = 0 # Immediate retry
     
@@ -205,3 +222,386 @@ async def test_send_and_validate_timeout(client):
     
     with pytest.raises(Exception, match="Failed to execute command"):
          await client._async_send_and_validate(validate_func, 1, 0x01, 0x02)
+
+@pytest.mark.asyncio
+async def test_send_cmd_coalesces_writes(client):
+    from htd_client.utils import build_command
+
+    client._connection = MagicMock()
+    client._loop = asyncio.get_running_loop()
+    client.set_pacing(min_gap=0, rate=1000, burst=10)
+
+    await client._send_cmd(1, 0x04, 0x20)
+    await client._send_cmd(1, 0x15, 0xc4)
+    await client._send_cmd(2, 0x04, 0x21)
+
+    client._connection.writelines.assert_not_called()
+
+    await asyncio.sleep(0)
+
+    client._connection.writelines.assert_called_once_with([
+        build_command(1, 0x04, 0x20),
+        build_command(1, 0x15, 0xc4),
+        build_command(2, 0x04, 0x21),
+    ])
+    client._connection.write.assert_not_called()
+    assert client.write_stats == (1, 3)
+    assert client.write_stats.frames_per_write == 3
+
+    await client._send_cmd(3, 0x04, 0x20)
+    await asyncio.sleep(0)
+
+    assert client._connection.writelines.call_count == 2
+    assert client.write_stats.frames_per_write == 2
+    assert client.scheduler_stats.frames == 4
+    assert client.scheduler_stats.queue_depth == 0
+
+
+@pytest.mark.asyncio
+async def test_send_cmd_drops_frames_when_disconnected(client):
+    connection = MagicMock()
+    client._connection = connection
+    client._loop = asyncio.get_running_loop()
+
+    await client._send_cmd(1, 0x04, 0x20)
+    client.connection_lost(None)
+    await asyncio.sleep(0)
+
+    connection.writelines.assert_not_called()
+    assert client.write_stats == (0, 0)
+
+
+def test_data_received_burst_of_frames(client):
+    from htd_client.utils import calculate_checksum
+
+    def zone_status(zone):
+        frame = bytes([HtdConstants.HEADER_BYTE, HtdConstants.RESERVED_BYTE, zone, HtdCommonCommands.ZONE_STATUS_RECEIVE_COMMAND])
+        frame += bytes([0x80, 0, 0, 0, zone, 0xE2, 0, 0, 0])
+        return frame + bytes([calculate_checksum(frame)])
+
+    client._zone_data = {}
+    burst = b"".join(zone_status(zone) for zone in range(1, 7))
+
+    # the last frame is split across two reads
+    client.data_received(burst[:-5])
+    assert sorted(client._zone_data) == [1, 2, 3, 4, 5]
+    assert client._buffer == burst[-14:-5]
+
+    client.data_received(burst[-5:])
+    assert len(client._buffer) == 0
+    assert client._zone_data[6].source == 7
+    assert client.ready
+
+def test_parse_zone_lync_toggles(client):
+    client._model_info["kind"] = HtdDeviceKind.lync
+
+    # power and party on, mute and mode off
+    data = bytes([0b1001, 0, 0, 0, 2, 0xE2, 0x02, 0xFE, 0x80])
+    zone = client._parse_zone(3, data)
+
+    assert zone.number == 3
+    assert (zone.power, zone.mute, zone.mode, zone.party) == (True, False, False, True)
+    assert zone.source == 3
+    assert zone.volume == 30
+    assert (zone.treble, zone.bass, zone.balance) == (2, -2, -128)
+
+
+def test_zone_status_only_broadcasts_changes(client):
+    from htd_client.utils import calculate_checksum
+
+    def zone_status(zone, volume):
+        frame = bytes([HtdConstants.HEADER_BYTE, HtdConstants.RESERVED_BYTE, zone, HtdCommonCommands.ZONE_STATUS_RECEIVE_COMMAND])
+        frame += bytes([0x80, 0, 0, 0, 0, volume, 0, 0, 0])
+        return frame + bytes([calculate_checksum(frame)])
+
+    client._zone_data = {}
+    client._loop.call_soon = MagicMock()
+
+    client.data_received(zone_status(1, 0xE2) + zone_status(2, 0xE2))
+    assert set(client._zone_changes) == {1, 2}
+    client._zone_data[1].name = "kitchen"
+    client._broadcast()
+
+    # same state again, nothing to tell anyone
+    client._loop.call_soon.reset_mock()
+    client.data_received(zone_status(1, 0xE2) + zone_status(2, 0xE2))
+    assert client._zone_changes == {}
+    client._loop.call_soon.assert_not_called()
+
+    client.data_received(zone_status(1, 0xE2) + zone_status(2, 0xE4))
+    assert client._zone_changes == {2: {"volume"}}
+    assert client._zone_data[2].volume == 32
+    assert client._zone_data[1].name == "kitchen"
+
+def test_zone_status_updates_in_place(client):
+    client._zone_data = {}
+    data = bytes([0x80, 0, 0, 0, 0, 0xE2, 0, 0, 0])
+
+    client._on_zone_status(1, data)
+    zone_info = client._zone_data[1]
+    view = client.get_zone(1)
+    assert view.volume == 30
+    assert client.get_zone(1) is view
+
+    client._on_zone_status(1, bytes([0x80, 0, 0, 0, 0, 0xE3, 0, 0, 0]))
+    assert client._zone_data[1] is zone_info
+    assert view.volume == 31
+
+@pytest.mark.asyncio
+async def test_send_and_validate_wakes_on_zone_status(client):
+    loop = asyncio.get_running_loop()
+    client._zone_data = {}
+    client._on_zone_status(1, bytes([0x80, 0, 0, 0, 0, 0xE2, 0, 0, 0]))
+    client._command_retry_timeout = 5
+    client._connection = MagicMock()
+
+    async def send_cmd(zone, command, data_code, extra_data=None, **kwargs):
+        # the gateway echoes the new status a moment later
+        loop.call_later(0.01, client._on_zone_status, zone, bytes([0x80, 0, 0, 0, 0, 0xE3, 0, 0, 0]))
+
+    client._send_cmd = AsyncMock(side_effect=send_cmd)
+
+    started = loop.time()
+    await client._async_send_and_validate(lambda z: z.volume == 31, 1, 0x04, 0x09)
+
+    assert loop.time() - started < 1
+    client._send_cmd.assert_awaited_once()
+    assert client._zone_waiters == {}
+
+
+@pytest.mark.asyncio
+async def test_send_and_validate_times_out(client):
+    client._connection = MagicMock()
+    client._loop = asyncio.get_running_loop()
+    client.get_zone = MagicMock()
+    client._command_retry_timeout = 5
+    # the frame is still waiting its turn when the timeout hits
+    client.set_pacing(min_gap=10, rate=1000, burst=10)
+    client._scheduler._written_at = asyncio.get_running_loop().time()
+
+    with pytest.raises(HtdTimeoutError):
+        await client._async_send_and_validate(lambda z: False, 1, 0x04, 0x09, timeout=0.01)
+
+    assert len(client._scheduler) == 0
+
+    # the execution winds down on the next turns of the loop
+    await asyncio.sleep(0.01)
+
+    assert client._zone_waiters == {}
+    client._connection.writelines.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_cancelled_command_withdraws_its_frames(client):
+    client._connection = MagicMock()
+    client._loop = asyncio.get_running_loop()
+    client.get_zone = MagicMock()
+    client._command_retry_timeout = 5
+    client.set_pacing(min_gap=10, rate=1000, burst=10)
+    client._scheduler._written_at = asyncio.get_running_loop().time()
+
+    task = asyncio.create_task(client._async_send_and_validate(lambda z: False, 1, 0x04, 0x09))
+    await asyncio.sleep(0.01)
+
+    assert len(client._scheduler) == 1
+
+    task.cancel()
+
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    await asyncio.sleep(0)
+
+    assert len(client._scheduler) == 0
+    assert client._zone_waiters == {}
+
+
+@pytest.mark.asyncio
+async def test_connection_lost_fails_waiting_commands(client):
+    client._connection = MagicMock()
+    client._loop = asyncio.get_running_loop()
+    client.get_zone = MagicMock()
+    client._command_retry_timeout = 5
+    client._disconnected = True
+
+    task = asyncio.create_task(client._async_send_and_validate(lambda z: False, 1, 0x04, 0x09))
+    await asyncio.sleep(0.01)
+
+    client.connection_lost(None)
+
+    with pytest.raises(HtdDisconnectedError):
+        await asyncio.wait_for(task, 1)
+
+
+@pytest.mark.asyncio
+async def test_send_and_validate_without_connection(client):
+    client._connection = None
+    client.get_zone = MagicMock()
+
+    with pytest.raises(HtdDisconnectedError):
+        await client._async_send_and_validate(lambda z: False, 1, 0x04, 0x09)
+
+
+@pytest.mark.asyncio
+async def test_error_response_rejects_command(client):
+    client._connection = MagicMock()
+    client._loop = asyncio.get_running_loop()
+    client.get_zone = MagicMock()
+    client._command_retry_timeout = 5
+
+    task = asyncio.create_task(client._async_send_and_validate(lambda z: False, 1, 0x04, 0x09))
+    await asyncio.sleep(0.01)
+
+    client._on_error(1, bytes([0x02, 0, 0, 0, 0, 0, 0, 0, 0]))
+
+    with pytest.raises(HtdCommandRejectedError, match="code 2"):
+        await asyncio.wait_for(task, 1)
+
+
+@pytest.fixture
+def optimistic_client(mock_model_info):
+    client = ConcreteClient(MagicMock(), mock_model_info, optimistic=True)
+    client._connection = MagicMock()
+    client._zone_data = {}
+    client._on_zone_status(1, bytes([0x80, 0, 0, 0, 0, 0xE2, 0, 0, 0]))
+    client._zone_changes.clear()
+    client._command_retry_timeout = 5
+    return client
+
+
+@pytest.mark.asyncio
+async def test_optimistic_value_shown_until_confirmed(optimistic_client):
+    client = optimistic_client
+    client._loop = asyncio.get_running_loop()
+    changes = []
+    await client.async_subscribe_changes(changes.append)
+    client._send_cmd = AsyncMock()
+
+    task = asyncio.create_task(
+        client._async_send_and_validate(lambda z: z.volume == 31, 1, 0x04, 0x09, expected={"volume": 31})
+    )
+    await asyncio.sleep(0.01)
+
+    # shown right away, while validation still looks at what the gateway reported
+    assert client.get_zone(1).volume == 31
+    assert client._confirmed_zone(1).volume == 30
+    assert client.pending_fields(1) == {"volume"}
+    assert changes == [{1: frozenset({"volume"})}]
+
+    client._on_zone_status(1, bytes([0x80, 0, 0, 0, 0, 0xE3, 0, 0, 0]))
+    await task
+    await asyncio.sleep(0)
+
+    assert client.get_zone(1).volume == 31
+    assert client.pending_fields(1) == frozenset()
+    assert client._zone_pending == {}
+    client._send_cmd.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_optimistic_value_rolled_back_on_failure(optimistic_client):
+    client = optimistic_client
+    client._loop = asyncio.get_running_loop()
+    client._send_cmd = AsyncMock()
+    client.refresh = AsyncMock()
+    client._retry_attempts = 1
+    client._command_retry_timeout = 0.01
+    client._rtt = MagicMock(timeout=MagicMock(return_value=0.01))
+
+    with pytest.raises(HtdCommandRejectedError):
+        await client._async_send_and_validate(lambda z: z.volume == 31, 1, 0x04, 0x09, expected={"volume": 31})
+
+    assert client.get_zone(1).volume == 30
+    assert client.pending_fields(1) == frozenset()
+    assert client._zone_changes == {1: {"volume"}}
+
+
+@pytest.mark.asyncio
+async def test_optimistic_mode_is_opt_in(client):
+    client._loop = asyncio.get_running_loop()
+    client._connection = MagicMock()
+    client._zone_data = {}
+    client._on_zone_status(1, bytes([0x80, 0, 0, 0, 0, 0xE2, 0, 0, 0]))
+    client._send_cmd = AsyncMock()
+
+    task = asyncio.create_task(
+        client._async_send_and_validate(lambda z: z.volume == 31, 1, 0x04, 0x09, expected={"volume": 31})
+    )
+    await asyncio.sleep(0.01)
+
+    assert not client.optimistic
+    assert client.get_zone(1).volume == 30
+    assert client.pending_fields(1) == frozenset()
+
+    task.cancel()
+
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+
+def test_restore_zones(client):
+    client._zone_data = {}
+    client._on_zone_status(3, bytes([0x80, 0, 0, 0, 0, 0xE2, 0, 0, 0]))
+    client._zone_changes.clear()
+
+    client.restore_zones({1: True, 2: False, 3: False}, {1: "kitchen", 3: "den"})
+
+    # nothing is shown for a zone the gateway hasn't reported yet
+    assert not client.has_zone_data(1)
+    assert not client.has_zone_data(2)
+    assert client.get_zone(3).enabled
+    assert client.get_zone(3).name == "den"
+    assert client._zone_changes == {3: {"name"}}
+
+    client._zone_changes.clear()
+    client._on_zone_status(1, bytes([0x80, 0, 0, 0, 0, 0xE2, 0, 0, 0]))
+    client._set_zone_enabled(2, False)
+
+    assert client.get_zone(1).name == "kitchen"
+    assert client.get_zone(1).volume == 30
+    assert not client.get_zone(2).enabled
+    assert {"enabled", "name", "volume"} <= client._zone_changes[1]
+    assert client._restored == {}
+
+
+@pytest.mark.asyncio
+async def test_reconnect_keeps_zone_state(client):
+    client._loop.create_connection = AsyncMock(return_value=(MagicMock(), MagicMock()))
+    await client.async_connect()
+
+    for zone in range(1, 7):
+        client._on_zone_status(zone, bytes([0x80, 0, 0, 0, 0, 0xE2, 0, 0, 0]))
+
+    client._ready = True
+    client._set_zone_enabled(6, False)
+    view = client.get_zone(1)
+
+    client.disconnect()
+    client.connection_lost(None)
+    await client.async_connect()
+
+    # the zones and ready survive, stale until the gateway reports them
+    assert client.ready
+    assert client.get_zone(1) is view
+    assert view.volume == 30
+    assert client.stale_zones == {1, 2, 3, 4, 5}
+
+    client._zone_changes.clear()
+    client._on_zone_status(1, bytes([0x80, 0, 0, 0, 0, 0xE2, 0, 0, 0]))
+    client._on_zone_status(2, bytes([0x80, 0, 0, 0, 0, 0xE4, 0, 0, 0]))
+
+    # only the zone that changed while disconnected is broadcast
+    assert client.stale_zones == {3, 4, 5}
+    assert client._zone_changes == {2: {"volume"}}
+
+
+@pytest.mark.asyncio
+async def test_reconnect_resyncs_ahead_of_background_work(client):
+    client._zone_data = {1: MagicMock(enabled=True)}
+    client._stale = {1}
+    client.refresh = AsyncMock(side_effect=lambda priority: setattr(client, "_connected", False))
+    client._connected = True
+
+    await client._heartbeat()
+
+    client.refresh.assert_called_once_with(priority=HtdPriority.VALIDATION)
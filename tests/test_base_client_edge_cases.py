@@ -3,9 +3,10 @@ import asyncio
 from unittest.mock import MagicMock, AsyncMock, patch
 from htd_client.base_client import BaseClient
 from htd_client.constants import HtdConstants, HtdCommonCommands, HtdDeviceKind
+from htd_client.utils import calculate_checksum
 
 class ConcreteClient(BaseClient):
-    async def refresh(self, zone: int = None): pass
+    async def refresh(self, zone: int = None, priority=None): pass
     async def power_on_all_zones(self): pass
     async def power_off_all_zones(self): pass
     async def async_set_source(self, zone: int, source: int): pass
@@ -74,10 +75,16 @@ def test_process_next_command_unknown_command(client):
     # Header(2) + Zone(1) + Cmd(1) + Data(2).
     frame = header + bytes([1, cmd, 0, 0]) 
     
-    zone_ret, consumed = client._process_next_command(frame)
+    with patch("htd_client.base_client._LOGGER") as logger:
+        zone_ret, consumed = client._process_next_command(frame)
+
     assert zone_ret is None
     assert consumed == 2
 
+    # a gateway sending noise isn't an error of the client
+    logger.debug.assert_called_once_with("Invalid command value: zone = %d, command = 0x%02x", 1, cmd)
+    logger.error.assert_not_called()
+
 def test_process_next_command_checksum_fail(client):
     header = bytes([HtdConstants.HEADER_BYTE, HtdConstants.RESERVED_BYTE])
     zone = 1
@@ -109,6 +116,16 @@ def test_process_next_command_checksum_fail(client):
         client._process_next_command(full)
         mock_parse.assert_not_called()
 
+    # a valid frame is dispatched through it
+    full = full[:-1] + bytes([calculate_checksum(full[:-1])])
+
+    parsed = []
+
+    with patch.object(client, '_parse_command', side_effect=lambda *args: parsed.append((args[0], args[1], bytes(args[2])))):
+        client._process_next_command(full)
+
+    assert parsed == [(zone, cmd, data)]
+
 def test_parse_command_Zonename(client):
     zone = 1
     cmd = HtdCommonCommands.ZONE_NAME_RECEIVE_COMMAND
@@ -4,7 +4,7 @@ from unittest.mock import MagicMock, patch
 import pytest
 
 from htd_client.mca_client import HtdMcaClient
-from htd_client.constants import HtdConstants, HtdMcaCommands, HtdMcaConstants
+from htd_client.constants import HtdConstants, HtdMcaCommands, HtdMcaConstants, HtdPriority
 
 # Mock constants
 MOCK_IP_ADDRESS = "10.0.0.1"
@@ -118,7 +118,7 @@ def test_all_zones_set_commands(mock__send_cmd, method, code, htd_instance):
 def test_all_zones_query_command(mock__send_cmd, htd_instance):
     import asyncio
     asyncio.run(htd_instance.refresh())
-    mock__send_cmd.assert_called_with(0, HtdMcaCommands.QUERY_COMMAND_CODE, 0)
+    mock__send_cmd.assert_called_with(0, HtdMcaCommands.QUERY_COMMAND_CODE, 0, priority=HtdPriority.INTERACTIVE)
 
 
 # @patch('htd_client.utils.get_friendly_name')
@@ -139,7 +139,7 @@ def test_query_zone(mock__send_cmd, htd_instance):
     zone_number = 1
     import asyncio
     asyncio.run(htd_instance.refresh_zone(zone_number))
-    mock__send_cmd.assert_called_with(zone_number, HtdMcaCommands.QUERY_COMMAND_CODE, 0)
+    mock__send_cmd.assert_called_with(zone_number, HtdMcaCommands.QUERY_COMMAND_CODE, 0, priority=HtdPriority.INTERACTIVE)
 
 
 
@@ -0,0 +1,152 @@
+import asyncio
+
+import pytest
+
+from htd_client.command_queue import QueuedCommand, ZoneCommandQueue
+from htd_client.exceptions import HtdError
+
+
+def command(data_code, intent=None):
+    return QueuedCommand(lambda z: True, 1, 0x04, data_code, intent=intent)
+
+
+@pytest.mark.asyncio
+async def test_commands_run_in_order():
+    executed = []
+
+    async def execute(queued):
+        await asyncio.sleep(0)
+        executed.append(queued.data_code)
+        return queued.data_code
+
+    queue = ZoneCommandQueue(execute)
+    results = await asyncio.gather(*(queue.submit(command(code)) for code in (1, 2, 3)))
+
+    assert executed == [1, 2, 3]
+    assert results == [1, 2, 3]
+    assert len(queue) == 0
+
+
+@pytest.mark.asyncio
+async def test_same_intent_is_coalesced():
+    executed = []
+    release = asyncio.Event()
+
+    async def execute(queued):
+        await release.wait()
+        executed.append((queued.intent, queued.data_code))
+        return queued.data_code
+
+    queue = ZoneCommandQueue(execute)
+
+    # the first volume is already on the wire when the others arrive
+    first = queue.submit(command(10, "volume"))
+    await asyncio.sleep(0)
+
+    second = queue.submit(command(11, "volume"))
+    source = queue.submit(command(3, "source"))
+    third = queue.submit(command(12, "volume"))
+
+    assert queue.has_intent("volume")
+    assert len(queue) == 2
+
+    release.set()
+    assert await asyncio.gather(first, second, source, third) == [10, 12, 3, 12]
+    assert executed == [("volume", 10), ("volume", 12), ("source", 3)]
+
+
+@pytest.mark.asyncio
+async def test_failure_reaches_replaced_callers():
+    release = asyncio.Event()
+
+    async def execute(queued):
+        await release.wait()
+        if queued.data_code == 12:
+            raise ValueError("rejected")
+
+    queue = ZoneCommandQueue(execute)
+    first = queue.submit(command(10, "volume"))
+    await asyncio.sleep(0)
+    second = queue.submit(command(11, "volume"))
+    third = queue.submit(command(12, "volume"))
+    release.set()
+
+    await first
+    with pytest.raises(ValueError):
+        await second
+    with pytest.raises(ValueError):
+        await third
+
+
+@pytest.mark.asyncio
+async def test_cancelled_command_is_skipped():
+    executed = []
+    release = asyncio.Event()
+
+    async def execute(queued):
+        await release.wait()
+        executed.append(queued.data_code)
+
+    queue = ZoneCommandQueue(execute)
+    first = queue.submit(command(1))
+    second = queue.submit(command(2))
+    await asyncio.sleep(0)
+
+    second.cancel()
+    release.set()
+    await first
+    await asyncio.sleep(0)
+
+    assert executed == [1]
+
+
+@pytest.mark.asyncio
+async def test_giving_up_on_a_command_stops_its_execution():
+    executed = []
+    started = asyncio.Event()
+
+    async def execute(queued):
+        if queued.data_code == 1:
+            started.set()
+            await asyncio.sleep(10)
+
+        executed.append(queued.data_code)
+
+    queue = ZoneCommandQueue(execute)
+    first = queue.submit(command(1))
+    second = queue.submit(command(2))
+    await started.wait()
+
+    first.cancel()
+    await second
+
+    assert executed == [2]
+
+
+@pytest.mark.asyncio
+async def test_replaced_caller_outlives_a_newer_caller_timing_out():
+    release = asyncio.Event()
+
+    async def execute(queued):
+        await release.wait()
+        return queued.data_code
+
+    queue = ZoneCommandQueue(execute)
+    first = queue.submit(command(10, "volume"))
+    await asyncio.sleep(0)
+
+    # the older caller waits longer than the newer one that replaces it
+    older = asyncio.ensure_future(asyncio.wait_for(queue.submit(command(11, "volume")), 5))
+    await asyncio.sleep(0)
+    newer = asyncio.wait_for(queue.submit(command(12, "volume")), 0.05)
+
+    with pytest.raises(asyncio.TimeoutError):
+        await newer
+
+    # the older caller isn't handed the newer one's cancellation
+    with pytest.raises(HtdError):
+        await older
+
+    assert not older.cancelled()
+    release.set()
+    assert await first == 10
@@ -1,3 +1,4 @@
+import asyncio
 import pytest
 from unittest.mock import MagicMock, AsyncMock, patch
 from htd_client import async_get_client, async_get_model_info, HtdMcaClient, HtdLyncClient
@@ -36,36 +37,83 @@ async def test_async_get_model_info_failure():
 async def test_async_get_client_mca():
     mock_loop = MagicMock()
     
-    with patch("htd_client.async_get_model_info", new_callable=AsyncMock) as mock_get_info:
-        model_info = HtdConstants.SUPPORTED_MODELS["mca66"]
-        mock_get_info.return_value = model_info
+    with patch("htd_client.async_probe_model", new_callable=AsyncMock) as mock_probe:
+        probe = MagicMock(model=HtdConstants.SUPPORTED_MODELS["mca66"])
+        mock_probe.return_value = probe
         
         with patch("htd_client.mca_client.HtdMcaClient.async_connect", new_callable=AsyncMock) as mock_connect:
             client = await async_get_client(loop=mock_loop, network_address=("1.2.3.4", 10006))
             
             assert isinstance(client, HtdMcaClient)
-            mock_connect.assert_called_once()
+            # the client takes over the connection the model was detected on
+            mock_connect.assert_called_once_with(probe)
+            probe.close.assert_not_called()
 
 @pytest.mark.asyncio
 async def test_async_get_client_lync():
     mock_loop = MagicMock()
     
-    with patch("htd_client.async_get_model_info", new_callable=AsyncMock) as mock_get_info:
-        model_info = HtdConstants.SUPPORTED_MODELS["lync6"]
-        mock_get_info.return_value = model_info
+    with patch("htd_client.async_probe_model", new_callable=AsyncMock) as mock_probe:
+        probe = MagicMock(model=HtdConstants.SUPPORTED_MODELS["lync6"])
+        mock_probe.return_value = probe
         
         with patch("htd_client.lync_client.HtdLyncClient.async_connect", new_callable=AsyncMock) as mock_connect:
             client = await async_get_client(loop=mock_loop, network_address=("1.2.3.4", 10006))
             
             assert isinstance(client, HtdLyncClient)
-            mock_connect.assert_called_once()
+            mock_connect.assert_called_once_with(probe)
 
 @pytest.mark.asyncio
 async def test_async_get_client_unknown():
     mock_loop = MagicMock()
     
-    with patch("htd_client.async_get_model_info", new_callable=AsyncMock) as mock_get_info:
-        mock_get_info.return_value = {"kind": "unknown_kind"}
+    with patch("htd_client.async_probe_model", new_callable=AsyncMock) as mock_probe:
+        probe = MagicMock(model={"kind": "unknown_kind"})
+        mock_probe.return_value = probe
         
         with pytest.raises(ValueError, match="Unknown Device Kind"):
             await async_get_client(loop=mock_loop, network_address=("1.2.3.4", 10006))
+
+        probe.close.assert_called_once()
+
+@pytest.mark.asyncio
+async def test_async_get_client_unsupported_model():
+    mock_loop = MagicMock()
+
+    with patch("htd_client.async_probe_model", new_callable=AsyncMock) as mock_probe:
+        probe = MagicMock(model=None)
+        mock_probe.return_value = probe
+
+        with pytest.raises(ValueError, match="supported model"):
+            await async_get_client(loop=mock_loop, network_address=("1.2.3.4", 10006))
+
+        probe.close.assert_called_once()
+
+@pytest.mark.asyncio
+async def test_async_get_client_from_cache(tmp_path):
+    from htd_client.model_cache import ModelCache
+    from htd_client.models import ZoneDetail
+
+    cache_path = tmp_path / "models.json"
+    ModelCache(cache_path).save(
+        "tcp:1.2.3.4:10006",
+        HtdConstants.SUPPORTED_MODELS["lync12"],
+        {1: ZoneDetail(1, enabled=True, name="kitchen")},
+    )
+
+    with patch("htd_client.async_probe_model", new_callable=AsyncMock) as mock_probe, \
+            patch("htd_client.async_open_probe", new_callable=AsyncMock) as mock_open, \
+            patch("htd_client.async_maintain_cache", new_callable=AsyncMock) as mock_maintain, \
+            patch("htd_client.lync_client.HtdLyncClient.async_connect", new_callable=AsyncMock) as mock_connect, \
+            patch("htd_client.lync_client.HtdLyncClient.restore_zones") as mock_restore:
+        client = await async_get_client(network_address=("1.2.3.4", 10006), cache_path=cache_path)
+
+        # no waiting for the gateway to report its model
+        mock_probe.assert_not_called()
+        assert isinstance(client, HtdLyncClient)
+        assert client.model == HtdConstants.SUPPORTED_MODELS["lync12"]
+        mock_connect.assert_called_once_with(mock_open.return_value)
+        mock_restore.assert_called_once_with({1: True}, {1: "kitchen"})
+
+        await asyncio.sleep(0)
+        mock_maintain.assert_awaited_once()
@@ -1,6 +1,7 @@
 import pytest
 import asyncio
 from unittest.mock import MagicMock, AsyncMock, patch
+import htd_client.utils
 from htd_client.lync_client import HtdLyncClient
 from htd_client.constants import HtdConstants, HtdDeviceKind, HtdLyncCommands, HtdLyncConstants
 from htd_client.models import ZoneDetail
@@ -18,7 +19,6 @@ def lync_client():
     }
     client = HtdLyncClient(loop, model_info)
     client._connection = MagicMock()
-    client._socket_lock = asyncio.Lock()
     # Mock _zone_data
     client._zone_data = {
         i: ZoneDetail(i, enabled=True, power=True, volume=30) 
@@ -79,7 +79,7 @@ async def test_volume_limits(lync_client):
     # Valid up
     lync_client._zone_data[1].volume = 30
     await lync_client.async_volume_up(1)
-    lync_client.async_set_volume.assert_awaited_with(1, 31)
+    lync_client.async_set_volume.assert_awaited_with(1, 31, timeout=None)
 
 @pytest.mark.asyncio
 async def test_bass_treble_balance_limits(lync_client):
@@ -157,26 +157,26 @@ async def test_audio_controls_success(lync_client):
     lync_client._zone_data[1].bass = 0 # Within limits
     await lync_client.async_bass_up(1)
     # calls async_set_bass(1, 1)
-    lync_client.async_set_bass.assert_awaited_with(1, 1)
+    lync_client.async_set_bass.assert_awaited_with(1, 1, timeout=None)
     
     await lync_client.async_bass_down(1)
-    lync_client.async_set_bass.assert_awaited_with(1, -1)
+    lync_client.async_set_bass.assert_awaited_with(1, -1, timeout=None)
     
     # Treble success
     lync_client._zone_data[1].treble = 0
     await lync_client.async_treble_up(1)
-    lync_client.async_set_treble.assert_awaited_with(1, 1)
+    lync_client.async_set_treble.assert_awaited_with(1, 1, timeout=None)
     
     await lync_client.async_treble_down(1)
-    lync_client.async_set_treble.assert_awaited_with(1, -1)
+    lync_client.async_set_treble.assert_awaited_with(1, -1, timeout=None)
     
     # Balance success
     lync_client._zone_data[1].balance = 0
     await lync_client.async_balance_right(1) # +1
-    lync_client.async_set_balance.assert_awaited_with(1, 1)
+    lync_client.async_set_balance.assert_awaited_with(1, 1, timeout=None)
     
     await lync_client.async_balance_left(1) # -1
-    lync_client.async_set_balance.assert_awaited_with(1, -1)
+    lync_client.async_set_balance.assert_awaited_with(1, -1, timeout=None)
 
 @pytest.mark.asyncio
 async def test_set_audio_values(lync_client):
@@ -214,3 +214,107 @@ async def test_set_source_high(lync_client):
     args = lync_client._async_send_and_validate.call_args[0]
     # Check offset usage
     assert args[3] == 13 + HtdLyncConstants.SOURCE_13_HIGHER_COMMAND_OFFSET
+
+
+def test_plan_scene_zone(lync_client):
+    lync_client._zone_data[1].mute = False
+    lync_client._zone_data[1].source = 1
+
+    planned = lync_client._plan_scene_zone(
+        lync_client.get_zone(1),
+        ZoneDetail(1, source=3, volume=40, bass=2),
+    )
+
+    assert planned == [
+        (HtdLyncCommands.COMMON_COMMAND_CODE, 3 + HtdLyncConstants.SOURCE_COMMAND_OFFSET, None),
+        (HtdLyncCommands.VOLUME_SETTING_CONTROL_COMMAND_CODE, 236, None),
+        (HtdLyncCommands.COMMON_COMMAND_CODE, HtdLyncCommands.MUTE_OFF_COMMAND_CODE, None),
+        (HtdLyncCommands.COMMON_COMMAND_CODE, HtdLyncCommands.BASS_SETTING_CONTROL_COMMAND_CODE, bytearray([2])),
+    ]
+
+    # a zone to be off only gets powered off
+    assert lync_client._plan_scene_zone(lync_client.get_zone(1), ZoneDetail(1, power=False, source=3)) == [
+        (HtdLyncCommands.COMMON_COMMAND_CODE, HtdLyncCommands.POWER_OFF_ZONE_COMMAND_CODE, None),
+    ]
+
+    # nothing to do
+    assert lync_client._plan_scene_zone(lync_client.get_zone(1), ZoneDetail(1, power=True, volume=30)) == []
+
+
+@pytest.mark.asyncio
+async def test_apply_scene(lync_client):
+    sent = []
+    lync_client._send_cmd = AsyncMock(side_effect=lambda zone, command, data, extra=None, **kwargs: sent.append((zone, data)))
+    scene = {
+        1: ZoneDetail(1, source=2, volume=40),
+        2: ZoneDetail(2, power=False),
+        3: ZoneDetail(3, volume=30),
+    }
+
+    async def refresh(zone=None, priority=None):
+        # the gateway takes every command but zone 2's
+        lync_client._zone_data[1].source = 2
+        lync_client._zone_data[1].volume = 40
+
+        for zone in range(1, 7):
+            lync_client._loop.call_soon(lync_client._wake_zone_waiters, zone)
+
+    lync_client._loop = asyncio.get_running_loop()
+    lync_client._command_retry_timeout = 0.01
+    lync_client.refresh = AsyncMock(side_effect=refresh)
+
+    results = await lync_client.async_apply_scene(scene)
+
+    assert results[1].applied
+    assert not results[2].applied
+    assert results[2].mismatched == frozenset({"power"})
+    assert results[3].applied
+
+    # zone 3 was already there, and zone 2 was tried again
+    assert [zone for zone, _ in sent].count(3) == 0
+    assert sent.count((2, HtdLyncCommands.POWER_OFF_ZONE_COMMAND_CODE)) == HtdConstants.DEFAULT_RETRY_ATTEMPTS
+    assert lync_client.refresh.await_count == HtdConstants.DEFAULT_RETRY_ATTEMPTS
+
+
+@pytest.mark.asyncio
+async def test_apply_scene_to_a_zone_not_reported_yet(lync_client):
+    sent = []
+    lync_client._send_cmd = AsyncMock(side_effect=lambda zone, command, data, extra=None, **kwargs: sent.append(zone))
+    lync_client._loop = asyncio.get_running_loop()
+    lync_client._command_retry_timeout = 0.01
+    lync_client.refresh = AsyncMock()
+    del lync_client._zone_data[2]
+
+    results = await lync_client.async_apply_scene({
+        1: ZoneDetail(1, volume=30),
+        2: ZoneDetail(2, source=3, volume=40),
+        9: ZoneDetail(9, power=False),
+    })
+
+    # the zones it knows are applied, the others fail without being sent anything
+    assert results[1].applied
+    assert results[2].mismatched == frozenset({"source", "volume"})
+    assert results[9].mismatched == frozenset({"power"})
+    assert sent == []
+
+
+@pytest.mark.asyncio
+async def test_set_volume_goes_out_in_one_write(lync_client):
+    loop = lync_client._loop = asyncio.get_running_loop()
+    writes = []
+
+    def writelines(frames):
+        writes.append(frames)
+        lync_client._zone_data[1].volume = 40
+        loop.call_soon(lync_client._wake_zone_waiters, 1)
+
+    lync_client._connection.writelines.side_effect = writelines
+
+    await lync_client.async_set_volume(1, 40, timeout=1)
+
+    # the volume and the mute off that follows it are one command to the gateway
+    assert len(writes) == 1
+    assert [frame[3:5] for frame in writes[0]] == [
+        bytes([HtdLyncCommands.VOLUME_SETTING_CONTROL_COMMAND_CODE, htd_client.utils.convert_volume_to_raw(40)]),
+        bytes([HtdLyncCommands.COMMON_COMMAND_CODE, HtdLyncCommands.MUTE_OFF_COMMAND_CODE]),
+    ]
@@ -0,0 +1,166 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from htd_client import HtdGatewayManager
+from htd_client.manager import GatewayStats
+
+
+def new_client():
+    client = MagicMock()
+    client.power_off_all_zones = AsyncMock(return_value=None)
+    client.power_on_all_zones = AsyncMock(return_value=None)
+    return client
+
+
+@pytest.fixture
+def get_client():
+    with patch.object(HtdGatewayManager, "CONNECT_SPREAD", 0), \
+            patch("htd_client.async_get_client", new_callable=AsyncMock) as mock_get_client:
+        mock_get_client.side_effect = lambda **kwargs: new_client()
+        yield mock_get_client
+
+
+@pytest.mark.asyncio
+async def test_add_gateways(get_client):
+    manager = HtdGatewayManager(cache_path="models.json")
+
+    client = await manager.async_add("a", network_address=("1.2.3.4", 10006), groups=["building-b"])
+
+    assert manager["a"] is client
+    assert "a" in manager
+    assert list(manager) == ["a"]
+    client.set_jitter.assert_called_once_with(HtdGatewayManager.JITTER)
+    assert get_client.call_args.kwargs["cache_path"] == "models.json"
+
+    with pytest.raises(ValueError):
+        await manager.async_add("a", network_address=("1.2.3.4", 10006))
+
+
+@pytest.mark.asyncio
+async def test_connecting_is_limited(get_client):
+    connecting = 0
+    most_connecting = 0
+
+    async def get(**kwargs):
+        nonlocal connecting, most_connecting
+        connecting += 1
+        most_connecting = max(most_connecting, connecting)
+        await asyncio.sleep(0.01)
+        connecting -= 1
+        return new_client()
+
+    get_client.side_effect = get
+    manager = HtdGatewayManager(max_connecting=3)
+
+    await manager.async_add_many({
+        "gateway %d" % index: {"network_address": ("10.0.0.%d" % index, 10006)}
+        for index in range(10)
+    })
+
+    assert len(manager) == 10
+    assert most_connecting == 3
+
+
+@pytest.mark.asyncio
+async def test_concurrent_adds_of_a_name(get_client):
+    async def get(**kwargs):
+        await asyncio.sleep(0.01)
+        return new_client()
+
+    get_client.side_effect = get
+    manager = HtdGatewayManager()
+
+    first = asyncio.ensure_future(manager.async_add("a", network_address=("1.2.3.4", 10006)))
+    await asyncio.sleep(0)
+
+    # the name is taken while the first is still connecting
+    with pytest.raises(ValueError):
+        await manager.async_add("a", network_address=("1.2.3.4", 10006))
+
+    client = await first
+    assert manager["a"] is client
+    assert get_client.call_count == 1
+
+    # a name is free again after its gateway failed to connect
+    get_client.side_effect = ConnectionRefusedError()
+    with pytest.raises(ConnectionRefusedError):
+        await manager.async_add("b", network_address=("1.2.3.5", 10006))
+
+    get_client.side_effect = get
+    await manager.async_add("b", network_address=("1.2.3.5", 10006))
+    assert list(manager) == ["a", "b"]
+
+
+@pytest.mark.asyncio
+async def test_add_many_reports_failures(get_client):
+    failure = ConnectionRefusedError()
+    get_client.side_effect = [new_client(), failure]
+    manager = HtdGatewayManager()
+
+    results = await manager.async_add_many({
+        "a": {"network_address": ("1.2.3.4", 10006)},
+        "b": {"network_address": ("1.2.3.5", 10006)},
+    })
+
+    assert results["b"] is failure
+    assert list(manager) == ["a"]
+
+
+@pytest.mark.asyncio
+async def test_power_off_a_group(get_client):
+    manager = HtdGatewayManager()
+    a = await manager.async_add("a", network_address=("1.2.3.4", 10006), groups=["building-a"])
+    b = await manager.async_add("b", network_address=("1.2.3.5", 10006), groups=["building-b"])
+    c = await manager.async_add("c", network_address=("1.2.3.6", 10006), groups=["building-b"])
+    failure = ConnectionError()
+    c.power_off_all_zones.side_effect = failure
+
+    results = await manager.async_power_off("building-b")
+
+    assert results == {"b": None, "c": failure}
+    a.power_off_all_zones.assert_not_awaited()
+    b.power_off_all_zones.assert_awaited_once()
+
+    await manager.async_power_on()
+    assert all(client.power_on_all_zones.await_count == 1 for client in (a, b, c))
+
+    # a cancellation is reported like any other failure
+    with patch("htd_client.manager._LOGGER") as logger:
+        c.power_off_all_zones.side_effect = asyncio.CancelledError()
+        results = await manager.async_power_off("building-b")
+
+    assert isinstance(results["c"], asyncio.CancelledError)
+    logger.warning.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_remove_and_close(get_client):
+    manager = HtdGatewayManager()
+    a = await manager.async_add("a", network_address=("1.2.3.4", 10006))
+    b = await manager.async_add("b", network_address=("1.2.3.5", 10006))
+
+    manager.remove("a")
+    a.disconnect.assert_called_once()
+    assert list(manager) == ["b"]
+
+    manager.close()
+    b.disconnect.assert_called_once()
+    assert len(manager) == 0
+
+
+@pytest.mark.asyncio
+async def test_pacing_and_stats(get_client):
+    manager = HtdGatewayManager()
+    a = await manager.async_add("a", network_address=("1.2.3.4", 10006), groups=["slow"])
+    b = await manager.async_add("b", network_address=("1.2.3.5", 10006))
+
+    manager.set_pacing(rate=5, group="slow")
+
+    a.set_pacing.assert_called_once_with(None, 5, None)
+    b.set_pacing.assert_not_called()
+
+    stats = manager.stats
+    assert set(stats) == {"a", "b"}
+    assert stats["a"] == GatewayStats(a.connected, a.ready, a.rtt, a.scheduler_stats, a.write_stats)
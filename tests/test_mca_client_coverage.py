@@ -2,7 +2,7 @@ import pytest
 import asyncio
 from unittest.mock import MagicMock, AsyncMock, patch
 from htd_client.mca_client import HtdMcaClient
-from htd_client.constants import HtdConstants, HtdDeviceKind, HtdMcaCommands
+from htd_client.constants import HtdConstants, HtdDeviceKind, HtdMcaCommands, HtdMcaConstants
 from htd_client.models import ZoneDetail
 
 @pytest.fixture
@@ -19,7 +19,6 @@ def mca_client():
     }
     client = HtdMcaClient(loop, model_info)
     client._connection = MagicMock()
-    client._socket_lock = asyncio.Lock()
     # Mock _zone_data for all zones
     client._zone_data = {
         i: ZoneDetail(i, enabled=True, power=True, volume=30) 
@@ -27,77 +26,181 @@ def mca_client():
     }
     return client
 
-@pytest.mark.asyncio
-async def test_connect_subscribes(mca_client):
-    with patch("htd_client.base_client.create_serial_connection", new_callable=AsyncMock):
-        mca_client._serial_address = "/dev/ttyUSB0"
-        mca_client.async_subscribe = AsyncMock()
-        await mca_client.async_connect()
-        mca_client.async_subscribe.assert_called_with(mca_client._on_zone_update)
-        assert mca_client._subscribed
+def status(client, zone, **fields):
+    for name, value in fields.items():
+        setattr(client._zone_data[zone], name, value)
 
-def test_on_zone_update_no_target(mca_client):
-    # No target set
-    mca_client._target_volumes[1] = None
-    mca_client._async_set_volume = MagicMock()
-    
-    mca_client._on_zone_update(1)
-    
-    mca_client._async_set_volume.assert_not_called()
+    client._wake_zone_waiters(zone)
 
-def test_on_zone_update_reached_target(mca_client):
-    mca_client._target_volumes[1] = 30
-    mca_client._zone_data[1].volume = 30
-    
-    mca_client._on_zone_update(1)
-    
-    assert mca_client._target_volumes[1] is None
 
-def test_on_zone_update_needs_adjustment(mca_client):
-    mca_client._target_volumes[1] = 40
-    mca_client._zone_data[1].volume = 30
-    
-    # Needs to run async_set_volume. run_coroutine_threadsafe is used.
-    # We should mock asyncio.run_coroutine_threadsafe
-    with patch("asyncio.run_coroutine_threadsafe") as mock_run:
-        mca_client._on_zone_update(1)
-        mock_run.assert_called()
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+@pytest.mark.asyncio
+async def test_target_volumes_keyed_by_zone(mca_client):
+    assert set(mca_client._target_volumes) == set(range(1, 7))
+    assert not mca_client.has_volume_target(1)
+
 
 @pytest.mark.asyncio
 async def test_async_set_volume_start(mca_client):
-    # Set target, power is on
-    mca_client._async_set_volume = AsyncMock()
-    
+    mca_client._async_step_volume = AsyncMock()
+
     await mca_client.async_set_volume(1, 40)
-    
-    assert mca_client._target_volumes[1] == 40
-    mca_client._async_set_volume.assert_awaited_with(1)
+
+    mca_client._async_step_volume.assert_awaited_with(1)
+    assert not mca_client.has_volume_target(1)
+
 
 @pytest.mark.asyncio
 async def test_async_set_volume_power_off(mca_client):
     mca_client._zone_data[1].power = False
     mca_client.async_power_on = AsyncMock()
-    mca_client._async_set_volume = AsyncMock()
-    
+    mca_client._async_step_volume = AsyncMock()
+
     await mca_client.async_set_volume(1, 40)
-    
+
     mca_client.async_power_on.assert_awaited_with(1)
-    mca_client._async_set_volume.assert_awaited_with(1)
+    mca_client._async_step_volume.assert_awaited_with(1)
+
 
 @pytest.mark.asyncio
-async def test_internal_async_set_volume_up(mca_client):
-    mca_client._target_volumes[1] = 40
-    mca_client._zone_data[1].volume = 30
-    mca_client._async_send_and_validate = AsyncMock()
-    
-    await mca_client._async_set_volume(1)
-    
-    mca_client._async_send_and_validate.assert_called()
-    # Check command is VOL_UP
-    args = mca_client._async_send_and_validate.call_args[0]
-    # args: validate, zone, cmd, data
-    assert args[1] == 1
-    assert args[3] == HtdMcaCommands.VOLUME_UP_COMMAND
+async def test_volume_ramp_pipelines_steps(mca_client):
+    mca_client._rtt.sample(0.01)
+    sent = []
+    mca_client._send_cmd = AsyncMock(side_effect=lambda zone, command, data, **kwargs: sent.append(data))
+
+    ramp = asyncio.create_task(mca_client.async_set_volume(1, 36))
+    await settle()
+
+    # a full window goes out before anything is confirmed
+    assert sent == [HtdMcaCommands.VOLUME_UP_COMMAND] * HtdMcaConstants.VOLUME_RAMP_WINDOW
+    assert mca_client.has_volume_target(1)
+
+    # each confirmation opens the window for another step
+    volume = 30
+    while not ramp.done():
+        volume += 1
+        status(mca_client, 1, volume=volume)
+        await settle()
+
+    await ramp
+    assert volume == 36
+    assert sent == [HtdMcaCommands.VOLUME_UP_COMMAND] * 6
+    assert not mca_client.has_volume_target(1)
+
+
+@pytest.mark.asyncio
+async def test_volume_ramp_corrects_overshoot(mca_client):
+    mca_client._rtt.sample(0.01)
+    sent = []
+    mca_client._send_cmd = AsyncMock(side_effect=lambda zone, command, data, **kwargs: sent.append(data))
+
+    ramp = asyncio.create_task(mca_client.async_set_volume(1, 28))
+    await settle()
+
+    assert sent == [HtdMcaCommands.VOLUME_DOWN_COMMAND] * 2
+
+    # the steps land further than expected
+    status(mca_client, 1, volume=26)
+    await settle()
+
+    assert sent[2:] == [HtdMcaCommands.VOLUME_UP_COMMAND] * 2
+
+    status(mca_client, 1, volume=28)
+    await ramp
+
+
+@pytest.mark.asyncio
+async def test_volume_ramp_measures_the_round_trip(mca_client):
+    sent = []
+    mca_client._send_cmd = AsyncMock(side_effect=lambda zone, command, data, **kwargs: sent.append(kwargs["gap"]))
+
+    ramp = asyncio.create_task(mca_client.async_set_volume(1, 34))
+    await settle()
+
+    # a single step goes out until its confirmation measures the round trip
+    assert sent == [None]
+    await asyncio.sleep(0.02)
+    status(mca_client, 1, volume=31)
+    await settle()
+
+    srtt = mca_client._rtt.srtt
+    assert srtt >= 0.02
+
+    # then a window of steps, paced a round trip apart by the ramp
+    assert sent[1:] == [srtt] * 3
+
+    for volume in (32, 33, 34):
+        status(mca_client, 1, volume=volume)
+        await settle()
+
+    await ramp
+
+
+@pytest.mark.asyncio
+async def test_volume_ramp_keeps_up_with_the_round_trip():
+    loop = asyncio.get_running_loop()
+    model_info = HtdConstants.SUPPORTED_MODELS["mca66"]
+
+    for rtt in (0.01, 0.04, 0.08):
+        client = HtdMcaClient(loop, model_info)
+        client._connection = transport = MagicMock()
+        client._zone_data = {i: ZoneDetail(i, enabled=True, power=True, volume=10) for i in range(1, 7)}
+        client._zone_data[1].volume = 10
+
+        # the gateway confirms each step a round trip after it's written
+        def writelines(frames):
+            for frame in frames:
+                step = 1 if frame[4] == HtdMcaCommands.VOLUME_UP_COMMAND else -1
+                loop.call_later(rtt, lambda step=step: status(client, 1, volume=client._zone_data[1].volume + step))
+
+        transport.writelines.side_effect = writelines
+
+        started = loop.time()
+        await client.async_set_volume(1, 40)
+        elapsed = loop.time() - started
+
+        # as fast as a step a round trip, with the default pacing
+        assert client._zone_data[1].volume == 40
+        assert elapsed <= 30 * rtt * 1.1 + 0.1, (rtt, elapsed)
+
+
+@pytest.mark.asyncio
+async def test_volume_ramp_follows_new_target(mca_client):
+    sent = []
+    mca_client._send_cmd = AsyncMock(side_effect=lambda zone, command, data, **kwargs: sent.append(data))
+
+    first = asyncio.create_task(mca_client.async_set_volume(1, 31))
+    await settle()
+    second = asyncio.create_task(mca_client.async_set_volume(1, 32))
+    await settle()
+
+    assert len(mca_client._volume_ramps) == 1
+
+    status(mca_client, 1, volume=31)
+    await settle()
+    status(mca_client, 1, volume=32)
+
+    await asyncio.gather(first, second)
+    assert sent == [HtdMcaCommands.VOLUME_UP_COMMAND] * 2
+
+
+@pytest.mark.asyncio
+async def test_volume_ramp_gives_up(mca_client):
+    mca_client._send_cmd = AsyncMock()
+    mca_client.refresh = AsyncMock()
+    mca_client._command_retry_timeout = 0
+    mca_client._retry_attempts = 2
+
+    with pytest.raises(Exception, match="Failed to execute command"):
+        await mca_client.async_set_volume(1, 40)
+
+    assert mca_client.refresh.await_count == 2
+    assert not mca_client.has_volume_target(1)
+
 
 @pytest.mark.asyncio
 async def test_simple_commands(mca_client):
@@ -208,20 +311,47 @@ async def test_volume_limits_mca(mca_client):
      mca_client._async_send_and_validate.assert_not_called()
 
 
-def test_on_zone_update(mca_client):
-    mca_client._target_volumes = {1: 50, 2: None}
-    mca_client._zone_data[1].volume = 40
-    mca_client._loop = MagicMock()
-    
-    # Case 1: Volume mismatch, target exists
-    mca_client._on_zone_update(1)
-    mca_client._loop.call_soon_threadsafe.assert_called() 
-    
-    # Case 2: Volume match
-    mca_client._zone_data[1].volume = 50
-    mca_client._on_zone_update(1)
-    assert mca_client._target_volumes[1] is None
-    
-    # Case 3: No target
-    mca_client._on_zone_update(2)
-    # nothing happens
+def test_plan_scene_zone(mca_client):
+    mca_client._zone_data[1].mute = True
+    mca_client._zone_data[1].bass = 0
+
+    planned = mca_client._plan_scene_zone(mca_client.get_zone(1), ZoneDetail(1, volume=27, mute=False, bass=1))
+
+    assert planned == [
+        (HtdMcaCommands.COMMON_COMMAND_CODE, HtdMcaCommands.VOLUME_DOWN_COMMAND, None),
+    ] * 3 + [
+        (HtdMcaCommands.COMMON_COMMAND_CODE, HtdMcaCommands.TOGGLE_MUTE_COMMAND, None),
+        (HtdMcaCommands.COMMON_COMMAND_CODE, HtdMcaCommands.BASS_UP_COMMAND, None),
+    ]
+
+    assert mca_client._plan_scene_zone(mca_client.get_zone(1), ZoneDetail(1, power=False, volume=10)) == [
+        (HtdMcaCommands.COMMON_COMMAND_CODE, HtdMcaCommands.POWER_OFF_ZONE_COMMAND_CODE, None),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_quick_steps_add_up(mca_client):
+    mca_client._loop = asyncio.get_running_loop()
+    sent = []
+    mca_client._send_cmd = AsyncMock(side_effect=lambda zone, command, data, *args, **kwargs: sent.append(data))
+
+    # the second press comes before the first is confirmed
+    presses = asyncio.gather(mca_client.async_volume_up(1), mca_client.async_volume_up(1))
+    await settle()
+    status(mca_client, 1, volume=31)
+    await settle()
+    status(mca_client, 1, volume=32)
+    await presses
+
+    assert sent == [HtdMcaCommands.VOLUME_UP_COMMAND] * 2
+    assert mca_client._step_targets[1] == {}
+
+
+    # a queued step counts toward the limit
+    mca_client._zone_data[1].balance = HtdConstants.MAX_BALANCE - 1
+    presses = asyncio.gather(mca_client.async_balance_right(1), mca_client.async_balance_right(1))
+    await settle()
+    status(mca_client, 1, balance=HtdConstants.MAX_BALANCE)
+    await presses
+
+    assert sent[2:] == [HtdMcaCommands.BALANCE_RIGHT_COMMAND]
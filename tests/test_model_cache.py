@@ -0,0 +1,185 @@
+import asyncio
+import json
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from htd_client.constants import HtdConstants
+from htd_client.model_cache import CachedGateway, ModelCache, async_maintain_cache
+from htd_client.models import ZoneDetail
+
+
+@pytest.fixture
+def cache_path(tmp_path):
+    return tmp_path / "models.json"
+
+
+def test_key():
+    assert ModelCache.key(network_address=("1.2.3.4", 10006)) == "tcp:1.2.3.4:10006"
+    assert ModelCache.key(serial_address="/dev/ttyUSB0") == "serial:/dev/ttyUSB0"
+
+    with pytest.raises(ValueError):
+        ModelCache.key()
+
+
+def test_missing_file_is_empty(cache_path):
+    assert ModelCache(cache_path).get("tcp:1.2.3.4:10006") is None
+
+
+def test_save_and_get(cache_path):
+    zones = {
+        1: ZoneDetail(1, enabled=True, name="kitchen"),
+        2: ZoneDetail(2, enabled=False),
+    }
+
+    ModelCache(cache_path).save("tcp:1.2.3.4:10006", HtdConstants.SUPPORTED_MODELS["lync12"], zones)
+
+    assert ModelCache(cache_path).get("tcp:1.2.3.4:10006") == CachedGateway(
+        HtdConstants.SUPPORTED_MODELS["lync12"],
+        {1: True, 2: False},
+        {1: "kitchen"},
+    )
+
+
+def test_save_keeps_other_gateways(cache_path):
+    first = ModelCache(cache_path)
+    second = ModelCache(cache_path)
+
+    first.save("tcp:1.2.3.4:10006", HtdConstants.SUPPORTED_MODELS["mca66"])
+    second.save("tcp:1.2.3.5:10006", HtdConstants.SUPPORTED_MODELS["lync6"])
+
+    cache = ModelCache(cache_path)
+    assert cache.get("tcp:1.2.3.4:10006").model == HtdConstants.SUPPORTED_MODELS["mca66"]
+    assert cache.get("tcp:1.2.3.5:10006").model == HtdConstants.SUPPORTED_MODELS["lync6"]
+    assert [path.name for path in cache_path.parent.iterdir()] == [cache_path.name]
+
+
+@pytest.mark.parametrize("content", [
+    "not json",
+    json.dumps({"version": 0, "gateways": {"tcp:1.2.3.4:10006": {"model": "MCA66"}}}),
+    json.dumps({"version": 1, "gateways": {"tcp:1.2.3.4:10006": {"model": "Unknown"}}}),
+])
+def test_unusable_entries_are_ignored(cache_path, content):
+    cache_path.write_text(content)
+
+    assert ModelCache(cache_path).get("tcp:1.2.3.4:10006") is None
+
+
+def client_of(model_info):
+    client = MagicMock()
+    client.model = model_info
+    client.get_zone_count.return_value = model_info["zones"]
+    client.async_subscribe_changes = AsyncMock()
+    return client
+
+
+@pytest.mark.asyncio
+async def test_maintain_saves_a_new_gateway(cache_path):
+    cache = ModelCache(cache_path)
+    model = HtdConstants.SUPPORTED_MODELS["lync6"]
+    client = client_of(model)
+    zones = {1: ZoneDetail(1, enabled=True, name="den")}
+    client.has_zone_data.side_effect = lambda zone: zone in zones
+    client.get_zone.side_effect = zones.__getitem__
+
+    await async_maintain_cache(cache, "tcp:1.2.3.4:10006", client, MagicMock(), None)
+
+    assert cache.get("tcp:1.2.3.4:10006").model == model
+
+    # the zones are saved once the gateway reports them
+    on_changes = client.async_subscribe_changes.call_args[0][0]
+    on_changes({1: frozenset({"volume"})})
+    await asyncio.sleep(0.05)
+    assert cache.get("tcp:1.2.3.4:10006").zone_names == {}
+
+    # changes arriving while a save is under way are saved after it
+    on_changes({1: frozenset({"enabled", "name"})})
+    zones[1] = ZoneDetail(1, enabled=True, name="study")
+    on_changes({1: frozenset({"name"})})
+    await asyncio.sleep(0.05)
+    assert cache.get("tcp:1.2.3.4:10006").zone_names == {1: "study"}
+
+
+@pytest.mark.asyncio
+async def test_maintain_keeps_zones_not_reported_yet(cache_path):
+    cache = await ModelCache.async_open(cache_path)
+    model = HtdConstants.SUPPORTED_MODELS["lync6"]
+    await cache.async_save("tcp:1.2.3.4:10006", model, {
+        1: ZoneDetail(1, enabled=True, name="den"),
+        2: ZoneDetail(2, enabled=False, name="patio"),
+    })
+    cached = cache.get("tcp:1.2.3.4:10006")
+
+    client = client_of(model)
+    zones = {1: ZoneDetail(1, enabled=True, name="study")}
+    client.has_zone_data.side_effect = lambda zone: zone in zones
+    client.get_zone.side_effect = zones.__getitem__
+    probe = MagicMock()
+    probe.async_detect = AsyncMock(return_value=model)
+
+    await async_maintain_cache(cache, "tcp:1.2.3.4:10006", client, probe, cached)
+    client.async_subscribe_changes.call_args[0][0]({1: frozenset({"name"})})
+    await asyncio.sleep(0.05)
+
+    saved = ModelCache(cache_path).get("tcp:1.2.3.4:10006")
+    assert saved.zone_names == {1: "study", 2: "patio"}
+    assert saved.zones_enabled == {1: True, 2: False}
+
+
+@pytest.mark.asyncio
+async def test_maintain_replaces_a_wrong_model(cache_path):
+    cache = ModelCache(cache_path)
+    cached_model = HtdConstants.SUPPORTED_MODELS["lync6"]
+    cache.save("tcp:1.2.3.4:10006", cached_model)
+    cached = cache.get("tcp:1.2.3.4:10006")
+
+    client = client_of(cached_model)
+    probe = MagicMock()
+    probe.async_detect = AsyncMock(return_value=HtdConstants.SUPPORTED_MODELS["lync12"])
+
+    await async_maintain_cache(cache, "tcp:1.2.3.4:10006", client, probe, cached)
+
+    assert cache.get("tcp:1.2.3.4:10006").model == HtdConstants.SUPPORTED_MODELS["lync12"]
+    client.async_subscribe_changes.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_maintain_survives_a_lost_connection(cache_path):
+    from htd_client.exceptions import HtdDisconnectedError
+
+    cache = ModelCache(cache_path)
+    model = HtdConstants.SUPPORTED_MODELS["lync6"]
+    cache.save("tcp:1.2.3.4:10006", model)
+
+    client = client_of(model)
+    probe = MagicMock()
+    probe.async_detect = AsyncMock(side_effect=HtdDisconnectedError("gone"))
+
+    await async_maintain_cache(cache, "tcp:1.2.3.4:10006", client, probe, cache.get("tcp:1.2.3.4:10006"))
+
+    assert cache.get("tcp:1.2.3.4:10006").model == model
+    client.async_subscribe_changes.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_maintain_survives_an_unwritable_cache(tmp_path):
+    # the cache is meant to go in a directory, but a file is in the way
+    (tmp_path / "cache").write_text("")
+    cache = ModelCache(tmp_path / "cache" / "models.json")
+    model = HtdConstants.SUPPORTED_MODELS["lync6"]
+    client = client_of(model)
+    client.has_zone_data.return_value = False
+
+    await async_maintain_cache(cache, "tcp:1.2.3.4:10006", client, MagicMock(), None)
+
+    # zone changes are still followed, for when the cache can be written again
+    client.async_subscribe_changes.assert_awaited_once()
+    client.async_subscribe_changes.call_args[0][0]({1: frozenset({"name"})})
+    await asyncio.sleep(0.05)
+
+    # and a wrong model is still reported
+    probe = MagicMock()
+    probe.async_detect = AsyncMock(return_value=HtdConstants.SUPPORTED_MODELS["lync12"])
+    cached = CachedGateway(model, {}, {})
+
+    await async_maintain_cache(cache, "tcp:1.2.3.4:10006", client_of(model), probe, cached)
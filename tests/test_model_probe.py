@@ -0,0 +1,128 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from htd_client.constants import HtdCommonCommands, HtdConstants
+from htd_client.exceptions import HtdDisconnectedError
+from htd_client.model_probe import ModelProbe, async_probe_model
+from htd_client.utils import build_command
+
+
+def connect():
+    probe = ModelProbe(asyncio.get_running_loop())
+    transport = MagicMock()
+    probe.connection_made(transport)
+    return probe, transport
+
+
+@pytest.mark.asyncio
+async def test_queries_the_model_when_connected():
+    _, transport = connect()
+
+    transport.write.assert_called_once_with(build_command(1, HtdCommonCommands.MODEL_QUERY_COMMAND_CODE, 0))
+
+
+@pytest.mark.asyncio
+async def test_detects_the_model_as_soon_as_it_arrives():
+    probe, _ = connect()
+
+    probe.data_received(b"Wangine_")
+    assert probe.model is None
+
+    probe.data_received(b"MCA66")
+
+    assert await probe.async_detect(timeout=0) == HtdConstants.SUPPORTED_MODELS["mca66"]
+    assert probe.model == HtdConstants.SUPPORTED_MODELS["mca66"]
+
+
+@pytest.mark.asyncio
+async def test_unknown_model():
+    probe, _ = connect()
+
+    probe.data_received(b"Something else" + bytes(HtdConstants.MESSAGE_HEADER))
+
+    assert await probe.async_detect(timeout=0) is None
+
+
+@pytest.mark.asyncio
+async def test_no_reply():
+    probe, _ = connect()
+
+    assert await probe.async_detect(timeout=0.01) is None
+
+
+@pytest.mark.asyncio
+async def test_connection_lost_while_detecting():
+    probe, _ = connect()
+
+    probe.connection_lost(None)
+
+    with pytest.raises(HtdDisconnectedError):
+        await probe.async_detect(timeout=1)
+
+
+@pytest.mark.asyncio
+async def test_attach_hands_the_connection_over():
+    probe, transport = connect()
+    frame = b"\x02\x00\x01\x05"
+
+    probe.data_received(b"Lync12" + frame)
+    await probe.async_detect()
+
+    client = MagicMock()
+    probe.attach(client)
+
+    client.connection_made.assert_called_once_with(transport)
+    client.data_received.assert_called_once_with(frame)
+
+    probe.data_received(b"more")
+    client.data_received.assert_called_with(b"more")
+
+    probe.connection_lost(None)
+    client.connection_lost.assert_called_once_with(None)
+
+
+@pytest.mark.asyncio
+async def test_attach_after_connection_lost():
+    probe, _ = connect()
+    probe.data_received(b"Lync12")
+    probe.connection_lost(None)
+
+    with pytest.raises(HtdDisconnectedError):
+        probe.attach(MagicMock())
+
+
+@pytest.mark.asyncio
+async def test_probe_model_opens_one_connection():
+    loop = asyncio.get_running_loop()
+    transport = MagicMock()
+
+    async def create_connection(factory, host, port):
+        probe = factory()
+        probe.connection_made(transport)
+        loop.call_soon(probe.data_received, b"Lync 6")
+        return transport, probe
+
+    mock_loop = MagicMock()
+    mock_loop.create_connection = AsyncMock(side_effect=create_connection)
+    mock_loop.create_future = loop.create_future
+
+    probe = await async_probe_model(mock_loop, network_address=("1.2.3.4", 10006))
+
+    assert probe.model == HtdConstants.SUPPORTED_MODELS["lync6"]
+    mock_loop.create_connection.assert_awaited_once()
+    transport.close.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_detects_after_an_early_attach():
+    probe, transport = connect()
+    client = MagicMock()
+
+    probe.attach(client)
+    probe.data_received(b"Lync")
+    probe.data_received(b"12")
+
+    client.data_received.assert_called_with(b"12")
+    assert await probe.async_detect(timeout=0) == HtdConstants.SUPPORTED_MODELS["lync12"]
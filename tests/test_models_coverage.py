@@ -7,3 +7,30 @@ def test_zone_detail_str():
     assert "zone_number = 1" in s
     assert "name = Kitchen" in s
     assert "volume = 30" in s
+
+def test_zone_detail_has_no_dict():
+    zone = ZoneDetail(1)
+    assert not hasattr(zone, "__dict__")
+
+def test_zone_view_is_live_and_read_only():
+    import pytest
+    from htd_client.models import ZoneView
+
+    zone = ZoneDetail(2, volume=30, source=1)
+    view = ZoneView(zone)
+
+    assert view.number == 2
+    assert view.volume == 30
+    assert view == zone
+    assert str(view) == str(zone)
+
+    zone.volume = 31
+    assert view.volume == 31
+
+    snapshot = view.snapshot()
+    zone.volume = 32
+    assert snapshot.volume == 31
+    assert snapshot is not zone
+
+    with pytest.raises(AttributeError):
+        view.volume = 10
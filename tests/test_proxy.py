@@ -0,0 +1,176 @@
+import asyncio
+from unittest.mock import MagicMock, patch
+
+import pytest
+import pytest_asyncio
+
+from htd_client.constants import HtdCommonCommands, HtdConstants, HtdDeviceKind, HtdLyncCommands, HtdMcaCommands
+from htd_client.mca_client import HtdMcaClient
+from htd_client.proxy import HtdProxy, ProxyConnection, main, split_commands
+from htd_client.utils import build_command, calculate_checksum
+
+
+def zone_status(zone, volume):
+    frame = bytes([HtdConstants.HEADER_BYTE, HtdConstants.RESERVED_BYTE, zone, HtdCommonCommands.ZONE_STATUS_RECEIVE_COMMAND])
+    frame += bytes([0x80, 0, 0, 0, 0, volume, 0, 0, 0])
+    return frame + bytes([calculate_checksum(frame)])
+
+
+@pytest_asyncio.fixture
+async def gateway():
+    loop = asyncio.get_running_loop()
+    client = HtdMcaClient(loop, HtdConstants.SUPPORTED_MODELS["mca66"])
+    transport = MagicMock()
+    transport.get_extra_info.return_value = None
+
+    # the connection the model was detected on is taken over
+    probe = MagicMock()
+    probe.attach.side_effect = lambda protocol: protocol.connection_made(transport)
+    client.set_watchdog(False)
+
+    with patch.object(HtdMcaClient, "_heartbeat", new=MagicMock(return_value=asyncio.sleep(0))):
+        await client.async_connect(probe)
+
+    yield client, transport
+
+    client._heartbeat_task.cancel()
+
+
+@pytest_asyncio.fixture
+async def proxy(gateway):
+    client, _ = gateway
+    proxy = HtdProxy(client)
+    server = await proxy.async_serve("127.0.0.1", 0)
+
+    yield proxy, server.sockets[0].getsockname()[1]
+
+    proxy.close()
+
+
+async def wait_for(condition):
+    for _ in range(100):
+        if condition():
+            return
+
+        await asyncio.sleep(0.01)
+
+    raise AssertionError("timed out")
+
+
+def test_split_commands():
+    power_on = bytes(build_command(1, HtdMcaCommands.COMMON_COMMAND_CODE, HtdMcaCommands.POWER_ON_ZONE_COMMAND_CODE))
+    named = bytes(build_command(0, HtdMcaCommands.SET_SOURCE_NAME_COMMAND_CODE, 2, bytearray(b"kitchen\x00")))
+
+    assert split_commands(power_on + named, HtdDeviceKind.mca) == ([power_on, named], len(power_on + named))
+
+    # noise is skipped, and a command that's cut off waits for the rest
+    data = b"\x55" + power_on + named[:9]
+    assert split_commands(data, HtdDeviceKind.mca) == ([power_on], 1 + len(power_on))
+
+    assert split_commands(b"\x55\x55" + power_on[:1], HtdDeviceKind.mca) == ([], 2)
+
+    # a command that doesn't add up is dropped
+    broken = power_on[:-1] + bytes([power_on[-1] ^ 0xff])
+    assert split_commands(broken + power_on, HtdDeviceKind.mca) == ([power_on], len(broken + power_on))
+
+
+def test_split_commands_with_a_name():
+    prefix = [HtdConstants.HEADER_BYTE, HtdConstants.RESERVED_BYTE, 3, HtdLyncCommands.SET_ZONE_NAME_COMMAND_CODE, 0]
+
+    # a byte of the name is the checksum of everything before it
+    name = bytearray(b"den") + bytearray([calculate_checksum(prefix + list(b"den"))]) + bytearray(7)
+    named = bytes(build_command(3, HtdLyncCommands.SET_ZONE_NAME_COMMAND_CODE, 0, name))
+    bass = bytes(build_command(
+        3, HtdLyncCommands.COMMON_COMMAND_CODE, HtdLyncCommands.BASS_SETTING_CONTROL_COMMAND_CODE, bytearray([2]),
+    ))
+
+    assert split_commands(named + bass, HtdDeviceKind.lync) == ([named, bass], len(named + bass))
+
+
+@pytest.mark.asyncio
+async def test_proxy_shares_the_gateway(gateway, proxy):
+    client, transport = gateway
+    proxy, port = proxy
+
+    first = await asyncio.open_connection("127.0.0.1", port)
+    second = await asyncio.open_connection("127.0.0.1", port)
+    await wait_for(lambda: proxy.connections == 2)
+
+    # both see what the gateway reports
+    client.data_received(zone_status(1, 0xE2) + zone_status(2, 0xE4))
+
+    for reader, _ in (first, second):
+        received = await reader.readexactly(2 * 14)
+        assert received == zone_status(1, 0xE2) + zone_status(2, 0xE4)
+
+    assert client.get_zone(2).volume == 32
+
+    # commands of both go out one write at a time, the same query just once
+    power_on = bytes(build_command(1, HtdMcaCommands.COMMON_COMMAND_CODE, HtdMcaCommands.POWER_ON_ZONE_COMMAND_CODE))
+    query = bytes(build_command(0, HtdMcaCommands.QUERY_COMMAND_CODE, 0))
+
+    client.set_pacing(min_gap=0.05, rate=10, burst=1)
+    first[1].write(power_on + query)
+    second[1].write(query)
+
+    def written():
+        return [frame for call in transport.writelines.call_args_list for frame in call.args[0]]
+
+    await wait_for(lambda: len(written()) == 2)
+    await asyncio.sleep(0.1)
+
+    assert written() == [power_on, query]
+    assert transport.writelines.call_count == 2
+
+    for _, writer in (first, second):
+        writer.close()
+
+    await wait_for(lambda: proxy.connections == 0)
+
+
+@pytest.mark.asyncio
+async def test_proxy_answers_the_model_query(proxy):
+    proxy, port = proxy
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+
+    writer.write(bytes(build_command(1, HtdCommonCommands.MODEL_QUERY_COMMAND_CODE, 0)))
+
+    assert await reader.readexactly(len(b"Wangine_MCA66")) == b"Wangine_MCA66"
+    proxy.client._connection.writelines.assert_not_called()
+
+    writer.close()
+
+
+@pytest.mark.asyncio
+async def test_commands_of_a_client_that_left_are_withdrawn(gateway):
+    client, transport = gateway
+    client.set_pacing(min_gap=10, rate=0.1, burst=1)
+    proxy = HtdProxy(client)
+
+    connection = ProxyConnection(proxy)
+    connection.connection_made(MagicMock())
+    connection.data_received(
+        bytes(build_command(1, HtdMcaCommands.COMMON_COMMAND_CODE, HtdMcaCommands.POWER_ON_ZONE_COMMAND_CODE))
+        + bytes(build_command(2, HtdMcaCommands.COMMON_COMMAND_CODE, HtdMcaCommands.POWER_ON_ZONE_COMMAND_CODE))
+    )
+    await asyncio.sleep(0.01)
+
+    # the first went out, the second is still waiting when the client leaves
+    assert client.scheduler_stats.queue_depth == 1
+    connection.connection_lost(None)
+
+    assert client.scheduler_stats.queue_depth == 0
+    assert proxy.connections == 0
+    proxy.close()
+
+
+def test_main_requires_a_gateway():
+    with pytest.raises(SystemExit):
+        main([])
+
+    with patch("htd_client.proxy.async_run_proxy", new=MagicMock(return_value=None)) as run, \
+            patch("asyncio.run") as asyncio_run:
+        main(["--host", "192.168.1.2", "--port", "10007"])
+
+    run.assert_called_once_with(network_address=("192.168.1.2", 10006), serial_address=None, host=None, port=10007)
+    asyncio_run.assert_called_once()
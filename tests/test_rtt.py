@@ -0,0 +1,55 @@
+import pytest
+
+from htd_client.rtt import RttEstimator
+
+
+def test_unmeasured():
+    rtt = RttEstimator(0.05, 5)
+
+    assert rtt.srtt is None
+    assert rtt.rto is None
+    assert rtt.timeout(1, 0.5) == 0.5
+    assert rtt.timeout(3, 0.5) == 2
+
+
+def test_first_sample():
+    rtt = RttEstimator(0.05, 5)
+    rtt.sample(0.1)
+
+    assert rtt.srtt == pytest.approx(0.1)
+    assert rtt.rttvar == pytest.approx(0.05)
+    assert rtt.rto == pytest.approx(0.3)
+    assert rtt.samples == 1
+
+
+def test_converges_and_tightens():
+    rtt = RttEstimator(0.05, 5)
+
+    for _ in range(50):
+        rtt.sample(0.02)
+
+    assert rtt.srtt == pytest.approx(0.02)
+    assert rtt.rttvar < 0.001
+    # a fast gateway is held to the minimum
+    assert rtt.rto == 0.05
+    assert rtt.timeout(2, 0.5) == pytest.approx(0.1)
+
+
+def test_variance_raises_the_timeout():
+    steady = RttEstimator(0.05, 5)
+    jittery = RttEstimator(0.05, 5)
+
+    for index in range(20):
+        steady.sample(0.2)
+        jittery.sample(0.1 if index % 2 else 0.3)
+
+    assert jittery.srtt == pytest.approx(steady.srtt, abs=0.02)
+    assert jittery.rto > steady.rto
+
+
+def test_timeout_is_capped():
+    rtt = RttEstimator(0.05, 5)
+    rtt.sample(2)
+
+    assert rtt.rto == 5
+    assert rtt.timeout(4, 0.5) == 5
@@ -0,0 +1,253 @@
+import asyncio
+
+import pytest
+
+from htd_client.constants import HtdConstants, HtdDeviceKind, HtdPriority
+from htd_client.scheduler import OutboundScheduler
+
+
+def frames(count):
+    return [bytes([index]) for index in range(count)]
+
+
+@pytest.mark.asyncio
+async def test_frames_released_together_share_a_write():
+    writes = []
+    scheduler = OutboundScheduler(writes.append, min_gap=0, rate=1000, burst=10)
+
+    for frame in frames(3):
+        scheduler.submit(frame)
+
+    assert writes == []
+    assert len(scheduler) == 3
+
+    await asyncio.sleep(0)
+
+    assert writes == [frames(3)]
+    assert len(scheduler) == 0
+
+
+@pytest.mark.asyncio
+async def test_burst_caps_frames_per_write():
+    loop = asyncio.get_running_loop()
+    writes = []
+    written_at = []
+
+    def write(batch):
+        writes.append(batch)
+        written_at.append(loop.time())
+
+    scheduler = OutboundScheduler(write, min_gap=0.02, rate=100, burst=2)
+
+    for frame in frames(5):
+        scheduler.submit(frame)
+
+    while len(scheduler):
+        await asyncio.sleep(0.01)
+
+    # order is kept across writes
+    assert [frame for batch in writes for frame in batch] == frames(5)
+    assert all(len(batch) <= 2 for batch in writes)
+    assert all(later - earlier >= 0.015 for earlier, later in zip(written_at, written_at[1:]))
+
+    stats = scheduler.stats
+    assert stats.frames == 5
+    assert stats.writes == len(writes)
+    assert stats.max_queue_depth == 5
+    assert stats.queue_depth == 0
+    assert stats.max_wait > 0
+    assert 0 < stats.mean_wait <= stats.max_wait
+
+
+@pytest.mark.asyncio
+async def test_min_gap_keeps_every_frame_apart():
+    loop = asyncio.get_running_loop()
+    writes = []
+    written_at = []
+
+    def write(batch):
+        writes.append(batch)
+        written_at.append(loop.time())
+
+    scheduler = OutboundScheduler(write, min_gap=0.02, rate=1000, burst=10)
+
+    for frame in frames(3):
+        scheduler.submit(frame)
+
+    while len(scheduler):
+        await asyncio.sleep(0.01)
+
+    # tokens to spare don't let frames reach the gateway back to back
+    assert writes == [[frame] for frame in frames(3)]
+    assert all(later - earlier >= 0.015 for earlier, later in zip(written_at, written_at[1:]))
+    assert scheduler.drain_time() == 0
+
+
+@pytest.mark.asyncio
+async def test_drain_time_counts_the_gap():
+    scheduler = OutboundScheduler(lambda batch: None, min_gap=0.05, rate=1000, burst=10)
+
+    for frame in frames(3):
+        scheduler.submit(frame)
+
+    assert scheduler.drain_time() == pytest.approx(0.1, abs=0.01)
+
+
+@pytest.mark.asyncio
+async def test_drain_time():
+    scheduler = OutboundScheduler(lambda batch: None, min_gap=0, rate=10, burst=2)
+
+    assert scheduler.drain_time() == 0
+
+    for frame in frames(4):
+        scheduler.submit(frame)
+
+    # 2 frames go with the tokens in the bucket, the other 2 take 0.1s each
+    assert scheduler.drain_time() == pytest.approx(0.2, abs=0.01)
+
+
+@pytest.mark.asyncio
+async def test_clear_drops_pending_frames():
+    writes = []
+    scheduler = OutboundScheduler(writes.append, min_gap=0, rate=1000, burst=10)
+
+    scheduler.submit(b"\x01")
+    scheduler.clear()
+    await asyncio.sleep(0)
+
+    assert writes == []
+    assert len(scheduler) == 0
+
+
+@pytest.mark.asyncio
+async def test_withdraw_drops_only_the_owners_frames():
+    writes = []
+    scheduler = OutboundScheduler(writes.append, min_gap=0, rate=1000, burst=10)
+    owner = object()
+
+    scheduler.submit(b"\x01", owner=owner)
+    scheduler.submit(b"\x02")
+    scheduler.submit(b"\x03", HtdPriority.VALIDATION, owner=owner)
+
+    assert scheduler.withdraw(owner) == 2
+    assert scheduler.withdraw(owner) == 0
+
+    await asyncio.sleep(0)
+
+    assert writes == [[b"\x02"]]
+
+
+@pytest.mark.parametrize("min_gap, rate, burst", [(-1, 10, 1), (0, 0, 1), (0, 10, 0)])
+def test_invalid_pacing(min_gap, rate, burst):
+    with pytest.raises(ValueError):
+        OutboundScheduler(lambda batch: None, min_gap, rate, burst)
+
+
+def test_default_pacing_per_kind():
+    for kind in HtdDeviceKind:
+        pacing = HtdConstants.DEFAULT_PACING[kind]
+        OutboundScheduler(lambda batch: None, **pacing)
+
+
+@pytest.mark.asyncio
+async def test_higher_priority_goes_first():
+    writes = []
+    scheduler = OutboundScheduler(writes.append, min_gap=0, rate=1000, burst=10)
+
+    scheduler.submit(b"\x03", HtdPriority.BACKGROUND)
+    scheduler.submit(b"\x02", HtdPriority.VALIDATION)
+    scheduler.submit(b"\x01")
+
+    await asyncio.sleep(0)
+
+    # background work waits for the user commands to be out
+    assert writes == [[b"\x01", b"\x02"]]
+
+    await asyncio.sleep(0)
+
+    assert writes == [[b"\x01", b"\x02"], [b"\x03"]]
+
+
+@pytest.mark.asyncio
+async def test_repeated_background_frames_are_dropped():
+    writes = []
+    scheduler = OutboundScheduler(writes.append, min_gap=0, rate=1000, burst=10)
+
+    scheduler.submit(b"\x01")
+    scheduler.submit(b"\x01")
+    scheduler.submit(b"\x02", HtdPriority.BACKGROUND)
+    scheduler.submit(b"\x02", HtdPriority.BACKGROUND)
+    scheduler.submit(b"\x03", HtdPriority.VALIDATION)
+    scheduler.submit(b"\x03", HtdPriority.VALIDATION)
+
+    assert len(scheduler) == 4
+    assert scheduler.stats.dropped == 2
+
+
+@pytest.mark.asyncio
+async def test_drain_time_only_counts_frames_ahead():
+    scheduler = OutboundScheduler(lambda batch: None, min_gap=0, rate=10, burst=1)
+
+    for frame in frames(3):
+        scheduler.submit(frame, HtdPriority.BACKGROUND)
+
+    assert scheduler.drain_time(HtdPriority.INTERACTIVE) == 0
+    assert scheduler.drain_time() == pytest.approx(0.2, abs=0.01)
+
+
+@pytest.mark.asyncio
+async def test_frames_paced_by_their_sender():
+    loop = asyncio.get_running_loop()
+    writes = []
+    written_at = []
+
+    def write(batch):
+        writes.append(batch)
+        written_at.append(loop.time())
+
+    scheduler = OutboundScheduler(write, min_gap=0.05, rate=1, burst=1)
+    scheduler.submit(b"\x01")
+
+    # they go out alone, their own gap apart, and take no tokens
+    for frame in frames(3):
+        scheduler.submit(frame, gap=0.01)
+
+    while len(scheduler):
+        await asyncio.sleep(0.005)
+
+    assert writes == [[b"\x01"]] + [[frame] for frame in frames(3)]
+    assert all(later - earlier < 0.04 for earlier, later in zip(written_at[1:], written_at[2:]))
+
+    # a frame paced here still waits for the tokens and the gap
+    scheduler.submit(b"\x02")
+    assert scheduler.drain_time(HtdPriority.INTERACTIVE) > 0.5
+
+
+@pytest.mark.asyncio
+async def test_frames_of_one_command_share_a_write():
+    writes = []
+    scheduler = OutboundScheduler(writes.append, min_gap=0.01, rate=1000, burst=10)
+    command, other = object(), object()
+
+    def frame(zone, code):
+        return bytes([HtdConstants.HEADER_BYTE, HtdConstants.RESERVED_BYTE, zone, code])
+
+    # a command and its follow up for zone 1, then another sender's, then zone 2
+    scheduler.submit(frame(1, 0x15), owner=command)
+    scheduler.submit(frame(1, 0x1f), owner=command)
+    scheduler.submit(frame(1, 0x57), owner=other)
+    scheduler.submit(frame(2, 0x57), owner=command)
+    scheduler.submit(frame(3, 0x57))
+    scheduler.submit(frame(3, 0x58))
+
+    while len(scheduler):
+        await asyncio.sleep(0.01)
+
+    assert writes == [
+        [frame(1, 0x15), frame(1, 0x1f)],
+        [frame(1, 0x57)],
+        [frame(2, 0x57)],
+        [frame(3, 0x57)],
+        [frame(3, 0x58)],
+    ]
+    assert scheduler.stats.frames == 6
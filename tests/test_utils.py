@@ -149,3 +149,70 @@ def test_is_bit_on(actual, string, index):
     from htd_client.utils import is_bit_on
     assert actual == is_bit_on(string, index)
 
+
+@pytest.mark.parametrize("raw_value", range(256))
+def test_state_toggles_table(raw_value):
+    from htd_client.constants import HtdDeviceKind
+    from htd_client.utils import STATE_TOGGLES_TABLES, is_bit_on, to_binary_string
+
+    mca = to_binary_string(raw_value)
+    lync = mca[::-1]
+
+    assert STATE_TOGGLES_TABLES[HtdDeviceKind.mca][raw_value] == tuple(is_bit_on(mca, i) for i in range(4))
+    assert STATE_TOGGLES_TABLES[HtdDeviceKind.lync][raw_value] == tuple(is_bit_on(lync, i) for i in range(4))
+
+
+def test_value_tables():
+    from htd_client.constants import HtdDeviceKind
+    from htd_client.utils import SIGNED_VALUE_TABLE, VOLUME_TABLE, convert_value, convert_volume
+
+    assert len(SIGNED_VALUE_TABLE) == len(VOLUME_TABLE) == 256
+
+    for raw_value in range(256):
+        assert SIGNED_VALUE_TABLE[raw_value] == convert_value(raw_value)
+        assert VOLUME_TABLE[raw_value] == convert_volume(HtdDeviceKind.lync, raw_value)
+
+
+def test_command_frame_cache():
+    from htd_client.utils import CommandFrameCache, build_command
+
+    cache = CommandFrameCache()
+    cache.warm(3, [(0x04, 0x20), (0x06, 1)])
+
+    assert len(cache) == 8
+
+    frame = cache.get(2, 0x04, 0x20)
+    assert isinstance(frame, bytes)
+    assert frame == build_command(2, 0x04, 0x20)
+    assert cache.get(2, 0x04, 0x20) is frame
+
+    # not warmed, built on first use
+    assert cache.get(5, 0x15, 0xc4) == build_command(5, 0x15, 0xc4)
+    assert len(cache) == 9
+
+    extra_data = bytearray([0x80, 0xff, 0x01])
+    assert cache.get(1, 0x18, 0, extra_data) == build_command(1, 0x18, 0, extra_data)
+    assert len(cache) == 10
+
+
+def test_client_frame_caches_are_warmed_per_model():
+    from htd_client.lync_client import HtdLyncClient
+    from htd_client.mca_client import HtdMcaClient
+    from htd_client.utils import build_command
+
+    loop = Mock()
+    lync = HtdLyncClient(loop, HtdConstants.SUPPORTED_MODELS["lync12"])
+    mca = HtdMcaClient(loop, HtdConstants.SUPPORTED_MODELS["mca66"])
+
+    assert HtdLyncClient(loop, HtdConstants.SUPPORTED_MODELS["lync12"])._frame_cache is lync._frame_cache
+    assert lync._frame_cache is not mca._frame_cache
+
+    warmed = len(lync._frame_cache)
+    assert warmed > 0
+    assert lync._frame_cache.get(12, 0x15, 0xc4) == build_command(12, 0x15, 0xc4)
+    assert len(lync._frame_cache) == warmed
+
+    warmed = len(mca._frame_cache)
+    assert warmed > 0
+    assert mca._frame_cache.get(6, 0x04, 0x09) == build_command(6, 0x04, 0x09)
+    assert len(mca._frame_cache) == warmed
@@ -0,0 +1,55 @@
+import logging
+from unittest.mock import patch
+
+import pytest
+
+from htd_client.wire_log import WireLogger
+
+
+def test_disabled_formats_nothing(caplog):
+    wire_log = WireLogger("1.2.3.4:10006")
+    caplog.set_level(logging.DEBUG, logger="htd_client.wire_log")
+
+    with patch("htd_client.utils.stringify_bytes") as mock_stringify:
+        wire_log.log("received", b"\x02\x00")
+        mock_stringify.assert_not_called()
+
+    assert caplog.records == []
+
+
+def test_enabled_requires_debug_level(caplog):
+    wire_log = WireLogger("1.2.3.4:10006")
+    wire_log.configure(True)
+    caplog.set_level(logging.INFO, logger="htd_client.wire_log")
+
+    with patch("htd_client.utils.stringify_bytes") as mock_stringify:
+        wire_log.log("received", b"\x02\x00")
+        mock_stringify.assert_not_called()
+
+
+def test_enabled_logs(caplog):
+    wire_log = WireLogger("1.2.3.4:10006")
+    wire_log.configure(True)
+    caplog.set_level(logging.DEBUG, logger="htd_client.wire_log")
+
+    wire_log.log("received", b"\x02\x00")
+
+    assert len(caplog.records) == 1
+    assert "[1.2.3.4:10006] received" in caplog.text
+    assert "0x02 0x00" in caplog.text
+
+
+def test_sampling(caplog):
+    wire_log = WireLogger("/dev/ttyUSB0")
+    wire_log.configure(True, sample_rate=3)
+    caplog.set_level(logging.DEBUG, logger="htd_client.wire_log")
+
+    for _ in range(9):
+        wire_log.log("received", b"\x02\x00")
+
+    assert len(caplog.records) == 3
+
+
+def test_invalid_sample_rate():
+    with pytest.raises(ValueError):
+        WireLogger("/dev/ttyUSB0").configure(True, sample_rate=0)